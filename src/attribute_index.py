@@ -0,0 +1,305 @@
+# The AttributeIndex class indexes selected fields of each document as
+# filterable attributes, so that a query can be restricted to the documents
+# whose attributes match a set of filters before any document is scored.
+# Documents are numbered by rows, in document ID order. Fields holding only
+# numbers are numeric: their values are kept in a sorted array alongside the
+# row of each value, so a range of values is found by binary search. Other
+# fields are categorical: the rows holding each value are kept as a bitmap
+# when the value is common, or as a sorted array of rows when it is rare,
+# whichever is smaller.
+
+import re
+import json
+import numpy as np
+
+class AttributeIndex:
+
+    categorical = "categorical"
+    numeric = "numeric"
+
+    bitmap = "bitmap"
+    rows = "rows"
+
+    # the fraction of documents above which a categorical value's rows are
+    # stored as a bitmap, which is then smaller than an array of int32 rows
+    bitmap_density = 1 / 32
+
+    def __init__(self):
+        # initializes a new instance of the AttributeIndex class
+        # params: None
+        # returns: None
+
+        # the document ID of each row
+        self.document_ids = np.zeros(0, dtype=np.int64)
+
+        # maps each field name to a dictionary describing its index
+        self.fields = {}
+
+    def build(self, documents, fields):
+        # indexes the values of a set of fields in every document. A field
+        # may hold a single value or a list of values
+        # params:
+        # - documents: a list of Document objects
+        # - fields: a list of field names
+        # returns: None
+
+        documents = sorted(documents, key=lambda document: document.get_document_id())
+        self.document_ids = np.array([document.get_document_id() for document in documents], dtype=np.int64)
+
+        self.fields = {}
+        for field in fields:
+            rows = []
+            values = []
+            for row, document in enumerate(documents):
+                value = document.get_zones().get(field)
+                for item in (value if isinstance(value, list) else [value]):
+                    if item is not None:
+                        rows.append(row)
+                        values.append(item)
+
+            if values and all(is_number(value) for value in values):
+                self.fields[field] = self.build_numeric(rows, values)
+            else:
+                self.fields[field] = self.build_categorical(rows, values)
+
+    def build_numeric(self, rows, values):
+        # creates the index of a numeric field
+        # params:
+        # - rows: a list of ints
+        # - values: a list of numbers, the value held in each row
+        # returns:
+        # - field_index: a dictionary
+
+        values = np.array(values, dtype=np.float64)
+        order = np.argsort(values, kind="stable")
+
+        return {
+            "type": AttributeIndex.numeric,
+            "values": values[order],
+            "rows": np.array(rows, dtype=np.int32)[order]
+        }
+
+    def build_categorical(self, rows, values):
+        # creates the index of a categorical field
+        # params:
+        # - rows: a list of ints
+        # - values: a list of values, the value held in each row
+        # returns:
+        # - field_index: a dictionary
+
+        value_rows = {}
+        for row, value in zip(rows, values):
+            value_rows.setdefault(str(value), []).append(row)
+
+        containers = {}
+        for value, rows in value_rows.items():
+            rows = np.unique(np.array(rows, dtype=np.int32))
+            containers[value] = self.create_container(rows)
+
+        return {
+            "type": AttributeIndex.categorical,
+            "values": containers
+        }
+
+    def create_container(self, rows):
+        # stores a sorted array of rows as a bitmap if it is dense, or as
+        # the array itself if it is sparse
+        # params:
+        # - rows: a sorted numpy array of rows
+        # returns:
+        # - container: a tuple of the container kind and a numpy array
+
+        if len(rows) < len(self.document_ids) * AttributeIndex.bitmap_density:
+            return (AttributeIndex.rows, rows)
+
+        mask = np.zeros(len(self.document_ids), dtype=bool)
+        mask[rows] = True
+
+        return (AttributeIndex.bitmap, np.packbits(mask))
+
+    def get_container_rows(self, container):
+        # returns the rows held by a container
+        # params:
+        # - container: a tuple of the container kind and a numpy array
+        # returns:
+        # - rows: a sorted numpy array of rows
+
+        kind, data = container
+        if kind == AttributeIndex.rows:
+            return data
+
+        return np.flatnonzero(np.unpackbits(data, count=len(self.document_ids))).astype(np.int32)
+
+    def get_fields(self):
+        # returns the names of the filterable fields
+        # returns:
+        # - fields: a list of strings
+
+        return sorted(self.fields)
+
+    def filter(self, filters):
+        # returns the IDs of the documents that match every filter
+        # params:
+        # - filters: a list of (field, operator, values) tuples, as returned
+        #   by parse_filter
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        rows = None
+        for field, operator, values in filters:
+            field_rows = self.get_rows(field, operator, values)
+
+            if rows is None:
+                rows = field_rows
+            else:
+                rows = np.intersect1d(rows, field_rows, assume_unique=True)
+
+            if not len(rows):
+                break
+
+        if rows is None:
+            return self.document_ids.tolist()
+
+        return self.document_ids[rows].tolist()
+
+    def get_rows(self, field, operator, values):
+        # returns the rows whose value of a field satisfies a comparison.
+        # Categorical fields only support equality, with the rows holding
+        # any of the values returned
+        # params:
+        # - field: a string
+        # - operator: one of "=", "<", "<=", ">", ">="
+        # - values: a list of strings
+        # returns:
+        # - rows: a sorted numpy array of rows
+
+        if field not in self.fields:
+            raise Exception("Field {} is not filterable".format(field))
+
+        field_index = self.fields[field]
+
+        if field_index["type"] == AttributeIndex.categorical:
+            if operator != "=":
+                raise Exception("Field {} can only be filtered by value".format(field))
+
+            rows = np.zeros(0, dtype=np.int32)
+            for value in values:
+                if value in field_index["values"]:
+                    rows = np.union1d(rows, self.get_container_rows(field_index["values"][value]))
+
+            return rows
+
+        sorted_values = field_index["values"]
+
+        try:
+            numbers = [float(value) for value in values]
+        except ValueError:
+            raise Exception("Field {} can only be filtered by number".format(field))
+
+        if operator != "=" and len(numbers) != 1:
+            raise Exception("Field {} can only be compared with a single number".format(field))
+
+        # find the range of sorted values satisfying each comparison
+        ranges = []
+        for number in numbers:
+            low = 0
+            high = len(sorted_values)
+            if operator in ("=", ">="):
+                low = np.searchsorted(sorted_values, number, side="left")
+            if operator == ">":
+                low = np.searchsorted(sorted_values, number, side="right")
+            if operator in ("=", "<="):
+                high = np.searchsorted(sorted_values, number, side="right")
+            if operator == "<":
+                high = np.searchsorted(sorted_values, number, side="left")
+            ranges.append(field_index["rows"][low:high])
+
+        return np.unique(np.concatenate(ranges))
+
+    def save(self, directory):
+        # saves the AttributeIndex instance as a json file describing each
+        # field, and an npz file holding the arrays of each field
+        # params:
+        # - directory: a string
+        # returns: None
+
+        arrays = {"document_ids": self.document_ids}
+        description = []
+
+        for i, field in enumerate(sorted(self.fields)):
+            field_index = self.fields[field]
+
+            if field_index["type"] == AttributeIndex.numeric:
+                arrays["{}_values".format(i)] = field_index["values"]
+                arrays["{}_rows".format(i)] = field_index["rows"]
+                description.append({"name": field, "type": AttributeIndex.numeric})
+                continue
+
+            values = []
+            for j, value in enumerate(sorted(field_index["values"])):
+                kind, data = field_index["values"][value]
+                arrays["{}_{}".format(i, j)] = data
+                values.append([value, kind])
+
+            description.append({"name": field, "type": AttributeIndex.categorical, "values": values})
+
+        np.savez_compressed(directory + "/" + "attributes.npz", **arrays)
+
+        with open(directory + "/" + "attributes.json", 'w') as json_file:
+            json.dump({"fields": description}, json_file)
+
+    def load(self, directory):
+        # loads an AttributeIndex instance saved by save
+        # params:
+        # - directory: a string
+        # returns: None
+
+        with open(directory + "/" + "attributes.json", "r") as json_file:
+            description = json.load(json_file)["fields"]
+
+        with np.load(directory + "/" + "attributes.npz") as arrays:
+            self.document_ids = arrays["document_ids"]
+
+            self.fields = {}
+            for i, field in enumerate(description):
+                if field["type"] == AttributeIndex.numeric:
+                    self.fields[field["name"]] = {
+                        "type": AttributeIndex.numeric,
+                        "values": arrays["{}_values".format(i)],
+                        "rows": arrays["{}_rows".format(i)]
+                    }
+                    continue
+
+                containers = {}
+                for j, (value, kind) in enumerate(field["values"]):
+                    containers[value] = (kind, arrays["{}_{}".format(i, j)])
+
+                self.fields[field["name"]] = {
+                    "type": AttributeIndex.categorical,
+                    "values": containers
+                }
+
+def is_number(value):
+    # returns whether a json value is a number
+    # params:
+    # - value: a json value
+    # returns:
+    # - bool
+
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def parse_filter(string):
+    # parses a filter of the form field=value, field=value,value, or a
+    # comparison such as field>=value
+    # params:
+    # - string: a string
+    # returns:
+    # - filter: a (field, operator, values) tuple
+
+    match = re.fullmatch(r"\s*([^<>=\s]+)\s*(<=|>=|=|<|>)\s*(.+?)\s*", string)
+    if not match:
+        raise Exception("Filter {} is not recognized".format(string))
+
+    field, operator, values = match.groups()
+
+    return field, operator, [value.strip() for value in values.split(",")]
@@ -0,0 +1,120 @@
+# This file holds functions that orchestrate the benchmark_vectors.py
+# program. The program accepts an index directory, an integer k, and a
+# number of queries as input, and measures the recall and latency of
+# approximate vector search against exact search over the same embeddings.
+
+import sys
+import time
+import numpy as np
+from command_parser import CommandParser
+from search_engine import load_vector_index
+
+# the numbers of IVF clusters probed by each approximate search
+nprobe_values = [1, 2, 4, 8, 16, 32, 64]
+
+def main():
+    # This is the entry point for execution of the benchmark_vectors program.
+
+    try:
+
+        # validate the command line arguments
+        parser = CommandParser(sys.argv)
+        parser.validate_num_args(4)
+        parser.validate_dir_path(1)
+        parser.validate_int(2)
+        parser.validate_int(3)
+
+        vector_index = load_vector_index(parser.get_arg(1))
+        k = int(parser.get_arg(2))
+
+        # perturb stored embeddings to create queries near the collection
+        random = np.random.default_rng(0)
+        rows = random.choice(vector_index.get_size(), min(int(parser.get_arg(3)), vector_index.get_size()), replace=False)
+        queries = np.array(vector_index.vectors[rows])
+        queries += random.normal(scale=0.1 / np.sqrt(vector_index.get_dimension()), size=queries.shape).astype(np.float32)
+
+        # find the true nearest neighbours of each query
+        exact_results, exact_time = run_queries(vector_index, queries, k, None, True)
+        print("Method\tRecall@{}\tMean compared\tMean latency (ms)".format(k))
+        print_row("exact", 1.0, exact_results, exact_time)
+
+        # quantized embeddings are measured with and without re-ranking
+        rerank_values = [None]
+        if vector_index.codes is not None:
+            rerank_values = [0, k * vector_index.default_rerank_factor]
+
+        for nprobe in nprobe_values:
+            if nprobe > len(vector_index.centroids):
+                break
+
+            for rerank in rerank_values:
+                results, total_time = run_queries(vector_index, queries, k, nprobe, False, rerank)
+
+                method = "nprobe={}".format(nprobe)
+                if rerank is not None:
+                    method += " rerank={}".format(rerank)
+                print_row(method, measure_recall(exact_results, results), results, total_time)
+
+        # compare the memory held by full-precision and quantized embeddings
+        print("\nFull-precision embeddings: {} bytes".format(vector_index.vectors.nbytes))
+        if vector_index.codes is not None:
+            print("Quantized embeddings: {} bytes".format(vector_index.codes.nbytes + vector_index.codebooks.nbytes))
+
+    except Exception as e:
+        print("\nAn error prevented the benchmark from running:\n" + str(e))
+        print("\nExample usage: python3 benchmark_vectors.py indexes/ 10 1000\n")
+
+def run_queries(vector_index, queries, k, nprobe, exact, rerank=None):
+    # searches a vector index for each of a set of query embeddings
+    # params:
+    # - vector_index: a VectorIndex object
+    # - queries: a 2-dimensional float32 array
+    # - k: an int
+    # - nprobe: an int or None
+    # - exact: a bool
+    # - rerank: an int or None
+    # returns:
+    # - results: a list of (num_compared, highest_docs) pairings
+    # - total_time: a float, the number of seconds taken
+
+    results = []
+
+    start = time.perf_counter()
+    for query in queries:
+        results.append(vector_index.search(query, k, nprobe, exact, rerank))
+    total_time = time.perf_counter() - start
+
+    return results, total_time
+
+def measure_recall(exact_results, results):
+    # returns the fraction of the exact nearest neighbours that were found
+    # params:
+    # - exact_results: a list of (num_compared, highest_docs) pairings
+    # - results: a list of (num_compared, highest_docs) pairings
+    # returns:
+    # - recall: a float
+
+    found = 0
+    total = 0
+    for (_, exact_docs), (_, docs) in zip(exact_results, results):
+        exact_ids = set(document_id for document_id, _ in exact_docs)
+        found += len(exact_ids & set(document_id for document_id, _ in docs))
+        total += len(exact_ids)
+
+    return found / total if total else 0.0
+
+def print_row(method, recall, results, total_time):
+    # prints the recall, mean embeddings compared, and mean latency of a
+    # search method
+    # params:
+    # - method: a string
+    # - recall: a float
+    # - results: a list of (num_compared, highest_docs) pairings
+    # - total_time: a float
+    # returns: None
+
+    mean_compared = sum(num_compared for num_compared, _ in results) / len(results)
+    print("{}\t{:.4f}\t{:.1f}\t{:.3f}".format(method, recall, mean_compared, 1000 * total_time / len(results)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+# This file contains methods that work with sets of document IDs stored as
+# bitmaps. A bitmap is a Python int in which bit i is set when document ID i
+# belongs to the set, so that the intersection and union of two bitmaps are
+# computed a machine word at a time by the & and | operators.
+
+import re
+
+# the offsets of the bits set in each possible byte
+byte_offsets = [[offset for offset in range(8) if byte >> offset & 1] for byte in range(256)]
+
+def list_to_bitmap(sorted_list):
+    # returns the bitmap of a sorted list of non-negative document IDs
+    # parameters:
+    # - sorted_list: a sorted list of ints
+    # returns:
+    # - bitmap: an int
+
+    if not sorted_list:
+        return 0
+
+    data = bytearray((sorted_list[-1] >> 3) + 1)
+    for item in sorted_list:
+        data[item >> 3] |= 1 << (item & 7)
+
+    return int.from_bytes(data, "little")
+
+def bitmap_to_list(bitmap):
+    # returns the sorted list of document IDs set in a bitmap
+    # parameters:
+    # - bitmap: an int
+    # returns:
+    # - sorted_list: a sorted list of ints
+
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+
+    # skip over runs of empty bytes, then decode each byte of a run
+    sorted_list = []
+    for match in re.finditer(b"[^\x00]+", data):
+        for i in range(match.start(), match.end()):
+            base = i << 3
+            sorted_list.extend([base + offset for offset in byte_offsets[data[i]]])
+
+    return sorted_list
+
+def intersect_bitmap_list(bitmap, sorted_list):
+    # returns a new sorted list containing the elements of a sorted list
+    # that are set in a bitmap. The bitmap is converted to bytes once, in
+    # time proportional to its size, a byte for every eight document IDs,
+    # and each element of the list is then probed in constant time. Shifting
+    # the bitmap for each element instead would copy it every time
+    # parameters:
+    # - bitmap: an int
+    # - sorted_list: a sorted list of ints
+    # returns:
+    # - intersection: a sorted list of ints
+
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    size = len(data)
+
+    return [item for item in sorted_list if 0 <= item >> 3 < size and data[item >> 3] >> (item & 7) & 1]
+
+def union_bitmap_list(bitmap, sorted_list):
+    # returns the bitmap of the union of a bitmap and a sorted list
+    # parameters:
+    # - bitmap: an int
+    # - sorted_list: a sorted list of non-negative ints
+    # returns:
+    # - bitmap: an int
+
+    return bitmap | list_to_bitmap(sorted_list)
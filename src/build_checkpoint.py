@@ -0,0 +1,183 @@
+# The BuildCheckpoint class saves the progress of an index build to disk, so
+# that a build that is interrupted can be resumed rather than started again.
+# Documents are tokenized and normalized in batches, and once a batch is
+# done, the terms and positions of its documents are written to a batch file
+# along with the tokens it added to the lexicon. A manifest naming the number
+# of batches written is then replaced atomically, so a build interrupted
+# while writing a batch resumes from the batch before it. Each batch holds
+# the IDs and a checksum of the text and zone names of its documents, and the
+# manifest holds the build options that change how documents are indexed, so
+# a checkpoint is only resumed by a build of the same documents with the same
+# options.
+
+import os
+import json
+import zlib
+import shutil
+
+class BuildCheckpoint:
+
+    manifest_file = "checkpoint.json"
+    batch_prefix = "batch_"
+
+    def __init__(self, directory):
+        # initializes a new instance of the BuildCheckpoint class
+        # params:
+        # - directory: a string, the directory the checkpoint is kept in
+        # returns: None
+
+        self.directory = directory
+        self.batches = 0
+        self.documents = 0
+        self.options = {}
+
+    def start(self, options):
+        # starts an empty checkpoint, removing any earlier one
+        # params:
+        # - options: a dictionary of the build options, holding only
+        #   JSON-serializable values
+        # returns: None
+
+        self.remove()
+        os.makedirs(self.directory)
+
+        self.batches = 0
+        self.documents = 0
+        self.options = options
+        self.save_manifest()
+
+    def resume(self, options):
+        # reads the manifest of an existing checkpoint, raising an error if
+        # it was made with other build options
+        # params:
+        # - options: a dictionary of the build options, in the form given
+        #   to start
+        # returns:
+        # - batches: an int, the number of batches saved
+
+        path = os.path.join(self.directory, BuildCheckpoint.manifest_file)
+        if not os.path.exists(path):
+            raise Exception("No checkpoint to resume from in {}".format(self.directory))
+
+        with open(path, "r") as json_file:
+            manifest = json.load(json_file)
+
+        # checkpoints made before options were recorded can not be checked
+        saved_options = manifest.get("options")
+        if saved_options is None:
+            raise Exception("Checkpoint in {} does not record its build options".format(self.directory))
+
+        changed = sorted(name for name in set(options) | set(saved_options) if options.get(name) != saved_options.get(name))
+        if changed:
+            raise Exception("Checkpoint in {} was made with other options: {}".format(self.directory, ", ".join(changed)))
+
+        self.batches = manifest["batches"]
+        self.documents = manifest["documents"]
+        self.options = saved_options
+
+        return self.batches
+
+    def save_batch(self, documents, lexicon_entries):
+        # saves the terms of a batch of tokenized documents, then records
+        # the batch in the manifest
+        # params:
+        # - documents: a list of Document objects
+        # - lexicon_entries: a list of [token, terms] pairings added to the
+        #   lexicon by the batch
+        # returns: None
+
+        batch = {
+            "document_ids": [document.get_document_id() for document in documents],
+            "checksum": get_checksum(documents),
+            "terms": [document.get_terms() for document in documents],
+            "lexicon": lexicon_entries
+        }
+
+        write_file(self.get_batch_file(self.batches), batch)
+
+        self.batches += 1
+        self.documents += len(documents)
+        self.save_manifest()
+
+    def load_batch(self, number, documents, start):
+        # restores the terms of a batch of documents, raising an error if
+        # the batch was saved from other documents
+        # params:
+        # - number: an int
+        # - documents: a list of Document objects
+        # - start: an int, the position of the batch's first document
+        # returns:
+        # - batch_size: an int, the number of documents restored
+        # - lexicon_entries: a list of [token, terms] pairings
+
+        with open(self.get_batch_file(number), "r", encoding="utf8") as json_file:
+            batch = json.load(json_file)
+
+        batch_size = len(batch["document_ids"])
+        documents = documents[start:start + batch_size]
+
+        if [document.get_document_id() for document in documents] != batch["document_ids"] or get_checksum(documents) != batch["checksum"]:
+            raise Exception("Checkpoint in {} was made from other documents".format(self.directory))
+
+        for document, terms in zip(documents, batch["terms"]):
+            document.set_terms(terms)
+
+        return batch_size, batch["lexicon"]
+
+    def remove(self):
+        # removes the checkpoint
+        # params: None
+        # returns: None
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def save_manifest(self):
+        # atomically replaces the manifest
+        # params: None
+        # returns: None
+
+        write_file(os.path.join(self.directory, BuildCheckpoint.manifest_file), {
+            "batches": self.batches,
+            "documents": self.documents,
+            "options": self.options
+        })
+
+    def get_batch_file(self, number):
+        # returns the path of a batch file
+        # params:
+        # - number: an int
+        # returns:
+        # - path: a string
+
+        return os.path.join(self.directory, BuildCheckpoint.batch_prefix + str(number).zfill(6) + ".json")
+
+def get_checksum(documents):
+    # returns a checksum of the text of a list of documents, and the names of
+    # their zones, which name the terms of indexed zones
+    # params:
+    # - documents: a list of Document objects
+    # returns:
+    # - checksum: an int
+
+    checksum = 0
+    for document in documents:
+        checksum = zlib.crc32("\t".join(document.get_zones()).encode("utf8", errors="backslashreplace"), checksum)
+        checksum = zlib.crc32(document.get_data().encode("utf8", errors="backslashreplace"), checksum)
+
+    return checksum
+
+def write_file(path, data):
+    # writes a json-formatted file, replacing any existing file atomically
+    # once it is complete
+    # params:
+    # - path: a string
+    # - data: a JSON-serializable object
+    # returns: None
+
+    temp_file = path + ".tmp"
+    with open(temp_file, "w", encoding="utf8") as json_file:
+        json.dump(data, json_file)
+        json_file.flush()
+        os.fsync(json_file.fileno())
+
+    os.replace(temp_file, path)
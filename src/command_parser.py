@@ -22,6 +22,41 @@ class CommandParser:
         
         return self.argv[arg_index]
     
+    def pop_flag(self, flag):
+        # removes an optional flag (e.g. --snippets) from the argument vector
+        # so that the remaining arguments can be validated by position
+        # params:
+        # - flag: a string
+        # returns:
+        # - bool: True if the flag was supplied
+        
+        if flag in self.argv:
+            self.argv = [arg for arg in self.argv if arg != flag]
+            return True
+        
+        return False
+    
+    def pop_option(self, option, default=None):
+        # removes an optional argument of the form --option=value from the
+        # argument vector and returns its value
+        # params:
+        # - option: a string (e.g. --fields)
+        # - default: the value returned if the option was not supplied
+        # returns:
+        # - value: a string
+        
+        value = default
+        remaining = []
+        for arg in self.argv:
+            if arg.startswith(option + "="):
+                value = arg[len(option) + 1:]
+            else:
+                remaining.append(arg)
+        
+        self.argv = remaining
+        
+        return value
+    
     def validate_num_args(self, num_args):
         # raises an exception if the number of arguments in arg is not 
         # equivalent to some specified integer
@@ -79,9 +114,11 @@ class CommandParser:
         
         query = self.argv[arg_index]
         
-        tokens = query.split()
+        # treat each parenthesis as a token of its own
+        tokens = re.findall(r"[()]|[^\s()]+", query)
         
         is_phrase = False
+        depth = 0
         for token in tokens:
             if re.fullmatch(r":[\w'\u2019\u201A]+", token):
                 if is_phrase:
@@ -95,11 +132,23 @@ class CommandParser:
                     raise Exception("Check colons in query. You cannot have a phrase end if one has not begun")
             elif re.fullmatch(r"[\w'\u2019\u201A]+", token):
                 pass
+            elif re.fullmatch(r"\w+:[\w'\u2019\u201A]+", token):
+                if is_phrase:
+                    raise Exception("Check colons in query. You cannot restrict a term within a phrase to a zone")
             elif re.fullmatch(r":[\w'\u2019\u201A]+:", token):
                 if is_phrase:
                     raise Exception("Check colons in query. You cannot have a phrase begin within another phrase")           
+            elif token in ("(", ")"):
+                if is_phrase:
+                    raise Exception("Check parentheses in query. You cannot use a parenthesis within a phrase")
+                depth += 1 if token == "(" else -1
+                if depth < 0:
+                    raise Exception("Check parentheses in query. You cannot close a parenthesis that has not been opened")
             else:
                 raise Exception("Token {} is not recognized. Please do not use special characters".format(str(token)))
             
         if is_phrase:
-            raise Exception("Phrase must be enclosed by colons")
\ No newline at end of file
+            raise Exception("Phrase must be enclosed by colons")
+        
+        if depth:
+            raise Exception("Check parentheses in query. Every parenthesis must be closed")
\ No newline at end of file
@@ -0,0 +1,98 @@
+# The CursorCache class holds the ranked results of queries that are being
+# paged through, so that each page after the first is a slice of a ranking
+# that was computed once, rather than a new query with a larger k. A cursor
+# names the cached ranking, the position reached within it, and the score and
+# document ID of the last result returned. When the ranking has been evicted,
+# or the cursor is used against another process or index generation, the
+# query is scored again and the next page resumes after that last result.
+
+import json
+import base64
+import secrets
+import threading
+from collections import OrderedDict
+
+class CursorCache:
+
+    def __init__(self, max_results):
+        # initializes a new instance of the CursorCache class
+        # params:
+        # - max_results: an int, the budget of ranked results held across
+        #   every cached ranking
+        # returns: None
+
+        self.max_results = max_results
+
+        # maps each key to a ranking, from the least to the most recently
+        # used
+        self.entries = OrderedDict()
+        self.resident_results = 0
+
+        # queries may run on several threads at once
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        # returns a cached ranking, marking it as the most recently used
+        # params:
+        # - key: a string
+        # returns:
+        # - ranking: a list of [document_id, score] pairings, or None
+
+        with self.lock:
+            ranking = self.entries.get(key)
+            if ranking is not None:
+                self.entries.move_to_end(key)
+
+            return ranking
+
+    def put(self, ranking):
+        # caches a ranking, evicting the least recently used rankings until
+        # it fits. A ranking larger than the budget is not cached
+        # params:
+        # - ranking: a list of [document_id, score] pairings
+        # returns:
+        # - key: a string naming the ranking, or None if it was not cached
+
+        if len(ranking) > self.max_results:
+            return None
+
+        key = secrets.token_hex(8)
+
+        with self.lock:
+            while self.entries and self.resident_results + len(ranking) > self.max_results:
+                _, evicted = self.entries.popitem(last=False)
+                self.resident_results -= len(evicted)
+
+            self.entries[key] = ranking
+            self.resident_results += len(ranking)
+
+        return key
+
+def encode_cursor(state):
+    # encodes the state of a paged query as a URL-safe cursor
+    # params:
+    # - state: a dictionary
+    # returns:
+    # - cursor: a string
+
+    data = json.dumps(state, separators=(",", ":")).encode("utf8")
+
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor):
+    # decodes a cursor created by encode_cursor
+    # params:
+    # - cursor: a string
+    # returns:
+    # - state: a dictionary
+
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        state = json.loads(data.decode("utf8"))
+    except ValueError:
+        raise Exception("Cursor {} is not valid".format(cursor))
+
+    if not isinstance(state, dict) or not {"query", "filters", "generation", "key", "offset", "score", "document_id"} <= set(state):
+        raise Exception("Cursor {} is not valid".format(cursor))
+
+    return state
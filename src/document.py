@@ -5,15 +5,19 @@
 from sorted_list_helper import *
 
 class Document:
-    def __init__(self, document_id, data):
+    def __init__(self, document_id, data, zones=None, embedding=None):
         # initializes a new instance of the Document class
         # params:
         # - document_id: a string
         # - data: a string of raw data
+        # - zones: a dictionary of zone names and their original values
+        # - embedding: a list of floats, or None
         # returns: None
         
         self.document_id = document_id
         self.data = data
+        self.zones = zones if zones is not None else {}
+        self.embedding = embedding
         self.tokens = {}
         self.terms = {}
 
@@ -25,6 +29,14 @@ class Document:
         
         return self.document_id
 
+    def set_document_id(self, document_id):
+        # replaces the document id, such as when documents are reordered
+        # params:
+        # - document_id: a string
+        # returns: None
+        
+        self.document_id = document_id
+
     def get_data(self):
         # returns all data that belongs to the document
         # params: None
@@ -33,6 +45,22 @@ class Document:
         
         return self.data
     
+    def get_zones(self):
+        # returns the original zones of the document
+        # params: None
+        # returns:
+        # - zones: a dictionary of zone names and their values
+        
+        return self.zones
+    
+    def get_embedding(self):
+        # returns the dense embedding of the document
+        # params: None
+        # returns:
+        # - embedding: a list of floats, or None
+        
+        return self.embedding
+    
     def add_term(self, term, position):
         # adds a term to the set of terms. if the term already exists,
         # updates its list of positions
@@ -1,7 +1,11 @@
 # The DocumentIndex class represents the dictionary data structure that
-# stores all document IDs, and their corresponding ____
+# stores all document IDs, and their corresponding ____. When documents are
+# reordered at build time, their document IDs are ordinals assigned by the
+# build, and the index keeps the external document ID of each, which is the
+# ID returned in results
 
 import re
+import sys
 
 class DocumentIndex:
 
@@ -14,14 +18,19 @@ class DocumentIndex:
         # returns: None
         
         self.entries = {}
+        
+        # the external document IDs of reordered documents
+        self.external_ids = {}
 
-    def register_document(self, document_id, max_tf, length):
+    def register_document(self, document_id, max_tf, length, external_id=None):
         # adds a document to the dictionary but raises and error if the document
         # has aleady been added
         # params:
         # - document_id: a string
         # - max_tf: an integer
         # - length: a float
+        # - external_id: an int, the document's ID in the input when the
+        #   document_id was assigned by the build, or None
         # returns: None
         
         if document_id in self.entries:
@@ -32,6 +41,9 @@ class DocumentIndex:
                 DocumentIndex.max_tf: max_tf,
                 DocumentIndex.length: length
             }
+            
+            if external_id is not None:
+                self.external_ids[document_id] = external_id
     
     def get_size(self):
         # returns the number of documents in the index
@@ -40,6 +52,22 @@ class DocumentIndex:
         
         return len(self.entries)
     
+    def get_memory_size(self):
+        # estimates the bytes of memory used by the index
+        # returns:
+        # - size: an int
+        
+        size = sys.getsizeof(self.entries)
+        for document_id, entry in self.entries.items():
+            size += sys.getsizeof(document_id) + sys.getsizeof(entry)
+            size += sum(sys.getsizeof(value) for value in entry.values())
+        
+        size += sys.getsizeof(self.external_ids)
+        for external_id in self.external_ids.values():
+            size += sys.getsizeof(external_id)
+        
+        return size
+    
     def get_document_ids(self):
         # returns every document ID
         # params: None
@@ -58,28 +86,48 @@ class DocumentIndex:
         return self.entries[document_id][DocumentIndex.max_tf]
 
     def get_length(self, document_id):
-        # returns the euclidian length associated with some document
+        # returns the euclidian length associated with some document, which
+        # normalizes its term weights. A document whose every text term is
+        # too common to carry weight has a length of 0, yet the terms of its
+        # zones may still match, so it is given a length of 1
         # params:
         # - document_id: a string
         # returns:
         # - length: a float
         
-        return self.entries[document_id][DocumentIndex.length]
+        return self.entries[document_id][DocumentIndex.length] or 1.0
+
+    def get_external_id(self, document_id):
+        # returns the ID a document was given in the input, which is its
+        # document_id unless documents were reordered
+        # params:
+        # - document_id: a string
+        # returns:
+        # - external_id: an int
+        
+        return self.external_ids.get(document_id, document_id)
 
     def save_TSV(self, filename):
-        # saves the DocumentIndex instance as a tab-seperated values file
+        # saves the DocumentIndex instance as a tab-seperated values file.
+        # The external document ID of each reordered document is saved after
+        # its length
         # params:
         # - filename: a string
         # returns: None
         
         with open(filename, 'w') as tsv_file:
             for document_id in sorted(self.entries):
-                tsv_file.write(
+                line = (
                     str(document_id) + "\t" +
                     str(self.entries[document_id][DocumentIndex.max_tf]) + "\t" +
-                    str(self.entries[document_id][DocumentIndex.length]) + "\n"
+                    str(self.entries[document_id][DocumentIndex.length])
                 )
                 
+                if document_id in self.external_ids:
+                    line += "\t" + str(self.external_ids[document_id])
+                
+                tsv_file.write(line + "\n")
+                
     def load_TSV(self, filename):
         # loads an DocumentIndex instance from a tab-seperated values file
         # params:
@@ -100,4 +148,7 @@ class DocumentIndex:
                 self.entries[document_id] = {
                     DocumentIndex.max_tf: max_tf,
                     DocumentIndex.length: length
-                }
\ No newline at end of file
+                }
+                
+                if len(entry_split) > 3:
+                    self.external_ids[document_id] = int(entry_split[3])
\ No newline at end of file
@@ -0,0 +1,121 @@
+# The DocumentStore class stores the original zones of every document in a
+# block-compressed file. Documents are grouped into blocks in document ID
+# order, each block is compressed on its own, and an offset index records
+# the block that holds each document. Fetching a set of documents reads and
+# decompresses only the blocks that hold them, with a single seek per block.
+
+import json
+import zlib
+
+class DocumentStore:
+
+    # the number of documents compressed together in a single block
+    block_size = 64
+
+    def __init__(self):
+        # initializes a new instance of the DocumentStore class
+        # params: None
+        # returns: None
+
+        # maps each document ID to the offset and length of its block
+        self.offsets = {}
+        self.data_filename = None
+
+    def save(self, documents, data_filename, index_filename):
+        # saves the zones of a set of documents as a block-compressed data
+        # file, and the offset of each document's block as a tab-seperated
+        # values file
+        # params:
+        # - documents: a list of Document objects
+        # - data_filename: a string
+        # - index_filename: a string
+        # returns: None
+
+        documents = sorted(documents, key=lambda document: document.get_document_id())
+
+        self.offsets = {}
+        self.data_filename = data_filename
+
+        with open(data_filename, 'wb') as data_file:
+            offset = 0
+            for i in range(0, len(documents), DocumentStore.block_size):
+                block_documents = documents[i:i + DocumentStore.block_size]
+
+                block = {}
+                for document in block_documents:
+                    block[str(document.get_document_id())] = document.get_zones()
+
+                data = zlib.compress(json.dumps(block).encode("utf8"))
+                data_file.write(data)
+
+                for document in block_documents:
+                    self.offsets[document.get_document_id()] = (offset, len(data))
+
+                offset += len(data)
+
+        with open(index_filename, 'w') as tsv_file:
+            for document_id in sorted(self.offsets):
+                offset, length = self.offsets[document_id]
+                tsv_file.write(str(document_id) + "\t" + str(offset) + "\t" + str(length) + "\n")
+
+    def load(self, data_filename, index_filename):
+        # loads the offset index of a DocumentStore. The data file is only
+        # read when documents are fetched
+        # params:
+        # - data_filename: a string
+        # - index_filename: a string
+        # returns: None
+
+        self.data_filename = data_filename
+
+        with open(index_filename, "r", encoding='utf8', errors='backslashreplace') as tsv_file:
+            for entry in tsv_file:
+                entry_split = entry.split("\t")
+
+                document_id = int(entry_split[0])
+                offset = int(entry_split[1])
+                length = int(entry_split[2])
+
+                self.offsets[document_id] = (offset, length)
+
+    def get_size(self):
+        # returns the number of documents in the store
+        # returns:
+        # - size: an int
+
+        return len(self.offsets)
+
+    def get_documents(self, document_ids):
+        # returns the zones of a set of documents. Each block holding one of
+        # the documents is read and decompressed exactly once
+        # params:
+        # - document_ids: a list of document IDs
+        # returns:
+        # - documents: a dictionary of document_id-zones pairings. Documents
+        #   that are not in the store are omitted
+
+        # group the requested documents by the block that holds them
+        blocks = {}
+        for document_id in document_ids:
+            if document_id in self.offsets:
+                blocks.setdefault(self.offsets[document_id], []).append(document_id)
+
+        documents = {}
+        with open(self.data_filename, 'rb') as data_file:
+            for offset, length in sorted(blocks):
+                data_file.seek(offset)
+                block = json.loads(zlib.decompress(data_file.read(length)).decode("utf8"))
+
+                for document_id in blocks[(offset, length)]:
+                    documents[document_id] = block[str(document_id)]
+
+        return documents
+
+    def get_document(self, document_id):
+        # returns the zones of a single document
+        # params:
+        # - document_id: a document ID
+        # returns:
+        # - zones: a dictionary of zone names and their values, or None
+
+        return self.get_documents([document_id]).get(document_id)
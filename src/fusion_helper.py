@@ -0,0 +1,48 @@
+# This file contains methods that fuse several rankings of the same
+# document collection into a single ranking. Each ranking is a list of
+# [document_id, score] pairings, from the lowest to the highest score, as
+# returned by find_highest_docs.
+
+# the constant added to each rank by reciprocal rank fusion, which limits
+# the influence of the documents ranked highest by a single ranking
+rrf_constant = 60
+
+def reciprocal_rank_fusion(rankings):
+    # fuses rankings by scoring each document by the sum of the reciprocals
+    # of its ranks. Only the order of each ranking is used, so rankings
+    # whose scores are not comparable can be fused
+    # params:
+    # - rankings: a list of rankings
+    # returns:
+    # - fused_docs: a dictionary of document_id-score pairings
+    
+    fused_docs = {}
+    for ranking in rankings:
+        for rank, (document_id, _) in enumerate(reversed(ranking)):
+            fused_docs[document_id] = fused_docs.get(document_id, 0) + 1 / (rrf_constant + rank + 1)
+    
+    return fused_docs
+
+def weighted_score_fusion(rankings, weights):
+    # fuses rankings by scoring each document by the weighted sum of its
+    # scores, after the scores of each ranking are min-max normalized to lie
+    # between 0 and 1. A document missing from a ranking scores 0 in it
+    # params:
+    # - rankings: a list of rankings
+    # - weights: a list of floats, one for each ranking
+    # returns:
+    # - fused_docs: a dictionary of document_id-score pairings
+    
+    fused_docs = {}
+    for ranking, weight in zip(rankings, weights):
+        if not ranking:
+            continue
+        
+        low = ranking[0][1]
+        high = ranking[-1][1]
+        
+        for document_id, score in ranking:
+            normalized = (score - low) / (high - low) if high > low else 1
+            fused_docs[document_id] = fused_docs.get(document_id, 0) + weight * normalized
+    
+    return fused_docs
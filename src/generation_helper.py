@@ -0,0 +1,154 @@
+# This file contains methods that help the setup.py program write each
+# index build into a generation directory of its own, and help readers find
+# the current generation. A manifest file naming the current generation is
+# replaced atomically once a build is complete, so readers never observe a
+# partially written index.
+
+import os
+import json
+import shutil
+
+manifest_file = "manifest.json"
+generations_dir = "generations"
+generation_prefix = "generation_"
+
+# the number of generations kept on disk, so readers that are still loading
+# the previous generation are unaffected when a new generation is published
+generations_kept = 2
+
+def create_generation(directory):
+    # creates a new, empty generation directory within an index directory
+    # params:
+    # - directory: a string representing the index directory
+    # returns:
+    # - generation: a string, the name of the new generation
+    # - generation_directory: a string, the path of the new generation
+
+    parent = os.path.join(directory, generations_dir)
+    os.makedirs(parent, exist_ok=True)
+
+    generations = list_generations(directory)
+
+    number = 0
+    if generations:
+        number = int(generations[-1][len(generation_prefix):]) + 1
+
+    # claim the directory, retrying if a concurrent build claims it first
+    while True:
+        generation = generation_prefix + str(number).zfill(6)
+        generation_directory = os.path.join(parent, generation)
+        try:
+            os.mkdir(generation_directory)
+            return generation, generation_directory
+        except FileExistsError:
+            number += 1
+
+def publish_generation(directory, generation):
+    # makes a generation the current generation of an index directory by
+    # atomically replacing the manifest, then removes old generations
+    # params:
+    # - directory: a string representing the index directory
+    # - generation: a string, the name of the generation
+    # returns: None
+
+    generation_directory = os.path.join(directory, generations_dir, generation)
+
+    manifest = {
+        "generation": generation,
+        "files": sorted(os.listdir(generation_directory))
+    }
+
+    temp_file = os.path.join(directory, manifest_file + ".tmp")
+    with open(temp_file, 'w') as json_file:
+        json.dump(manifest, json_file)
+        json_file.flush()
+        os.fsync(json_file.fileno())
+
+    os.replace(temp_file, os.path.join(directory, manifest_file))
+
+    prune_generations(directory, generation)
+
+def discard_generation(directory, generation):
+    # removes a generation that was never published, such as one whose build
+    # failed while it was being saved, along with the directory of
+    # generations if no other generation is left in it
+    # params:
+    # - directory: a string representing the index directory
+    # - generation: a string, the name of the generation
+    # returns: None
+
+    shutil.rmtree(os.path.join(directory, generations_dir, generation), ignore_errors=True)
+
+    try:
+        os.rmdir(os.path.join(directory, generations_dir))
+    except OSError:
+        pass
+
+def prune_generations(directory, current):
+    # removes all but the newest generations of an index directory, never
+    # removing the current generation
+    # params:
+    # - directory: a string representing the index directory
+    # - current: a string, the name of the current generation
+    # returns: None
+
+    generations = list_generations(directory)
+    for generation in generations[:-generations_kept]:
+        if generation != current:
+            shutil.rmtree(os.path.join(directory, generations_dir, generation), ignore_errors=True)
+
+def list_generations(directory):
+    # returns the names of every generation in an index directory, from the
+    # oldest to the newest
+    # params:
+    # - directory: a string representing the index directory
+    # returns:
+    # - generations: a list of strings
+
+    parent = os.path.join(directory, generations_dir)
+    if not os.path.isdir(parent):
+        return []
+
+    generations = [name for name in os.listdir(parent) if name.startswith(generation_prefix)]
+
+    return sorted(generations)
+
+def get_current_generation(directory):
+    # returns the name of the current generation of an index directory, or
+    # None if the index directory was not built in generations
+    # params:
+    # - directory: a string representing the index directory
+    # returns:
+    # - generation: a string or None
+
+    path = os.path.join(directory, manifest_file)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "r") as json_file:
+        return json.load(json_file)["generation"]
+
+def resolve_index_directory(directory):
+    # returns the directory holding the index files of the current
+    # generation. Index directories that were not built in generations hold
+    # their index files directly
+    # params:
+    # - directory: a string representing the index directory
+    # returns:
+    # - directory: a string
+
+    return get_generation_directory(directory, get_current_generation(directory))
+
+def get_generation_directory(directory, generation):
+    # returns the directory holding the index files of some generation
+    # params:
+    # - directory: a string representing the index directory
+    # - generation: a string, or None for an index directory that was not
+    #   built in generations
+    # returns:
+    # - directory: a string
+
+    if generation is None:
+        return directory
+
+    return os.path.join(directory, generations_dir, generation)
@@ -0,0 +1,563 @@
+# This file holds the functions that load a json-formatted document
+# collection and create an inverted index and document index from it, along
+# with the IndexBuilder class, which gives Python programs a handle for
+# building an index. The setup.py program is a thin wrapper around this module.
+
+import re
+import json
+import math
+import itertools
+from document import Document
+from inverted_index import InvertedIndex
+from document_index import DocumentIndex
+from lexicon import Lexicon
+from document_store import DocumentStore
+from build_checkpoint import BuildCheckpoint
+from input_helper import find_input_files, read_input_files, create_document
+from trigram_index import TrigramIndex
+from token_helper import *
+from generation_helper import *
+from weight_helper import *
+
+
+class IndexBuilder:
+
+    # the number of documents tokenized between checkpoints
+    checkpoint_interval = 10000
+
+    def __init__(self, embedding_field=None, subvectors=None, term_matrix=False, positions=True, filter_fields=None, reorder=False, checkpoint_directory=None, zones=None, trigrams=False):
+        # initializes a new instance of the IndexBuilder class
+        # params:
+        # - embedding_field: the name of the field holding each document's
+        #   embedding in input files, or None if documents have no embeddings
+        # - subvectors: the number of subvectors each embedding is split into
+        #   for product quantization, or None to not quantize embeddings
+        # - term_matrix: a bool, True to save the document-term matrix used
+        #   to score batches of queries, rather than building it when needed
+        # - positions: a bool, False to save the index without term
+        #   positions, which makes it smaller but unable to answer phrase
+        #   queries
+        # - filter_fields: a list of the names of fields indexed as
+        #   filterable attributes rather than as text, or None
+        # - reorder: a bool, True to assign the documents new document IDs
+        #   that place similar documents next to each other, keeping their
+        #   IDs in the input as their external IDs
+        # - checkpoint_directory: a string, the directory in which the
+        #   progress of the build is checkpointed, or None to not checkpoint
+        # - zones: a list of the names of zones whose terms are also indexed
+        #   in postings of their own, so queries can be restricted to them,
+        #   or None
+        # - trigrams: a bool, True to save the trigram index of the term
+        #   dictionary used by fuzzy queries, rather than building it when
+        #   needed
+        # returns: None
+
+        self.embedding_field = embedding_field
+        self.subvectors = subvectors
+        self.term_matrix = term_matrix
+        self.positions = positions
+        self.filter_fields = filter_fields or []
+        self.reorder = reorder
+        self.zones = zones or []
+        self.trigrams = trigrams
+        self.checkpoint = None
+
+        # zones are named in queries as a prefix of their terms
+        for zone in self.zones:
+            if not re.fullmatch(r"\w+", zone):
+                raise Exception("Zone {} must be named with letters, digits, and underscores".format(zone))
+
+        if checkpoint_directory is not None:
+            self.checkpoint = BuildCheckpoint(checkpoint_directory)
+
+        self.documents = []
+        self.document_ids = set()
+        self.lexicon = Lexicon()
+
+        self.inverted_index = None
+        self.document_index = None
+
+        # the external ID of each document, by its new document ID, once
+        # the documents are reordered
+        self.external_ids = None
+
+    def add_document(self, document_id, zones, embedding=None):
+        # adds a document to the collection, raising an error if a document
+        # with the same ID has already been added
+        # params:
+        # - document_id: an int
+        # - zones: a dictionary of zone names and string values
+        # - embedding: a list of floats, or None
+        # returns: None
+
+        text_zones = {zone: value for zone, value in zones.items() if zone not in self.filter_fields}
+
+        self.add_documents([Document(document_id, join_zones(text_zones), dict(zones), embedding)])
+
+    def add_documents(self, documents):
+        # adds a list of documents to the collection, raising an error if a
+        # document with the same ID has already been added
+        # params:
+        # - documents: a list of Document objects
+        # returns: None
+
+        for document in documents:
+            document_id = document.get_document_id()
+
+            if document_id in self.document_ids:
+                raise Exception("Found duplicate doc ID {}".format(document_id))
+
+            if not document.get_zones() and document.get_embedding() is None:
+                raise Exception("Document {} is missing zones".format(document_id))
+
+            self.document_ids.add(document_id)
+            self.documents.append(document)
+
+    def add_file(self, file):
+        # adds every document in a json-formatted, UTF-8 encoded file to the
+        # collection
+        # params:
+        # - file: name of the json-formatted file
+        # returns: None
+
+        self.add_documents(load_documents(file, self.embedding_field, self.filter_fields))
+
+    def add_files(self, path, workers=None):
+        # adds every document in the input files named by a path to the
+        # collection: a file, a directory, or a glob pattern. Files may hold
+        # a JSON array or JSON Lines, compressed with gzip or zstd, and are
+        # parsed in worker processes. Records that can not be read, and
+        # documents whose IDs have already been added, are skipped and
+        # reported rather than raising an error
+        # params:
+        # - path: a string
+        # - workers: an int, the number of worker processes, or None to use
+        #   one for each processor
+        # returns:
+        # - report: a list holding, for each file, a [file, documents,
+        #   errors] triple of its name, the number of documents added, and a
+        #   list of strings describing the records skipped
+
+        report = []
+        for file, documents, errors in read_input_files(find_input_files(path), self.embedding_field, self.filter_fields, workers):
+            added = []
+            for document in documents:
+                if document.get_document_id() in self.document_ids:
+                    errors.append("Found duplicate doc ID {}".format(document.get_document_id()))
+                    continue
+
+                self.document_ids.add(document.get_document_id())
+                added.append(document)
+
+            self.documents.extend(added)
+            report.append([file, len(added), errors])
+
+        return report
+
+    def build(self, resume=False):
+        # tokenizes and normalizes every document in the collection,
+        # reorders the documents if requested, then creates the inverted
+        # index and document index. When checkpointing, the documents are
+        # tokenized in batches, and each batch is saved to the checkpoint
+        # params:
+        # - resume: a bool, True to restore the batches saved to the
+        #   checkpoint by an earlier build of the same documents, and only
+        #   tokenize the documents after them
+        # returns:
+        # - inverted_index: an InvertedIndex object
+        # - document_index: a DocumentIndex object
+
+        if self.external_ids is not None:
+            raise Exception("Reordered documents cannot be built again")
+
+        if self.checkpoint is None:
+            if resume:
+                raise Exception("Only checkpointed builds can be resumed")
+
+            preprocess_documents(self.documents, self.lexicon, self.zones, self.filter_fields)
+        else:
+            start = self.restore_checkpoint() if resume else 0
+            if not resume:
+                self.checkpoint.start(self.get_checkpoint_options())
+
+            for i in range(start, len(self.documents), IndexBuilder.checkpoint_interval):
+                batch = self.documents[i:i + IndexBuilder.checkpoint_interval]
+
+                lexicon_size = self.lexicon.get_size()
+                preprocess_documents(batch, self.lexicon, self.zones, self.filter_fields)
+
+                self.checkpoint.save_batch(batch, list(itertools.islice(self.lexicon.entries.items(), lexicon_size, None)))
+
+        if self.reorder:
+            self.external_ids = reorder_documents(self.documents)
+
+        self.inverted_index, self.document_index = create_indexes(self.documents, self.external_ids)
+
+        return self.inverted_index, self.document_index
+
+    def get_checkpoint_options(self):
+        # returns the build options recorded by a checkpoint, which a resumed
+        # build must share: those changing how documents are tokenized, and
+        # those changing the index built from them
+        # params: None
+        # returns:
+        # - options: a dictionary
+
+        return {
+            "zones": sorted(self.zones),
+            "filter_fields": sorted(self.filter_fields),
+            "positions": self.positions,
+            "reorder": self.reorder
+        }
+
+    def restore_checkpoint(self):
+        # restores the terms of the documents, and the lexicon, from the
+        # batches saved to the checkpoint
+        # params: None
+        # returns:
+        # - start: an int, the number of documents restored
+
+        start = 0
+        for number in range(self.checkpoint.resume(self.get_checkpoint_options())):
+            batch_size, lexicon_entries = self.checkpoint.load_batch(number, self.documents, start)
+
+            for token, terms in lexicon_entries:
+                self.lexicon.register_token(token, terms)
+
+            start += batch_size
+
+        return start
+
+    def get_postings_sizes(self):
+        # estimates the bytes needed to store the document IDs of the
+        # postings as variable-byte encoded gaps, using the document IDs in
+        # the input and the document IDs of the built index
+        # params: None
+        # returns:
+        # - input_size: an int
+        # - size: an int
+
+        if self.inverted_index is None:
+            raise Exception("Index must be built before it is measured")
+
+        from reorder_helper import get_postings_size
+
+        size = get_postings_size(self.inverted_index)
+        if self.external_ids is None:
+            return size, size
+
+        return get_postings_size(self.inverted_index, self.external_ids), size
+
+    def save(self, directory):
+        # saves the built indexes into a new generation of an index
+        # directory, then makes it the current generation
+        # params:
+        # - directory: a string representing the index directory
+        # returns:
+        # - generation: a string, the name of the new generation
+
+        if self.inverted_index is None:
+            raise Exception("Index must be built before it is saved")
+
+        generation, generation_directory = create_generation(directory)
+
+        # a generation that fails to save is never published, and is removed
+        try:
+            save_indexes(self.inverted_index, self.document_index, generation_directory, self.lexicon, self.positions)
+            save_documents(self.documents, generation_directory)
+            save_vectors(self.documents, generation_directory, self.subvectors)
+            if self.term_matrix:
+                save_term_matrix(self.inverted_index, self.document_index, generation_directory)
+            if self.trigrams:
+                save_trigrams(self.inverted_index, generation_directory)
+            if self.filter_fields:
+                save_attributes(self.documents, generation_directory, self.filter_fields)
+        except BaseException:
+            discard_generation(directory, generation)
+            raise
+
+        publish_generation(directory, generation)
+
+        # the build no longer needs to be resumed once it is published
+        if self.checkpoint is not None:
+            self.checkpoint.remove()
+
+        return generation
+
+def load_documents(file, embedding_field=None, filter_fields=()):
+    # This function loads the contents of a json-formatted, UTF-8 encoded
+    # file into memory, storing the infromation as a list of Document
+    # objects. If any documents in the iinput file have the same IDs, the 
+    # function with throw an error
+    # params
+    # - file: name of the json-formatted file
+    # - embedding_field: the name of the field holding each document's
+    #   embedding, which is stored apart from the zones, or None
+    # - filter_fields: the names of fields that are kept with the zones
+    #   but not indexed as text
+    # returns
+    # - documents: a list of Document objects
+    
+    documents = []
+    document_ids = set()
+
+    # loads the contents of a UTF-8 file into memory
+    with open(file, "r", encoding='utf8', errors='backslashreplace') as json_file:
+        data = json.load(json_file)
+        for item in data:
+            document_id = None
+            
+            try:
+                document_id = item["document_id"]
+                document_id = int(document_id)
+            except:
+                raise Exception("Document does not contain document_id field")
+            
+            if document_id in document_ids:
+                raise Exception("Found duplicate doc ID {}".format(document_id))
+            
+            document_ids.add(document_id)
+            
+            documents.append(create_document(item, embedding_field, filter_fields))
+    
+    return documents
+    
+def preprocess_documents(documents, lexicon=None, zones=(), filter_fields=()):
+    # This function converts all document data into a set of tokens, 
+    # then to a set of terms belonging to equivalnece classes. If a lexicon
+    # is supplied, every token seen is recorded in it alongside its terms.
+    # The terms found within any of the supplied zones are also added as
+    # zone terms, such as title:swift, at the same positions
+    # params:
+    # - documents: a list of Document objects
+    # - lexicon: a Lexicon object, or None
+    # - zones: a list of zone names
+    # - filter_fields: a list of the names of zones that are not text
+    # returns:
+    # - documents: a list of Document objects
+    
+    for document in documents:
+        if not zones:
+            data = document.get_data()
+            
+            tokens = tokenize_string(data)
+            terms = normalize_tokens(tokens, lexicon, register=True)
+            
+            for i in range(len(terms)):
+                document.add_term(terms[i], i)
+            
+            continue
+        
+        # tokenize each zone in turn, numbering positions as they are
+        # numbered in the zones joined together
+        position = 0
+        for zone, value in document.get_zones().items():
+            if zone in filter_fields:
+                continue
+            
+            terms = normalize_tokens(tokenize_string(value), lexicon, register=True)
+            
+            for term in terms:
+                document.add_term(term, position)
+                if zone in zones:
+                    document.add_term(get_zone_term(zone, term), position)
+                position += 1
+
+def reorder_documents(documents):
+    # This function sorts a list of tokenized documents so that documents
+    # sharing terms are next to each other, and replaces the ID of each
+    # document with its position in the list. The gaps between the document
+    # IDs in each postings list are then smaller, and the documents a query
+    # matches are closer together
+    # params:
+    # - documents: a list of Document objects
+    # returns:
+    # - external_ids: a list holding the original ID of each document, by
+    #   its new document ID
+
+    # numpy is only needed by builds that reorder documents
+    from reorder_helper import find_document_order
+
+    documents[:] = [documents[i] for i in find_document_order(documents)]
+
+    external_ids = []
+    for document_id, document in enumerate(documents):
+        external_ids.append(document.get_document_id())
+        document.set_document_id(document_id)
+
+    return external_ids
+
+def create_indexes(documents, external_ids=None):
+    # This function takes a set of documents which have already been tokenized,
+    # and creates an inverted index based on the tokens and the doc IDs in
+    # which they correspond
+    # params:
+    # - document: a list of Document objects
+    # - external_ids: a list holding the original ID of each document, by
+    #   its document ID, when the documents were reordered, or None
+    # returns:
+    # - dictionaries: a dict with zones as keys and Dictionary objects as values
+    # - postings: a dict with zones as keys and PostingLists objects as values
+
+    # created indexes
+    inverted_index = InvertedIndex()
+    document_index = DocumentIndex()
+
+    # populate inverted index
+    max_tfs = {}
+    for document in documents:
+
+        document_id = document.get_document_id()
+        terms = document.get_terms()
+        
+        max_tf = 0
+        
+        for term, positions in terms.items():
+            # add term to inverted index
+            tf = len(positions)
+            inverted_index.register_term(term, document_id, tf, positions)
+            
+            # update maximum document tf
+            if tf > max_tf:
+                max_tf = tf
+                
+        max_tfs[document_id] = max_tf
+        
+    # populate document index
+    N = len(documents)
+    for document in documents:
+        document_id = document.get_document_id()
+        terms = document.get_terms()
+        
+        max_tf = max_tfs[document_id]
+        cos_norm_squared = 0
+        
+        for term, positions in terms.items():
+            # the terms of zones repeat the document's own terms, so they
+            # are left out of its length, which stays the same whether or
+            # not zones are indexed
+            if is_zone_term(term):
+                continue
+            
+            # calculate partial document term weight
+            df = inverted_index.get_df(term)
+            tf = len(positions)
+            doc_df_weight = get_doc_df_weight(N, df)
+            doc_tf_weight = get_doc_tf_weight(tf, max_tf)
+            doc_term_weight = doc_tf_weight * doc_df_weight
+            
+            # sum the square of document weights
+            cos_norm_squared += doc_term_weight ** 2
+            
+        # recover the cosine normalization factor
+        cos_norm = math.sqrt(cos_norm_squared)
+        
+        external_id = None
+        if external_ids is not None:
+            external_id = external_ids[document_id]
+        
+        document_index.register_document(document_id, max_tf, cos_norm, external_id)
+        
+    return inverted_index, document_index
+
+def save_indexes(inverted_index, document_index, directory, lexicon=None, positions=True):
+    # This function saves an inverted index and document index as a TSV file,
+    # along with the lexicon used to normalize the documents if supplied.
+    # Term positions are saved in a file of their own, so that queries
+    # without phrases never read them
+    # params:
+    # - inverted_index: InvertedIndex object
+    # - document_index: DocumentIndex object
+    # - directory: a string representing the directory to save the index
+    # - lexicon: a Lexicon object, or None
+    # - positions: a bool, False to not save term positions
+    
+    positions_file = None
+    if positions:
+        positions_file = directory + "/" + "positions.dat"
+    
+    inverted_index.save_TSV(directory + "/" + "inverted_index.tsv", positions_file)
+    document_index.save_TSV(directory + "/" + "document_index.tsv")
+    
+    if lexicon is not None:
+        lexicon.save_TSV(directory + "/" + "lexicon.tsv")
+
+def save_documents(documents, directory):
+    # This function saves the original zones of every document in a
+    # block-compressed document store, so that results can be returned
+    # along with their contents
+    # params:
+    # - documents: a list of Document objects
+    # - directory: a string representing the directory to save the store
+    
+    document_store = DocumentStore()
+    document_store.save(
+        documents,
+        directory + "/" + "document_store.dat",
+        directory + "/" + "document_store.tsv"
+    )
+
+def save_vectors(documents, directory, subvectors=None):
+    # This function saves the embeddings of any documents that have them as
+    # a VectorIndex, including its IVF index for approximate search, and
+    # its PQ index if subvectors is supplied
+    # params:
+    # - documents: a list of Document objects
+    # - directory: a string representing the directory to save the index
+    # - subvectors: an int, or None
+
+    embeddings = {}
+    for document in documents:
+        if document.get_embedding() is not None:
+            embeddings[document.get_document_id()] = document.get_embedding()
+
+    if not embeddings:
+        return
+
+    # numpy is only needed by collections that have embeddings
+    from vector_index import VectorIndex
+
+    vector_index = VectorIndex()
+    vector_index.build(embeddings, subvectors=subvectors)
+    vector_index.save(directory)
+
+def save_attributes(documents, directory, fields):
+    # This function saves the values of a set of fields in every document as
+    # an AttributeIndex, so that queries can be filtered by them
+    # params:
+    # - documents: a list of Document objects
+    # - directory: a string representing the directory to save the index
+    # - fields: a list of field names
+
+    # numpy is only needed by indexes that have filterable fields
+    from attribute_index import AttributeIndex
+
+    attribute_index = AttributeIndex()
+    attribute_index.build(documents, fields)
+    attribute_index.save(directory)
+
+def save_term_matrix(inverted_index, document_index, directory):
+    # This function saves the inverted index as a sparse document-term
+    # matrix, used to score batches of queries
+    # params:
+    # - inverted_index: InvertedIndex object
+    # - document_index: DocumentIndex object
+    # - directory: a string representing the directory to save the matrix
+
+    # scipy is only needed by indexes that save a document-term matrix
+    from term_matrix import TermMatrix
+
+    term_matrix = TermMatrix()
+    term_matrix.build(inverted_index, document_index)
+    term_matrix.save(directory + "/" + "term_matrix.npz")
+
+def save_trigrams(inverted_index, directory):
+    # This function saves the trigram index of the terms in the inverted
+    # index, used to find the terms near a misspelled term
+    # params:
+    # - inverted_index: InvertedIndex object
+    # - directory: a string representing the directory to save the index
+
+    trigram_index = TrigramIndex()
+    trigram_index.build(inverted_index.entries)
+    trigram_index.save_TSV(directory + "/" + "trigram_index.tsv")
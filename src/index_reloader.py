@@ -0,0 +1,92 @@
+# The IndexReloader class holds the indexes loaded from the current
+# generation of an index directory. A background thread watches the
+# directory's manifest and, when a new generation is published, loads it and
+# swaps it in. Readers take a reference to the loaded indexes once per query,
+# so queries that are in flight during a swap finish on the old generation.
+
+import threading
+import time
+from generation_helper import *
+
+class IndexReloader:
+
+    def __init__(self, directory, load_function):
+        # initializes a new instance of the IndexReloader class
+        # params:
+        # - directory: a string representing the index directory
+        # - load_function: a function accepting the index directory and the
+        #   name of a generation, and returning the indexes loaded from that
+        #   generation. The name is None for an index directory that was not
+        #   built in generations
+        # returns: None
+
+        self.directory = directory
+        self.load_function = load_function
+
+        # the generation name and indexes are swapped together, as one tuple
+        self.current = (None, None)
+
+        self.thread = None
+        self.stopped = threading.Event()
+
+    def load(self):
+        # loads the current generation of the index directory, if it is not
+        # already loaded, and swaps it in once loading has finished
+        # params: None
+        # returns:
+        # - bool: True if a new generation was swapped in
+
+        generation = get_current_generation(self.directory)
+        if self.current[1] is not None and generation == self.current[0]:
+            return False
+
+        indexes = self.load_function(self.directory, generation)
+        self.current = (generation, indexes)
+
+        return True
+
+    def get_indexes(self):
+        # returns the name of the loaded generation and its indexes. Callers
+        # should hold on to the returned indexes for the length of a query
+        # params: None
+        # returns:
+        # - generation: a string, or None for an index directory that was
+        #   not built in generations
+        # - indexes: the value returned by the load function
+
+        return self.current
+
+    def start(self, interval):
+        # starts a background thread that checks for a new generation every
+        # interval seconds
+        # params:
+        # - interval: a float
+        # returns: None
+
+        self.thread = threading.Thread(target=self.watch, args=(interval,), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        # stops the background thread
+        # params: None
+        # returns: None
+
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def watch(self, interval):
+        # checks for a new generation every interval seconds until stopped.
+        # A generation that fails to load is reported and retried, while the
+        # previous generation continues to serve queries
+        # params:
+        # - interval: a float
+        # returns: None
+
+        while not self.stopped.wait(interval):
+            try:
+                start = time.time()
+                if self.load():
+                    print("Loaded index generation {} in {:.2f}s".format(self.current[0], time.time() - start))
+            except Exception as e:
+                print("Could not load new index generation: " + str(e))
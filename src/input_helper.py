@@ -0,0 +1,215 @@
+# This file contains methods that help the setup.py program read a document
+# collection split across many input files. The input may be a single file,
+# a directory, or a glob pattern, and each file may hold a JSON array of
+# documents or JSON Lines, with one document on each line, and may be
+# compressed with gzip or zstd. Files are decompressed as they are read, and
+# are parsed in worker processes, several at once. A record that can not be
+# read is reported with its file and skipped, rather than ending the build.
+
+import io
+import os
+import glob
+import gzip
+import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from document import Document
+from token_helper import join_zones
+
+# the extensions of the files read from an input directory, before any
+# compression extension
+input_extensions = (".json", ".jsonl", ".ndjson")
+compression_extensions = (".gz", ".zst")
+
+def find_input_files(path):
+    # finds the input files named by a path: a file, every input file within
+    # a directory and its subdirectories, or every file matching a glob
+    # pattern, in sorted order
+    # params:
+    # - path: a string
+    # returns:
+    # - files: a list of strings
+
+    if os.path.isfile(path):
+        return [path]
+
+    if os.path.isdir(path):
+        files = []
+        for directory, _, filenames in os.walk(path):
+            for filename in filenames:
+                if is_input_file(filename):
+                    files.append(os.path.join(directory, filename))
+    else:
+        files = [file for file in glob.glob(path, recursive=True) if os.path.isfile(file)]
+
+    if not files:
+        raise Exception("{} does not name any input files".format(path))
+
+    return sorted(files)
+
+def is_input_file(filename):
+    # returns whether a file within an input directory holds documents,
+    # judged by its extensions
+    # params:
+    # - filename: a string
+    # returns:
+    # - bool
+
+    for extension in compression_extensions:
+        if filename.endswith(extension):
+            filename = filename[:-len(extension)]
+
+    return filename.endswith(input_extensions)
+
+def open_input_file(file):
+    # opens an input file for reading as UTF-8 encoded text, decompressing
+    # it as it is read if it is compressed with gzip or zstd
+    # params:
+    # - file: a string
+    # returns:
+    # - text_file: a file object
+
+    if file.endswith(".gz"):
+        return gzip.open(file, "rt", encoding="utf8", errors="backslashreplace")
+
+    if file.endswith(".zst"):
+        # zstandard is only needed to read zstd-compressed input
+        try:
+            import zstandard
+        except ImportError:
+            raise Exception("Reading {} requires the zstandard package".format(file))
+
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file, "rb"), closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf8", errors="backslashreplace")
+
+    return open(file, "r", encoding="utf8", errors="backslashreplace")
+
+def read_input_file(file, embedding_field=None, filter_fields=()):
+    # reads the documents of an input file, skipping the records that can
+    # not be read. A file starting with "[" is read as a JSON array, and any
+    # other file as JSON Lines, one line at a time. If the file can not be
+    # read to its end, such as a truncated compressed file, the documents
+    # read before the error are kept
+    # params:
+    # - file: a string
+    # - embedding_field: the name of the field holding each document's
+    #   embedding, or None
+    # - filter_fields: the names of fields that are kept with the zones
+    #   but not indexed as text
+    # returns:
+    # - documents: a list of Document objects
+    # - errors: a list of strings, describing each record skipped, or the
+    #   error that stopped the file from being read
+
+    documents = []
+    errors = []
+
+    try:
+        with open_input_file(file) as text_file:
+            # find the first line holding anything
+            lines = []
+            for line in text_file:
+                lines.append(line)
+                if line.strip():
+                    break
+
+            json_lines = not "".join(lines).lstrip().startswith("[")
+
+            if json_lines:
+                records = enumerate(itertools.chain(lines, text_file), 1)
+                location = "line {}"
+            else:
+                data = json.loads("".join(lines) + text_file.read())
+                if not isinstance(data, list):
+                    raise Exception("File does not hold a JSON array")
+
+                records = enumerate(data, 1)
+                location = "record {}"
+
+            for number, record in records:
+                try:
+                    if json_lines:
+                        if not record.strip():
+                            continue
+                        record = json.loads(record)
+
+                    documents.append(create_document(record, embedding_field, filter_fields))
+
+                except ValueError as e:
+                    errors.append((location + ": Invalid JSON: {}").format(number, e))
+                except Exception as e:
+                    errors.append((location + ": {}").format(number, e))
+
+    except Exception as e:
+        errors.append("Could not read file: {}".format(e))
+
+    return documents, errors
+
+def create_document(item, embedding_field=None, filter_fields=()):
+    # creates a Document object from a record of an input file, raising an
+    # error if the record has no document ID or no zones
+    # params:
+    # - item: a dictionary
+    # - embedding_field: the name of the field holding the document's
+    #   embedding, or None
+    # - filter_fields: the names of fields that are kept with the zones
+    #   but not indexed as text
+    # returns:
+    # - document: a Document object
+
+    try:
+        document_id = int(item["document_id"])
+    except:
+        raise Exception("Document does not contain document_id field")
+
+    if len(item) <= 1:
+        raise Exception("Document {} is missing zones".format(document_id))
+
+    zones = {}
+    text_zones = {}
+    embedding = None
+    for zone, data in item.items():
+        if zone == embedding_field:
+            embedding = data
+        elif zone != "document_id":
+            zones[zone] = data
+            if zone not in filter_fields:
+                text_zones[zone] = data
+
+    return Document(document_id, join_zones(text_zones), zones, embedding)
+
+def read_input_files(files, embedding_field=None, filter_fields=(), workers=None):
+    # reads the documents of several input files, parsing up to workers
+    # files at once in worker processes. The documents of each file are
+    # yielded in the order of the files, as soon as the file is read
+    # params:
+    # - files: a list of strings
+    # - embedding_field: the name of the field holding each document's
+    #   embedding, or None
+    # - filter_fields: the names of fields that are kept with the zones
+    #   but not indexed as text
+    # - workers: an int, the number of worker processes, or None to use one
+    #   for each processor. Files are read in this process when there is
+    #   only one worker or one file
+    # returns:
+    # - results: a generator of [file, documents, errors] triples
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(files))
+
+    if workers <= 1:
+        for file in files:
+            documents, errors = read_input_file(file, embedding_field, filter_fields)
+            yield file, documents, errors
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            read_input_file,
+            files,
+            [embedding_field] * len(files),
+            [filter_fields] * len(files)
+        )
+        for file, (documents, errors) in zip(files, results):
+            yield file, documents, errors
@@ -1,14 +1,35 @@
 # The InvertedIndex class represents the dictionary data structure that
 # stores all terms, their document frequencies, and the postings lists
-# the belong to them
+# the belong to them. Once loaded, the postings of terms found in a large
+# fraction of documents are stored as a bitmap of document IDs, with their
+# document IDs and term frequencies in compact arrays alongside
 
 import re
+import sys
+import heapq
+import bisect
+import itertools
+from array import array
 from sorted_list_helper import *
+from bitmap_helper import *
 
 class InvertedIndex:
 
     postings = "postings"
     df = "df"
+    positions = "positions"
+    bitmap = "bitmap"
+    document_ids = "document_ids"
+    tfs = "tfs"
+    starts = "starts"
+
+    # the number of bytes used to store each position
+    position_size = 4
+
+    # a term's postings are stored as a bitmap when the term is found in at
+    # least this fraction of document IDs, as the bitmap then takes no more
+    # than a byte for each posting
+    dense_fraction = 1 / 8
 
     def __init__(self):
         # initializes a new instance of the InvertedIndex class
@@ -17,6 +38,14 @@ class InvertedIndex:
         
         self.entries = {}
 
+        # the file holding the positions of a loaded index, which are read
+        # only when a query needs them
+        self.positions_filename = None
+        self.positional = True
+
+        # an optional cache of the postings decoded from the positions file
+        self.cache = None
+
     def register_term(self, term, document_id, tf, positions):
         # adds a term to the dictionary but only if the term does not already
         # exist. Increments the document frequency by one when a document_id is 
@@ -40,16 +69,60 @@ class InvertedIndex:
             }
             
     def get_postings(self, term):
-        # returns the set of postings associated with some term
+        # returns the set of postings associated with some term. The
+        # postings of a loaded index do not include positions, and those of
+        # a term stored as a bitmap are a DensePostings view of its arrays
         # params:
         # - term: a string
         # returns:
         # - posting: a list of document_id, tf, [positions]
         
-        if term in self.entries:
-            return self.entries[term][InvertedIndex.postings]
+        if term not in self.entries:
+            return []
+        
+        entry = self.entries[term]
+        if InvertedIndex.bitmap in entry:
+            return DensePostings(entry[InvertedIndex.document_ids], entry[InvertedIndex.tfs])
+        
+        return entry[InvertedIndex.postings]
+
+    def get_document_ids(self, term):
+        # returns the sorted IDs of the documents containing some term
+        # params:
+        # - term: a string
+        # returns:
+        # - document_ids: a sorted list of document IDs
+        
+        if term not in self.entries:
+            return []
+        
+        entry = self.entries[term]
+        if InvertedIndex.bitmap in entry:
+            return entry[InvertedIndex.document_ids].tolist()
+        
+        return [posting[0] for posting in entry[InvertedIndex.postings]]
+
+    def is_dense(self, term):
+        # returns whether the postings of some term are stored as a bitmap
+        # params:
+        # - term: a string
+        # returns:
+        # - bool
+        
+        return term in self.entries and InvertedIndex.bitmap in self.entries[term]
+
+    def get_bitmap(self, term):
+        # returns the bitmap of the documents containing some term. The
+        # bitmap of a term stored as a sorted list is created on each call
+        # params:
+        # - term: a string
+        # returns:
+        # - bitmap: an int
+        
+        if self.is_dense(term):
+            return self.entries[term][InvertedIndex.bitmap]
         
-        return []
+        return list_to_bitmap(self.get_document_ids(term))
     
     def get_df(self, term):
         # returns the document frequency associated with some term
@@ -70,26 +143,286 @@ class InvertedIndex:
         
         return len(self.entries)
 
-    def save_TSV(self, filename):
-        # saves the InvertedIndex instance as a tab-seperated values file
+    def get_memory_size(self):
+        # estimates the bytes of memory used by the index. The size of each
+        # postings list is estimated from the size of its first posting, so
+        # that the estimate takes time proportional to the number of terms
+        # returns:
+        # - size: an int
+        
+        size = sys.getsizeof(self.entries)
+        for term, entry in self.entries.items():
+            size += sys.getsizeof(term) + sys.getsizeof(entry)
+            
+            if InvertedIndex.bitmap in entry:
+                for key in (InvertedIndex.bitmap, InvertedIndex.document_ids, InvertedIndex.tfs, InvertedIndex.starts):
+                    if key in entry:
+                        size += sys.getsizeof(entry[key])
+                continue
+            
+            postings = entry[InvertedIndex.postings]
+            size += sys.getsizeof(postings)
+            if postings:
+                posting_size = sys.getsizeof(postings[0]) + sum(sys.getsizeof(value) for value in postings[0])
+                size += posting_size * len(postings)
+        
+        return size
+
+    def set_cache(self, cache):
+        # sets the cache that holds postings lists once their positions have
+        # been read from the positions file
+        # params:
+        # - cache: a PostingsCache object, or None
+        # returns: None
+        
+        self.cache = cache
+
+    def get_highest_df_terms(self, n):
+        # returns the n terms with the highest document frequencies
+        # params:
+        # - n: an int
+        # returns:
+        # - terms: a list of strings
+        
+        return heapq.nlargest(n, self.entries, key=lambda term: self.entries[term][InvertedIndex.df])
+
+    def get_positions_range(self, term):
+        # returns where the positions of some term are stored in the
+        # positions file
+        # params:
+        # - term: a string
+        # returns:
+        # - positions_range: an [offset, length] pairing in bytes, or None if
+        #   the term's positions are not read from the positions file
+
+        if self.positions_filename is None or term not in self.entries:
+            return None
+
+        entry = self.entries[term]
+        if InvertedIndex.positions not in entry:
+            return None
+
+        offset, length = entry[InvertedIndex.positions]
+
+        return [offset, length]
+
+    def has_positions(self):
+        # returns whether the positions of every term are available
+        # returns:
+        # - bool
+        
+        return self.positional
+
+    def get_positional_postings(self, term):
+        # returns the set of postings associated with some term, including
+        # the positions of the term in each document. Positions that are not
+        # held in memory are read from the positions file, unless the cache
+        # holds them. The returned postings must not be modified
+        # params:
+        # - term: a string
+        # returns:
+        # - posting: a list of document_id, tf, [positions]
+        
+        if term not in self.entries:
+            return []
+        
+        entry = self.entries[term]
+        if InvertedIndex.positions not in entry:
+            return entry[InvertedIndex.postings]
+        
+        if self.cache is not None:
+            positional_postings = self.cache.get(term)
+            if positional_postings is not None:
+                return positional_postings
+        
+        offset, length = entry[InvertedIndex.positions]
+        positions = self.read_positions(offset, length)
+        
+        postings = self.get_postings(term)
+        
+        positional_postings = []
+        start = 0
+        for document_id, tf in postings:
+            positional_postings.append([document_id, tf, positions[start:start + tf]])
+            start += tf
+        
+        if self.cache is not None:
+            self.cache.put(term, positional_postings)
+        
+        return positional_postings
+
+    def get_positions(self, term, document_id):
+        # returns the positions of a term in a single document, reading only
+        # that document's positions from the positions file
+        # params:
+        # - term: a string
+        # - document_id: a document ID
+        # returns:
+        # - positions: a list of integers
+        
+        if self.is_dense(term):
+            entry = self.entries[term]
+            document_ids = entry[InvertedIndex.document_ids]
+            
+            i = bisect.bisect_left(document_ids, document_id)
+            if i >= len(document_ids) or document_ids[i] != document_id:
+                return []
+            
+            # the positions of the documents before this one are skipped,
+            # counted once for the term by the running sum of its tfs
+            starts = entry.get(InvertedIndex.starts)
+            if starts is None:
+                starts = array('q', [0])
+                starts.extend(itertools.accumulate(entry[InvertedIndex.tfs]))
+                entry[InvertedIndex.starts] = starts
+            
+            skipped = starts[i]
+            tf = starts[i + 1] - skipped
+        
+        else:
+            postings = self.get_postings(term)
+            
+            i = search_mlist(document_id, postings)
+            if i >= len(postings) or postings[i][0] != document_id:
+                return []
+            
+            entry = self.entries[term]
+            if InvertedIndex.positions not in entry:
+                return postings[i][2]
+            
+            skipped = sum(posting[1] for posting in postings[:i])
+            tf = postings[i][1]
+        
+        offset, _ = entry[InvertedIndex.positions]
+        
+        return self.read_positions(
+            offset + skipped * InvertedIndex.position_size,
+            tf * InvertedIndex.position_size
+        )
+
+    def select_postings(self, term, document_ids):
+        # returns the postings of some term in a set of documents, without
+        # reconstructing the whole postings list of a term stored as a bitmap
+        # params:
+        # - term: a string
+        # - document_ids: a sorted list of document IDs
+        # returns:
+        # - postings: a list of document_id, tf
+        
+        if not self.is_dense(term):
+            return select_mlist(document_ids, self.get_postings(term))
+        
+        entry = self.entries[term]
+        bitmap = entry[InvertedIndex.bitmap]
+        all_document_ids = entry[InvertedIndex.document_ids]
+        tfs = entry[InvertedIndex.tfs]
+        
+        postings = []
+        for document_id in intersect_bitmap_list(bitmap, document_ids):
+            postings.append([document_id, tfs[bisect.bisect_left(all_document_ids, document_id)]])
+        
+        return postings
+
+    def select_positional_postings(self, term, document_ids):
+        # returns the postings of some term in a set of documents that all
+        # contain it, including the positions of the term in each
+        # params:
+        # - term: a string
+        # - document_ids: a sorted list of document IDs, each containing the
+        #   term
+        # returns:
+        # - postings: a list of document_id, tf, [positions]
+        
+        positional_postings = self.get_positional_postings(term)
+        if not self.is_dense(term):
+            return select_mlist(document_ids, positional_postings)
+        
+        # find each document's posting by its rank among the term's documents
+        all_document_ids = self.entries[term][InvertedIndex.document_ids]
+        
+        return [positional_postings[bisect.bisect_left(all_document_ids, document_id)] for document_id in document_ids]
+
+    def read_positions(self, offset, length):
+        # reads a run of positions from the positions file
+        # params:
+        # - offset: an int, the byte offset of the first position
+        # - length: an int, the number of bytes to read
+        # returns:
+        # - positions: a list of integers
+        
+        if self.positions_filename is None:
+            raise Exception("Phrase queries are not supported by an index built without positions")
+        
+        with open(self.positions_filename, 'rb') as positions_file:
+            positions_file.seek(offset)
+            positions = array('I', positions_file.read(length))
+        
+        if sys.byteorder == "big":
+            positions.byteswap()
+        
+        return positions.tolist()
+
+    def save_TSV(self, filename, positions_filename=None):
+        # saves the InvertedIndex instance as a tab-seperated values file.
+        # The positions of each term are saved separately, as a run of
+        # little-endian integers in a binary file, and the offset and length
+        # of the run are saved with the term. If no positions file is
+        # supplied, the positions are not saved
         # params:
         # - filename: a string
+        # - positions_filename: a string, or None
         # returns: None
         
-        with open(filename, 'w') as tsv_file:
-            for term in sorted(self.entries):
-                tsv_file.write(
-                    term + "\t" +
-                    str(self.entries[term][InvertedIndex.df]) + "\t" +
-                    str(self.entries[term][InvertedIndex.postings]) + "\n"
-                )
+        positions_file = None
+        if positions_filename is not None:
+            positions_file = open(positions_filename, 'wb')
+        
+        try:
+            with open(filename, 'w') as tsv_file:
+                offset = 0
+                for term in sorted(self.entries):
+                    postings = self.get_positional_postings(term)
+                    
+                    length = 0
+                    if positions_file is not None:
+                        positions = array('I')
+                        for posting in postings:
+                            positions.extend(posting[2])
+                        
+                        if sys.byteorder == "big":
+                            positions.byteswap()
+                        
+                        data = positions.tobytes()
+                        positions_file.write(data)
+                        length = len(data)
+                    
+                    tsv_file.write(
+                        term + "\t" +
+                        str(self.entries[term][InvertedIndex.df]) + "\t" +
+                        str(offset) + "\t" +
+                        str(length) + "\t" +
+                        str([posting[:2] for posting in postings]) + "\n"
+                    )
+                    
+                    offset += length
+        finally:
+            if positions_file is not None:
+                positions_file.close()
                 
-    def load_TSV(self, filename):
-        # loads an InvertedIndex instance from a tab-seperated values file
+    def load_TSV(self, filename, positions_filename=None):
+        # loads an InvertedIndex instance from a tab-seperated values file.
+        # Positions are not loaded; they are read from the positions file
+        # when needed. Files saved before positions were stored separately
+        # hold their positions inline, and these are loaded with the postings
         # params:
         # - filename: a string
+        # - positions_filename: a string, or None if the index was saved
+        #   without positions
         # returns: None
         
+        self.positions_filename = positions_filename
+        self.positional = positions_filename is not None
+        
         with open(filename, "r", encoding='utf8', errors='backslashreplace') as tsv_file:
             entries = tsv_file.readlines()
             for entry in entries:
@@ -97,37 +430,132 @@ class InvertedIndex:
                 
                 term = entry[0]
                 df = int(entry[1])
-                postings = entry[2]
                 
-                postings = postings.split("], [")
+                if len(entry) == 3:
+                    self.positional = True
+                    self.entries[term] = {
+                        InvertedIndex.df: df,
+                        InvertedIndex.postings: parse_positional_postings(entry[2])
+                    }
+                    continue
+                
+                offset = int(entry[2])
+                length = int(entry[3])
+                
+                postings = entry[4].rstrip()[2:-2].split("], [")
                 for i in range(len(postings)):
-                    posting = postings[i]
-                    
-                    if i == 0:
-                        posting = posting[2:]
-                    if i == len(postings) - 1:
-                        posting = posting[:-3]
-                    
-                    posting = posting.split(", ", 2)
-                    
-                    document_id = int(posting[0])
-                    tf = int(posting[1])
-                    positions = posting[2]
-                    
-                    positions = positions.split(", ")
-                    for j in range(len(positions)):
-                        position = positions[j]
-                        
-                        if j == 0:
-                            position = position[1:]
-                        if j == len(positions) - 1:
-                            position = position[:-1]
-                            
-                        positions[j] = int(position)
-                    
-                    postings[i] = [document_id, tf, positions]
+                    posting = postings[i].split(", ")
+                    postings[i] = [int(posting[0]), int(posting[1])]
                 
                 self.entries[term] = {
                     InvertedIndex.df: df,
-                    InvertedIndex.postings: postings
-                }
\ No newline at end of file
+                    InvertedIndex.postings: postings,
+                    InvertedIndex.positions: (offset, length)
+                }
+        
+        self.create_bitmaps()
+
+    def create_bitmaps(self):
+        # stores the postings of each term found in a large enough fraction
+        # of document IDs as a bitmap of document IDs, with arrays of its
+        # document IDs and term frequencies. Terms whose positions are held
+        # in memory are left as sorted lists
+        # params: None
+        # returns: None
+        
+        low = 0
+        high = -1
+        for entry in self.entries.values():
+            if InvertedIndex.postings in entry and entry[InvertedIndex.postings]:
+                low = min(low, entry[InvertedIndex.postings][0][0])
+                high = max(high, entry[InvertedIndex.postings][-1][0])
+        
+        # bitmaps can only hold non-negative document IDs
+        if low < 0:
+            return
+        
+        for entry in self.entries.values():
+            if InvertedIndex.positions not in entry or InvertedIndex.postings not in entry:
+                continue
+            
+            if entry[InvertedIndex.df] < (high + 1) * InvertedIndex.dense_fraction:
+                continue
+            
+            postings = entry.pop(InvertedIndex.postings)
+            document_ids = [posting[0] for posting in postings]
+            
+            entry[InvertedIndex.bitmap] = list_to_bitmap(document_ids)
+            entry[InvertedIndex.document_ids] = array('q', document_ids)
+            entry[InvertedIndex.tfs] = array('I', [posting[1] for posting in postings])
+
+class DensePostings:
+    # The DensePostings class is a read-only view of the postings of a term
+    # stored as a bitmap. Each [document_id, tf] posting is read from the
+    # term's arrays as it is iterated or indexed, so the postings of the
+    # most common terms are not built into a list on every query
+
+    def __init__(self, document_ids, tfs):
+        # initializes a new instance of the DensePostings class
+        # params:
+        # - document_ids: an array of document IDs, in sorted order
+        # - tfs: an array of the term frequency in each document
+        # returns: None
+
+        self.document_ids = document_ids
+        self.tfs = tfs
+
+    def __len__(self):
+        return len(self.document_ids)
+
+    def __iter__(self):
+        return zip(self.document_ids, self.tfs)
+
+    def __getitem__(self, index):
+        # returns a posting, or a DensePostings view of a slice of postings
+        # params:
+        # - index: an int or a slice
+        # returns:
+        # - posting: a document_id, tf pairing, or a DensePostings object
+
+        if isinstance(index, slice):
+            return DensePostings(self.document_ids[index], self.tfs[index])
+
+        return self.document_ids[index], self.tfs[index]
+
+def parse_positional_postings(postings):
+    # parses a postings list that holds its positions inline, as saved
+    # before positions were stored separately
+    # params:
+    # - postings: a string
+    # returns:
+    # - postings: a list of document_id, tf, [positions]
+    
+    postings = postings.split("], [")
+    for i in range(len(postings)):
+        posting = postings[i]
+        
+        if i == 0:
+            posting = posting[2:]
+        if i == len(postings) - 1:
+            posting = posting[:-3]
+        
+        posting = posting.split(", ", 2)
+        
+        document_id = int(posting[0])
+        tf = int(posting[1])
+        positions = posting[2]
+        
+        positions = positions.split(", ")
+        for j in range(len(positions)):
+            position = positions[j]
+            
+            if j == 0:
+                position = position[1:]
+            if j == len(positions) - 1:
+                position = position[:-1]
+                
+            positions[j] = int(position)
+        
+        postings[i] = [document_id, tf, positions]
+    
+    return postings
@@ -0,0 +1,73 @@
+# The Lexicon class represents the dictionary data structure that maps
+# each case-folded token seen during indexing to the normalized terms it
+# produces. It allows queries to be normalized without loading a stemmer.
+
+class Lexicon:
+
+    def __init__(self):
+        # initializes a new instance of the Lexicon class
+        # params: None
+        # returns: None
+
+        self.entries = {}
+
+    def register_token(self, token, terms):
+        # adds a token and its normalized terms to the dictionary. Tokens that
+        # are already in the dictionary are left unchanged
+        # params:
+        # - token: a case-folded string
+        # - terms: a list of strings
+        # returns: None
+
+        if token not in self.entries:
+            self.entries[token] = terms
+
+    def has_token(self, token):
+        # returns true if a token belongs to the dictionary
+        # params:
+        # - token: a case-folded string
+        # returns:
+        # - bool
+
+        return token in self.entries
+
+    def get_terms(self, token):
+        # returns the normalized terms associated with some token
+        # params:
+        # - token: a case-folded string
+        # returns:
+        # - terms: a list of strings
+
+        return self.entries[token]
+
+    def get_size(self):
+        # returns the number of tokens in the dictionary
+        # returns:
+        # - size: an int
+
+        return len(self.entries)
+
+    def save_TSV(self, filename):
+        # saves the Lexicon instance as a tab-seperated values file
+        # params:
+        # - filename: a string
+        # returns: None
+
+        with open(filename, 'w', encoding='utf8') as tsv_file:
+            for token in sorted(self.entries):
+                tsv_file.write(token + "\t" + " ".join(self.entries[token]) + "\n")
+
+    def load_TSV(self, filename):
+        # loads a Lexicon instance from a tab-seperated values file
+        # params:
+        # - filename: a string
+        # returns: None
+
+        with open(filename, "r", encoding='utf8', errors='backslashreplace') as tsv_file:
+            for entry in tsv_file:
+                entry_split = entry.rstrip("\n").split("\t")
+
+                token = entry_split[0]
+                terms = entry_split[1].split(" ") if entry_split[1] else []
+
+                self.entries[token] = terms
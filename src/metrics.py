@@ -0,0 +1,372 @@
+# The MetricsRegistry class holds the counters, gauges, and histograms that
+# describe the queries served by a process, and exports them in the
+# Prometheus text format. Every metric has a fixed set of label values, and
+# every histogram a fixed set of buckets, so that the values of each metric
+# are held in an array of shared memory allocated when it is created. Worker
+# processes forked after the registry allocates a row of values for each of
+# them record into their own row, under a lock of their own, and the rows are
+# summed when the metrics are exported. No lock is shared between processes,
+# so a worker killed while recording a value never blocks the others.
+
+import os
+import bisect
+import threading
+from multiprocessing import RawArray
+
+class Metric:
+
+    counter = "counter"
+    gauge = "gauge"
+    histogram = "histogram"
+
+    # whether every process records into the same row, rather than a row of
+    # its own
+    shared = False
+
+    def __init__(self, name, description, metric_type, label, label_values, slots, registry):
+        # initializes a new instance of the Metric class
+        # params:
+        # - name: a string
+        # - description: a string
+        # - metric_type: one of the Metric type constants
+        # - label: a string, the name of the metric's label, or None
+        # - label_values: a list of strings, the values the label may take
+        # - slots: an int, the number of values held for each label value
+        # - registry: the MetricsRegistry object holding the metric
+        # returns: None
+
+        self.name = name
+        self.description = description
+        self.metric_type = metric_type
+        self.label = label
+        self.label_values = list(label_values) if label is not None else [None]
+        self.slots = slots
+        self.registry = registry
+
+        # the number of values in each row
+        self.size = len(self.label_values) * slots
+
+        self.values = None
+        self.allocate(registry.processes)
+
+    def allocate(self, processes):
+        # allocates the values of the metric in shared memory, with a row for
+        # each of a number of processes, keeping the values recorded so far
+        # params:
+        # - processes: an int
+        # returns: None
+
+        rows = 1 if self.shared else processes
+        values = RawArray("d", rows * self.size)
+
+        if self.values is not None:
+            recorded = min(len(self.values), len(values))
+            values[:recorded] = self.values[:recorded]
+
+        self.values = values
+
+    def get_row(self):
+        # returns the index of the first value of the row recorded into by
+        # this process
+        # params: None
+        # returns:
+        # - row: an int
+
+        if self.shared:
+            return 0
+
+        return self.registry.process * self.size
+
+    def get_totals(self):
+        # returns the values of the metric summed over every row. The rows of
+        # other processes are read while they may be recording, so a value
+        # being recorded may be only partly included
+        # params: None
+        # returns:
+        # - totals: a list of floats
+
+        values = self.values[:]
+
+        totals = values[:self.size]
+        for row in range(self.size, len(values), self.size):
+            for i in range(self.size):
+                totals[i] += values[row + i]
+
+        return totals
+
+    def get_offset(self, label_value):
+        # returns the index of the first value held for a label value
+        # params:
+        # - label_value: a string, or None for a metric without a label
+        # returns:
+        # - offset: an int
+
+        try:
+            return self.label_values.index(label_value) * self.slots
+        except ValueError:
+            raise Exception("Metric {} has no label value {}".format(self.name, label_value))
+
+    def format_labels(self, label_value, extra=None):
+        # returns the labels of a sample in the Prometheus text format
+        # params:
+        # - label_value: a string, or None for a metric without a label
+        # - extra: a (name, value) tuple of a further label, or None
+        # returns:
+        # - labels: a string
+
+        labels = []
+        if label_value is not None:
+            labels.append('{}="{}"'.format(self.label, label_value))
+        if extra is not None:
+            labels.append('{}="{}"'.format(*extra))
+
+        if not labels:
+            return ""
+
+        return "{" + ",".join(labels) + "}"
+
+    def export(self):
+        # returns the samples of the metric in the Prometheus text format
+        # params: None
+        # returns:
+        # - lines: a list of strings
+
+        lines = [
+            "# HELP {} {}".format(self.name, self.description),
+            "# TYPE {} {}".format(self.name, self.metric_type)
+        ]
+
+        values = self.get_totals()
+
+        for i, label_value in enumerate(self.label_values):
+            lines.append("{}{} {}".format(self.name, self.format_labels(label_value), format_value(values[i])))
+
+        return lines
+
+class Counter(Metric):
+
+    def __init__(self, name, description, label, label_values, registry):
+        # initializes a new instance of the Counter class
+        # params: see Metric
+        # returns: None
+
+        super().__init__(name, description, Metric.counter, label, label_values, 1, registry)
+
+    def inc(self, label_value=None, amount=1):
+        # adds to the counter
+        # params:
+        # - label_value: a string, or None for a metric without a label
+        # - amount: a number
+        # returns: None
+
+        offset = self.get_row() + self.get_offset(label_value)
+        with self.registry.lock:
+            self.values[offset] += amount
+
+class Gauge(Metric):
+
+    # a gauge holds the latest value set by any process, so every process
+    # sets the same row, which is written without reading it
+    shared = True
+
+    def __init__(self, name, description, label, label_values, registry):
+        # initializes a new instance of the Gauge class
+        # params: see Metric
+        # returns: None
+
+        super().__init__(name, description, Metric.gauge, label, label_values, 1, registry)
+
+    def set(self, value, label_value=None):
+        # sets the value of the gauge
+        # params:
+        # - value: a number
+        # - label_value: a string, or None for a metric without a label
+        # returns: None
+
+        offset = self.get_row() + self.get_offset(label_value)
+        with self.registry.lock:
+            self.values[offset] = value
+
+class Histogram(Metric):
+
+    def __init__(self, name, description, buckets, label, label_values, registry):
+        # initializes a new instance of the Histogram class. For each label
+        # value, the count of each bucket is held, followed by the count of
+        # values above the highest bucket, and the sum of every value
+        # params:
+        # - buckets: a sorted list of numbers, the upper bound of each bucket
+        # - see Metric for the others
+        # returns: None
+
+        self.buckets = list(buckets)
+
+        super().__init__(name, description, Metric.histogram, label, label_values, len(self.buckets) + 2, registry)
+
+    def observe(self, value, label_value=None):
+        # records a value in the bucket of the lowest upper bound holding it
+        # params:
+        # - value: a number
+        # - label_value: a string, or None for a metric without a label
+        # returns: None
+
+        offset = self.get_row() + self.get_offset(label_value)
+        bucket = bisect.bisect_left(self.buckets, value)
+
+        with self.registry.lock:
+            self.values[offset + bucket] += 1
+            self.values[offset + self.slots - 1] += value
+
+    def export(self):
+        # returns the cumulative buckets, sum, and count of the histogram in
+        # the Prometheus text format
+        # params: None
+        # returns:
+        # - lines: a list of strings
+
+        lines = [
+            "# HELP {} {}".format(self.name, self.description),
+            "# TYPE {} {}".format(self.name, self.metric_type)
+        ]
+
+        values = self.get_totals()
+
+        for i, label_value in enumerate(self.label_values):
+            offset = i * self.slots
+
+            count = 0
+            for j, bound in enumerate(self.buckets + ["+Inf"]):
+                count += values[offset + j]
+                labels = self.format_labels(label_value, ("le", format_value(bound)))
+                lines.append("{}_bucket{} {}".format(self.name, labels, format_value(count)))
+
+            labels = self.format_labels(label_value)
+            lines.append("{}_sum{} {}".format(self.name, labels, format_value(values[offset + self.slots - 1])))
+            lines.append("{}_count{} {}".format(self.name, labels, format_value(count)))
+
+        return lines
+
+class MetricsRegistry:
+
+    def __init__(self):
+        # initializes a new instance of the MetricsRegistry class
+        # params: None
+        # returns: None
+
+        self.metrics = []
+
+        # the number of processes given a row of every metric's values, and
+        # the row recorded into by this process
+        self.processes = 1
+        self.process = 0
+
+        # serializes the threads of this process recording into its row. A
+        # forked process starts with a lock of its own, as a thread of the
+        # parent may have held it at the time of the fork
+        self.lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset_lock)
+
+    def reset_lock(self):
+        # replaces the lock of a newly forked process
+        # params: None
+        # returns: None
+
+        self.lock = threading.Lock()
+
+    def set_processes(self, processes):
+        # allocates a row of every metric's values for each of a number of
+        # processes, keeping the values recorded so far. The processes must
+        # be forked afterwards, and each must select its own row
+        # params:
+        # - processes: an int, counting the process itself
+        # returns: None
+
+        for metric in self.metrics:
+            metric.allocate(processes)
+
+        self.processes = processes
+
+    def set_process(self, process):
+        # selects the row recorded into by this process. No two processes
+        # alive at the same time may record into the same row
+        # params:
+        # - process: an int, from 0, the row of the process that allocated
+        #   the rows, to one less than the number of processes
+        # returns: None
+
+        if not 0 <= process < self.processes:
+            raise Exception("Metrics have no row for process {}".format(process))
+
+        self.process = process
+
+    def counter(self, name, description, label=None, label_values=()):
+        # creates a counter, which only ever increases
+        # params:
+        # - name: a string
+        # - description: a string
+        # - label: a string, the name of the counter's label, or None
+        # - label_values: a list of strings, the values the label may take
+        # returns:
+        # - counter: a Counter object
+
+        return self.register(Counter(name, description, label, label_values, self))
+
+    def gauge(self, name, description, label=None, label_values=()):
+        # creates a gauge, which holds the latest value set
+        # params: see counter
+        # returns:
+        # - gauge: a Gauge object
+
+        return self.register(Gauge(name, description, label, label_values, self))
+
+    def histogram(self, name, description, buckets, label=None, label_values=()):
+        # creates a histogram, which counts the values observed in each of a
+        # fixed set of buckets
+        # params:
+        # - buckets: a sorted list of numbers, the upper bound of each bucket
+        # - see counter for the others
+        # returns:
+        # - histogram: a Histogram object
+
+        return self.register(Histogram(name, description, buckets, label, label_values, self))
+
+    def register(self, metric):
+        # adds a metric to the registry
+        # params:
+        # - metric: a Metric object
+        # returns:
+        # - metric: the same Metric object
+
+        if any(existing.name == metric.name for existing in self.metrics):
+            raise Exception("Metric {} already exists".format(metric.name))
+
+        self.metrics.append(metric)
+
+        return metric
+
+    def export(self):
+        # returns every metric in the Prometheus text format
+        # params: None
+        # returns:
+        # - text: a string
+
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.export())
+
+        return "\n".join(lines) + "\n"
+
+def format_value(value):
+    # formats a sample value, or bucket bound, in the Prometheus text format
+    # params:
+    # - value: a number or string
+    # returns:
+    # - string: a string
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return str(value)
+
+# the metrics of the queries served by this process and its workers
+registry = MetricsRegistry()
@@ -0,0 +1,152 @@
+# The PostingsCache class holds decoded postings lists in memory, up to a
+# budget of bytes, so that queries sharing terms do not read and decode the
+# same postings from disk again. The least recently used postings lists are
+# evicted first, until the newest one fits. Pinned terms, such as the terms
+# with the highest document frequencies, are never evicted once cached, as
+# their postings lists are the most expensive to decode.
+
+import threading
+from collections import OrderedDict
+
+class PostingsCache:
+
+    # estimated bytes of memory used by each posting, and by each position
+    # within it, once decoded into Python lists
+    posting_size = 120
+    position_size = 36
+
+    def __init__(self, max_bytes, pinned_terms=()):
+        # initializes a new instance of the PostingsCache class
+        # params:
+        # - max_bytes: an int, the budget of bytes for every cached postings
+        #   list, pinned or not
+        # - pinned_terms: a list of strings, the terms never evicted
+        # returns: None
+
+        self.max_bytes = max_bytes
+        self.pinned_terms = set(pinned_terms)
+
+        # maps each term to its postings list and size, from the least to
+        # the most recently used
+        self.entries = OrderedDict()
+        self.pinned = {}
+        self.resident_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # queries may run on several threads at once
+        self.lock = threading.Lock()
+
+    def get(self, term):
+        # returns the cached postings list of a term
+        # params:
+        # - term: a string
+        # returns:
+        # - postings: a list of document_id, tf, [positions], or None if the
+        #   term is not cached
+
+        with self.lock:
+            if term in self.pinned:
+                self.hits += 1
+                return self.pinned[term][0]
+
+            if term in self.entries:
+                self.entries.move_to_end(term)
+                self.hits += 1
+                return self.entries[term][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, term, postings):
+        # caches the postings list of a term, evicting the least recently
+        # used postings lists until it fits. Postings lists larger than the
+        # whole budget are not cached
+        # params:
+        # - term: a string
+        # - postings: a list of document_id, tf, [positions]
+        # returns: None
+
+        size = estimate_size(postings)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if term in self.pinned or term in self.entries:
+                return
+
+            while self.resident_bytes + size > self.max_bytes and self.entries:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.resident_bytes -= evicted_size
+                self.evictions += 1
+
+            # the pinned postings lists alone may fill the budget
+            if self.resident_bytes + size > self.max_bytes:
+                return
+
+            if term in self.pinned_terms:
+                self.pinned[term] = (postings, size)
+            else:
+                self.entries[term] = (postings, size)
+
+            self.resident_bytes += size
+
+    def clear(self):
+        # removes every postings list from the cache, pinned or not
+        # params: None
+        # returns: None
+
+        with self.lock:
+            self.entries = OrderedDict()
+            self.pinned = {}
+            self.resident_bytes = 0
+
+    def get_hit_ratio(self):
+        # returns the fraction of lookups that found their term cached
+        # returns:
+        # - hit_ratio: a float
+
+        lookups = self.hits + self.misses
+        if not lookups:
+            return 0.0
+
+        return self.hits / lookups
+
+    def get_resident_bytes(self):
+        # returns the estimated bytes of memory used by cached postings
+        # returns:
+        # - resident_bytes: an int
+
+        return self.resident_bytes
+
+    def get_stats(self):
+        # returns the statistics of the cache
+        # returns:
+        # - stats: a dictionary
+
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.get_hit_ratio(),
+                "evictions": self.evictions,
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "cached_terms": len(self.entries) + len(self.pinned),
+                "pinned_terms": len(self.pinned)
+            }
+
+def estimate_size(postings):
+    # estimates the bytes of memory used by a decoded postings list
+    # params:
+    # - postings: a list of document_id, tf, [positions]
+    # returns:
+    # - size: an int
+
+    size = 0
+    for posting in postings:
+        size += PostingsCache.posting_size + PostingsCache.position_size * posting[1]
+
+    return size
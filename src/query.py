@@ -2,17 +2,11 @@
 # The program accepts a file path, integer, and query as input, returning
 # list of document IDs tht match the query.
 
-import os
 import sys
-import re
-import time
-import math
+import json
 from command_parser import CommandParser
-from inverted_index import InvertedIndex
-from document_index import DocumentIndex
-from min_heap import MinHeap
-from token_helper import *
-from sorted_list_helper import *
+from search_engine import SearchEngine, parse_zone_weights
+from query_trace import format_plan
 
 
 def main():
@@ -24,28 +18,139 @@ def main():
         
         # validate the command line arguments
         parser = CommandParser(sys.argv)
-        parser.validate_num_args(4)
+        show_documents = parser.pop_flag("--documents")
+        vector_file = parser.pop_option("--vector")
+        nprobe = parser.pop_option("--nprobe")
+        exact = parser.pop_flag("--exact")
+        rerank = parser.pop_option("--rerank")
+        fusion = parser.pop_option("--fusion", "rrf")
+        weight = parser.pop_option("--weight", "0.5")
+        lexical_depth = parser.pop_option("--lexical-depth")
+        vector_depth = parser.pop_option("--vector-depth")
+        batch_file = parser.pop_option("--batch")
+        time_limit = parser.pop_option("--timeout")
+        max_postings = parser.pop_option("--max-postings")
+        max_documents = parser.pop_option("--max-documents")
+        filters = parser.pop_option("--filter")
+        explain = parser.pop_flag("--explain")
+        count_only = parser.pop_flag("--count")
+        exists_only = parser.pop_flag("--exists")
+        paged = parser.pop_flag("--page")
+        cursor = parser.pop_option("--cursor")
+        zone_weights = parser.pop_option("--zone-weights")
+        fuzzy = parser.pop_option("--fuzzy")
+        
+        # a vector query may be combined with a keyword or phrase query, and
+        # the query of a later page is held by its cursor
+        if batch_file is not None or cursor is not None:
+            parser.validate_num_args(3)
+        elif vector_file is None or len(parser.argv) > 3:
+            parser.validate_num_args(4)
+            parser.validate_query(3)
+        else:
+            parser.validate_num_args(3)
         parser.validate_dir_path(1)
         parser.validate_int(2)
-        parser.validate_query(3)
         
-        # load the indexes
-        inverted_index, document_index = load_indexes(parser.get_arg(1))
+        if zone_weights is not None:
+            zone_weights = parse_zone_weights(zone_weights)
+        
+        if fuzzy is not None and not fuzzy.isdigit():
+            raise Exception("{} is not a valid number of edits".format(fuzzy))
         
-        # parse the query
-        keywords, phrases = parse_query(parser.get_arg(3))
+        # load the indexes from the current generation
+        search_engine = SearchEngine(parser.get_arg(1))
         
-        # normalize the query tokens
-        keywords, phrases = normalize_query(keywords, phrases)
+        # execute a batch of queries
+        if batch_file is not None:
+            queries = load_queries(batch_file)
+            all_results = search_engine.search_batch(queries, int(parser.get_arg(2)))
+            
+            for query, results in zip(queries, all_results):
+                print("\nQuery: {}".format(query))
+                print_results(results)
+            
+            return
+        
+        # return one page of results, with the cursor of the next page
+        if paged or cursor is not None:
+            results = search_engine.search_page(
+                parser.get_arg(3) if cursor is None else None,
+                int(parser.get_arg(2)),
+                cursor,
+                show_documents,
+                filters.split(";") if filters else None,
+                zone_weights
+            )
+            
+            print_results(results)
+            if show_documents:
+                print_documents(results)
+            
+            return
+        
+        # count the matching documents, or find whether any match, without
+        # scoring them
+        if count_only or exists_only:
+            if vector_file is not None:
+                raise Exception("Vector queries can not be counted")
+            
+            if count_only:
+                results = search_engine.count(parser.get_arg(3), filters.split(";") if filters else None)
+                print("Matching documents: {}".format(results["count"]))
+            else:
+                results = search_engine.exists(parser.get_arg(3), filters.split(";") if filters else None)
+                print("Matching document: {}".format(results["document_id"] if results["exists"] else "none"))
+            
+            return
         
         # execute the query
-        document_ids = evaluate_query(
-            inverted_index,
-            document_index,
-            keywords,
-            phrases,
-            int(parser.get_arg(2))
-        )
+        if vector_file is None:
+            results = search_engine.search(
+                parser.get_arg(3),
+                int(parser.get_arg(2)),
+                show_documents,
+                float(time_limit) if time_limit is not None else None,
+                int(max_postings) if max_postings is not None else None,
+                int(max_documents) if max_documents is not None else None,
+                filters.split(";") if filters else None,
+                explain,
+                zone_weights,
+                int(fuzzy) if fuzzy is not None else None
+            )
+        elif len(parser.argv) > 3:
+            results = search_engine.search_hybrid(
+                parser.get_arg(3),
+                load_vector(vector_file),
+                int(parser.get_arg(2)),
+                int(lexical_depth) if lexical_depth is not None else None,
+                int(vector_depth) if vector_depth is not None else None,
+                fusion,
+                float(weight),
+                int(nprobe) if nprobe is not None else None,
+                int(rerank) if rerank is not None else None,
+                show_documents
+            )
+        else:
+            results = search_engine.search_vector(
+                load_vector(vector_file),
+                int(parser.get_arg(2)),
+                int(nprobe) if nprobe is not None else None,
+                exact,
+                show_documents,
+                int(rerank) if rerank is not None else None
+            )
+        
+        # print the results
+        print_results(results)
+        
+        # print the plan the query was executed with
+        if "plan" in results:
+            print("\n" + format_plan(results["plan"]))
+        
+        # print the contents of each result
+        if show_documents:
+            print_documents(results)
     
     except Exception as e:
         print("\nAn error prevented the index from being queried:\n" + str(e))
@@ -53,374 +158,84 @@ def main():
         print("\nExample usage: \n"
               + "\tpython3 query.py indexes/ 5 \"Daniel Craig\"\n"
               + "\tpython3 query.py indexes/ 10 \":shaken not stirred:\"\n"
-              + "\tpython3 query.py indexes/ 1 \":casino royale: james bond 007\"\n")
+              + "\tpython3 query.py indexes/ 1 \":casino royale: james bond 007\"\n"
+              + "\tpython3 query.py indexes/ 5 \"(bond OR bourne) AND spy NOT :casino royale:\"\n"
+              + "\tpython3 query.py --documents indexes/ 5 \"Daniel Craig\"\n"
+              + "\tpython3 query.py indexes/ 5 \"title:bond spy\"\n"
+              + "\tpython3 query.py --zone-weights=title:2 indexes/ 5 \"Daniel Craig\"\n"
+              + "\tpython3 query.py --fuzzy=2 indexes/ 5 \"Daneil Criag\"\n"
+              + "\tpython3 query.py --timeout=0.5 indexes/ 5 \"the who is you\"\n"
+              + "\tpython3 query.py --explain indexes/ 5 \"(bond OR bourne) AND spy\"\n"
+              + "\tpython3 query.py --count indexes/ 1 \":casino royale:\"\n"
+              + "\tpython3 query.py --page indexes/ 10 \"Daniel Craig\"\n"
+              + "\tpython3 query.py --cursor=[cursor] indexes/ 10\n"
+              + "\tpython3 query.py \"--filter=lang=en;year>=2020\" indexes/ 5 \"Daniel Craig\"\n"
+              + "\tpython3 query.py --vector=query.json --nprobe=16 indexes/ 10\n"
+              + "\tpython3 query.py --vector=query.json --fusion=weighted indexes/ 10 \":casino royale:\"\n"
+              + "\tpython3 query.py --batch=queries.txt indexes/ 10\n")
 
-def load_indexes(directory):
-    # This function loads inverted index and document index from the 
-    # supplied directory.
+def load_queries(file):
+    # loads a batch of queries from a UTF-8 encoded file holding one query
+    # on each line. Blank lines are ignored
     # params:
-    # - directory: a string representing the directory to save the index
+    # - file: name of the file
     # returns:
-    # - inverted_index: an InvertedIndex object
-    # - document_index: an DocumentIndex object
-    
-    inverted_file = directory + "/" + "inverted_index.tsv"
-    document_file = directory + "/" + "document_index.tsv"
+    # - queries: a list of strings
     
-    if not os.path.exists(inverted_file):
-        raise Exception("Index {} does not exist".format(inverted_file))
-    
-    if not os.path.exists(document_file):
-        raise Exception("Index {} does not exist".format(inverted_file))    
+    with open(file, "r", encoding='utf8') as text_file:
+        return [line.strip() for line in text_file if line.strip()]
 
-    inverted_index = InvertedIndex()
-    inverted_index.load_TSV(inverted_file)
-    
-    document_index = DocumentIndex()
-    document_index.load_TSV(document_file)
-            
-    return inverted_index, document_index
-
-def parse_query(query):
-    # Parses a query string and returns a list of keywords and a list of
-    # phrases contained within the string
-    # params:
-    # - query: a string
-    # returns:
-    # - keywords: a list of strings
-    # - phrases: a list of lists of strings
-    
-    tokens = query.split()
-    
-    keywords = []
-    phrases = []
-    
-    is_phrase = False
-    phrase = []
-    for token in tokens:
-        if re.fullmatch(r":[\w'\u2019\u201A]+", token):
-            is_phrase = True
-            phrase.append(token[1:])
-        elif re.fullmatch(r"[\w'\u2019\u201A]+:", token):
-            is_phrase = False
-            phrase.append(token[:-1])
-            phrases.append(phrase)
-            phrase = []
-        elif re.fullmatch(r"[\w'\u2019\u201A]+", token):
-            if is_phrase:
-                phrase.append(token)
-            else:
-                keywords.append(token)
-        elif re.fullmatch(r":[\w'\u2019\u201A]+:", token):
-            phrases.append([token[1:-1]])
-        else:
-            raise Exception("Token {} is not recognized".format(str(token)))
-        
-    return keywords, phrases
-    
-def normalize_query(keywords, phrases):
-    # Normalizes each token in the query, including keywords and phrases.
-    # params:
-    # - keywords: a list of strings
-    # - phrases: a list of lists of strings
-    # returns: None
-    
-    keywords_new = normalize_tokens(keywords)
-    
-    phrases_new = []
-    for phrase in phrases:
-        phrases_new.append(normalize_tokens(phrase))
-            
-    return keywords_new, phrases_new
-        
-def evaluate_query(inverted_index, document_index, keywords, phrases, k):
-    # This function evaluates pre-parsed keyword and phrase queries,
-    # returning a set of document IDs that match them
+def load_vector(file):
+    # loads a query embedding from a json-formatted file holding an array
+    # of numbers
     # params:
-    # - inverted_index: an InvertedIndex object
-    # - document_index: an DocumentIndex object
-    # - keywords: a list of strings
-    # - phrases: a list of lists of strings
-    # - k: an int
+    # - file: name of the json-formatted file
     # returns:
-    # - document_ids: a list of strings
-    
-    # validate that there is at least one keyword or phrase
-    if not keywords and not phrases:
-        raise Exception("Query must contain at least one valid keyword")
+    # - vector: a list of floats
     
-    # create a pool of documents
-    pool = []
-    if phrases:
-        pool = get_docs_with_phrase(inverted_index, phrases)
-    else:
-        pool = document_index.get_document_ids()
+    with open(file, "r", encoding='utf8') as json_file:
+        vector = json.load(json_file)
     
-    # score each document in the pool against the query
-    scored_docs = score_docs(inverted_index, document_index, keywords, phrases, pool)
+    if not isinstance(vector, list) or not vector:
+        raise Exception("{} does not hold an array of numbers".format(file))
     
-    # find the k highest scores
-    highest_docs = find_highest_docs(scored_docs, k)
-    
-    # print the results
-    print_results(len(pool), len(scored_docs), highest_docs)
+    return vector
 
-def get_docs_with_phrase(inverted_index, phrases):
-    # returns a list of IDs for documents that contain any number of phrases
-    # params:
-    # - inverted_index: an InvertedIndex object
-    # - phrases: a list of lists of strings
-    # returns:
-    # - document_ids: a list of strings
-    
-    document_ids = set()
-    for phrase in phrases:
-        # create a list of postings lists that contain each keyword
-        
-        # e.g. query ":who is you:" on dr seuss lines
-        # all_postings = [
-        #    [[2, 1, [14]]]
-        #    [[0, 1, [10]], [2, 3, [5, 10, 15]]]
-        #    [[0, 1, [3]], [2, 5, [1, 3, 16, 19, 23]], [4, 3, [2, 5, 17]]]
-        # ]
-        # all_postings_pointers = [
-        #    0
-        #    0
-        #    0
-        # ]
-        
-        all_postings = []
-        all_postings_pointers = []
-        
-        for keyword in phrase:
-            postings = inverted_index.get_postings(keyword)
-            
-            all_postings.append(postings)
-            all_postings_pointers.append(0)
-            
-        # advance each pointer in the list of postings list until
-        # all pointers match a single document_id
-        
-        # all_postings = [
-        #    [[2, 1, [14]]]
-        #      ^
-        #    [[0, 1, [10]], [2, 3, [5, 10, 15]]]
-        #                    ^
-        #    [[0, 1, [3]], [2, 5, [1, 3, 16, 19, 23]], [4, 3, [2, 5, 17]]]
-        #                   ^
-        # ]
-        # all_postings_pointers = [
-        #    0
-        #    1
-        #    1
-        # ]
-        
-        max_id = -1
-        match = 0
-        i = 0
-        exhausted = False
-        while not exhausted:
-            i = (i + 1) % len(all_postings)
-            while all_postings[i][all_postings_pointers[i]][0] < max_id:
-                all_postings_pointers[i] += 1
-                if all_postings_pointers[i] >= len(all_postings[i]):
-                    exhausted = True
-                    break
-                
-            if exhausted:
-                break
-            
-            if all_postings[i][all_postings_pointers[i]][0] == max_id:
-                match += 1
-            else:
-                max_id = all_postings[i][all_postings_pointers[i]][0]
-                match = 1
-                
-            if match == len(all_postings):
-                # a matching document_id has been found!
-                match = 0
-                max_id += 1
-                
-                # create a list of positions for a specific document_id and keyword
-                
-                # all_positions = [
-                #    [14]
-                #    [5, 10, 15]
-                #    [1, 3, 16, 19, 23]
-                # ]
-                # all_positions_pointers = [
-                #    0
-                #    0
-                #    0
-                # ]
-                # document_id = 2
-                
-                all_positions = []
-                all_positions_pointers = []
-                
-                for j in range(len(all_postings)):
-                    positions = all_postings[j][all_postings_pointers[j]][2]
-                    
-                    all_positions.append(positions)
-                    all_positions_pointers.append(0)            
-                
-                document_id = all_postings[j][all_postings_pointers[j]][0]
-                
-                # advance each pointer in the list of positions lists until
-                # each points to an increasing number
-                
-                # all_positions = [
-                #    [14]
-                #     ^
-                #    [5, 10, 15]
-                #            ^
-                #    [1, 3, 16, 19, 23]
-                #           ^
-                # ]
-                # all_positions_pointers = [
-                #    0
-                #    2
-                #    2
-                # ]
-                base_num = -1
-                j = 0
-                match_2 = 0
-                exhausted_2 = False
-                while not exhausted_2:
-                    j = (j + 1) % len(all_postings)
-                    while all_positions[j][all_positions_pointers[j]] < base_num + j:
-                        all_positions_pointers[j] += 1
-                        if all_positions_pointers[j] >= len(all_positions[j]):
-                            exhausted_2 = True
-                            break
-                        
-                    if exhausted_2:
-                        break
-                    
-                    if all_positions[j][all_positions_pointers[j]] == base_num + j:
-                        match_2 += 1
-                    else:
-                        base_num = all_positions[j][all_positions_pointers[j]] - j
-                        match_2 = 1
-                        
-                    if match_2 == len(all_postings):
-                        # phrase has been found!
-                        match_2 = 0
-                        base_num += 1
-                        
-                        document_ids.add(document_id)
-                        
-                        
-    return list(document_ids)
-
-    
-def score_docs(inverted_index, document_index, keywords, phrases, doc_pool):
-    # scores a set of documents agains a query vector following
-    # algorithm 7.1 from the information retreival textbook
-    # params:
-    # - inverted_index: an InvertedIndex object
-    # - document_index: an DocumentIndex object
-    # - keywords: a list of strings
-    # - phrases: a list of lists of strings
-    # - doc_pool: a list of document IDs
-    # returns:
-    # - scored_docs: a dictionary of document_id-score pairings
-    
-    # find the set of unique terms in the query. TF does not matter
-    query_terms = set()
-    for keyword in keywords:
-        query_terms.add(keyword)
-    for phrase in phrases:
-        for term in phrase:
-            query_terms.add(term)
-    
-    # initialize a dictionary to store document scores
-    doc_score = {}
-    for doc in doc_pool:
-        doc_score[doc] = 0
-        
-    # score each term in the query
-    N = document_index.get_size()
+def print_documents(results):
+    # prints the zones and snippet of each of the highest scoring documents
+    # parameters:
+    # - results: a dictionary returned by SearchEngine.search
+    # returns: None
     
-    for term in query_terms:
-        # fetch postings list and df from inverted index
-        postings = inverted_index.get_postings(term)
-        df = inverted_index.get_df(term)
-        
-        # ignore term that dont belong to any documents
-        if not df:
+    for result in results["results"]:
+        if "zones" not in result:
             continue
         
-        # calculate query term weight
-        query_tf_weight = 1 # boolean tf
-        query_df_weight =  math.log(N/df, 10) # idf
-        query_term_weight = query_tf_weight * query_df_weight
-        
-        # calculate partial document term weight
-        doc_df_weight = max(0, math.log((N - df)/df, 10)) # prob idf
-        
-        for posting in postings:
-            document_id = posting[0]
-            tf = posting[1]
-            
-            if document_id in doc_score:
-                # calculate document term weight
-                max_tf = document_index.get_max_tf(document_id)
-                doc_tf_weight = 0.5 + ((0.5 * tf)/(max_tf)) # augmented tf
-                doc_term_weight = doc_tf_weight * doc_df_weight
-                
-                # score the doc & query term
-                doc_score[document_id] += query_term_weight * doc_term_weight
-                
-    # cosine-normalize scores
-    scored_docs = {}
-    for document_id in doc_score.keys():
-        if doc_score[document_id]:
-            scored_docs[document_id] = doc_score[document_id] / document_index.get_length(document_id)
-    
-    return scored_docs
-    
-def find_highest_docs(document_ids, k):
-    # params:
-    # - document_ids: a dictionary of document_id-score pairings
-    # - k: an int
-    # returns:
-    # - highest_docs: a sorted list of [document_id, score] pairings
-    
-    min_heap = MinHeap(k)
-    
-    # insert any document into the heap whos score is less than the root node
-    for document_id, score in document_ids.items():
-        root_score, _ = min_heap.get_min()
-        if score > root_score or min_heap.get_size() < k:
-            min_heap.insert(score, document_id)
-            
-    
-    # remove all elements from heap
-    highest_docs = []
-    while min_heap.get_size() > 0:
-        score, document_id = min_heap.remove()
-        highest_docs.append([document_id, score])
-    
-    return highest_docs
-    
-def print_results(pool_size, nonzero_scores, document_ids):
+        print("\nDoc ID: {}".format(result["document_id"]))
+        for zone, value in result["zones"].items():
+            print("{}: {}".format(zone, value))
+        print("Snippet: {}".format(result["snippet"]))
+
+def print_results(results):
     # prints a list of document_ids in sorted order for easy evaluation of
-    # testing results. Prints a count of the total results found and time
-    # taken during query
+    # testing results. Prints a count of the total results found
     # parameters:
-    # - document_ids: a set of strings
-    # - df: an integer
-    # - time: a float
+    # - results: a dictionary returned by SearchEngine.search
     # returns: None
     
-    print("Documents considered: {}".format(pool_size))
+    print("Documents considered: {}".format(results["documents_considered"]))
     
-    print("Documents with non-zero similarity score: {}".format(nonzero_scores))
+    print("Documents with non-zero similarity score: {}".format(results["nonzero_scores"]))
+    
+    if results.get("partial"):
+        print("Results are partial: the query ran out of time or work")
     
     print("Doc ID\tScore")
-    for document_id, score in reversed(document_ids):
-        print("{}\t{}".format(document_id, score))
+    for result in results["results"]:
+        print("{}\t{}".format(result["document_id"], result["score"]))
+    
+    if results.get("cursor"):
+        print("Next page: --cursor={}".format(results["cursor"]))
     
 if __name__ == '__main__':
     main()
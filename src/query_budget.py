@@ -0,0 +1,70 @@
+# The QueryBudget class limits the work done to evaluate a single query. A
+# budget may hold a time limit, a limit on the number of postings scanned,
+# and a limit on the number of documents scored. The evaluation loops charge
+# their work to the budget as they go and stop once it is exhausted, so a
+# pathological query returns the best results found so far rather than
+# blocking the queries behind it.
+
+import time
+
+class QueryBudget:
+
+    # the number of postings scanned between checks of the budget
+    check_interval = 1024
+
+    def __init__(self, time_limit=None, max_postings=None, max_documents=None):
+        # initializes a new instance of the QueryBudget class. A limit of
+        # None is unlimited
+        # params:
+        # - time_limit: a float, the number of seconds the query may run for
+        # - max_postings: an int, the number of postings that may be scanned
+        # - max_documents: an int, the number of documents that may be scored
+        # returns: None
+
+        self.deadline = None
+        if time_limit is not None:
+            self.deadline = time.monotonic() + time_limit
+
+        self.max_postings = max_postings
+        self.max_documents = max_documents
+
+        self.postings = 0
+        self.documents = 0
+
+        # set once any limit is reached, and never cleared
+        self.exhausted = False
+
+    def charge(self, postings=0, documents=0):
+        # records work done against the budget
+        # params:
+        # - postings: an int, the number of postings scanned
+        # - documents: an int, the number of documents scored
+        # returns: None
+
+        self.postings += postings
+        self.documents += documents
+
+    def is_exhausted(self):
+        # returns whether any limit of the budget has been reached. Once a
+        # limit is reached, the results of the query are partial
+        # params: None
+        # returns:
+        # - bool
+
+        if not self.exhausted:
+            self.exhausted = (
+                (self.max_postings is not None and self.postings >= self.max_postings) or
+                (self.max_documents is not None and self.documents >= self.max_documents) or
+                (self.deadline is not None and time.monotonic() >= self.deadline)
+            )
+
+        return self.exhausted
+
+    def is_partial(self):
+        # returns whether evaluation was cut short by the budget, without
+        # checking the clock
+        # params: None
+        # returns:
+        # - bool
+
+        return self.exhausted
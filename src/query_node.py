@@ -0,0 +1,130 @@
+# The QueryNode class represents a single node in the abstract syntax tree
+# of a boolean query. Leaf nodes hold keywords or phrases, while inner nodes
+# combine their children using the AND, OR, and NOT operators.
+
+class QueryNode:
+
+    keyword = "KEYWORD"
+    phrase = "PHRASE"
+    and_op = "AND"
+    or_op = "OR"
+    not_op = "NOT"
+
+    def __init__(self, node_type, terms=None, children=None):
+        # initializes a new instance of the QueryNode class
+        # params:
+        # - node_type: one of the QueryNode type constants
+        # - terms: a list of strings (leaf nodes only)
+        # - children: a list of QueryNode objects (operator nodes only)
+        # returns: None
+
+        self.node_type = node_type
+        self.terms = terms if terms is not None else []
+        self.children = children if children is not None else []
+
+        # estimated number of matching documents, set by the QueryPlanner
+        self.cost = 0
+
+        # NOT children of an AND node that the QueryPlanner has pushed down
+        # into a filter on the intersection of the remaining children
+        self.filters = []
+
+    def get_type(self):
+        # returns the type of the node
+        # params: None
+        # returns:
+        # - node_type: a string
+
+        return self.node_type
+
+    def is_leaf(self):
+        # returns true if the node is a keyword or phrase
+        # params: None
+        # returns:
+        # - bool
+
+        return self.node_type in (QueryNode.keyword, QueryNode.phrase)
+
+    def get_terms(self):
+        # returns the terms belonging to a leaf node
+        # params: None
+        # returns:
+        # - terms: a list of strings
+
+        return self.terms
+
+    def set_terms(self, terms):
+        # replaces the terms belonging to a leaf node. A keyword that holds
+        # more than one term (e.g. an expanded contraction) becomes a phrase
+        # params:
+        # - terms: a list of strings
+        # returns: None
+
+        self.terms = terms
+        if self.node_type == QueryNode.keyword and len(terms) > 1:
+            self.node_type = QueryNode.phrase
+
+    def get_children(self):
+        # returns the children of an operator node
+        # params: None
+        # returns:
+        # - children: a list of QueryNode objects
+
+        return self.children
+
+    def get_positive_leaves(self):
+        # returns every leaf in the tree that is not negated by a NOT operator.
+        # These are the leaves that contribute to document scores
+        # params: None
+        # returns:
+        # - keywords: a list of strings
+        # - phrases: a list of lists of strings
+
+        keywords = []
+        phrases = []
+
+        if self.node_type == QueryNode.keyword:
+            keywords.extend(self.terms)
+        elif self.node_type == QueryNode.phrase:
+            phrases.append(self.terms)
+        elif self.node_type != QueryNode.not_op:
+            for child in self.children:
+                child_keywords, child_phrases = child.get_positive_leaves()
+                keywords.extend(child_keywords)
+                phrases.extend(child_phrases)
+
+        return keywords, phrases
+
+    def is_positive(self):
+        # returns whether every document satisfying the tree rooted at this
+        # node contains one of its positive leaves, and so can be scored.
+        # An AND operator needs one such child, and an OR operator needs
+        # every child to be one
+        # params: None
+        # returns:
+        # - bool
+
+        if self.node_type in (QueryNode.keyword, QueryNode.phrase):
+            return True
+        if self.node_type == QueryNode.not_op:
+            return False
+        if self.node_type == QueryNode.and_op:
+            return any(child.is_positive() for child in self.children)
+
+        return all(child.is_positive() for child in self.children)
+
+    def __str__(self):
+        # returns a readable representation of the tree rooted at this node
+        # params: None
+        # returns:
+        # - string: a string
+
+        if self.node_type == QueryNode.keyword:
+            return " ".join(self.terms)
+        if self.node_type == QueryNode.phrase:
+            return ":" + " ".join(self.terms) + ":"
+        if self.node_type == QueryNode.not_op:
+            return "NOT " + str(self.children[0])
+
+        operator = " " + self.node_type + " "
+        return "(" + operator.join(str(child) for child in self.children) + ")"
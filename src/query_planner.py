@@ -0,0 +1,319 @@
+# The QueryPlanner class compiles the abstract syntax tree of a boolean query
+# into an execution plan, and then executes the plan against an inverted
+# index to find the pool of matching documents. Intersections are ordered by
+# ascending document frequency, evaluation stops as soon as an intermediate
+# result is empty, and NOT operators beneath an AND are applied as filters on
+# the intersection rather than as complements of the whole collection. When
+# a query is traced, each node executed is recorded with the number of
+# documents it was estimated to match and the number it did match.
+
+from query_node import QueryNode
+from sorted_list_helper import *
+from bitmap_helper import *
+
+
+class QueryPlanner:
+
+    def __init__(self, inverted_index, document_index, phrase_matcher, trace=None):
+        # initializes a new instance of the QueryPlanner class
+        # params:
+        # - inverted_index: an InvertedIndex object
+        # - document_index: a DocumentIndex object
+        # - phrase_matcher: a function accepting an InvertedIndex, a list of
+        #   phrases, a QueryBudget object or None, and a QueryTrace object or
+        #   None, returning the IDs of documents containing any phrase
+        # - trace: a QueryTrace object recording each node executed, or None
+        # returns: None
+
+        self.inverted_index = inverted_index
+        self.document_index = document_index
+        self.phrase_matcher = phrase_matcher
+        self.trace = trace
+        self.all_document_ids = None
+
+    def create_plan(self, node):
+        # compiles a query tree into an execution plan. Nested operators of
+        # the same type are flattened, each node is annotated with an estimate
+        # of the number of documents it matches, the children of AND nodes are
+        # ordered by that estimate, and NOT children of AND nodes are moved
+        # into filters
+        # params:
+        # - node: a QueryNode object
+        # returns:
+        # - plan: a QueryNode object
+
+        N = self.document_index.get_size()
+        node_type = node.get_type()
+
+        if node_type == QueryNode.keyword:
+            plan = QueryNode(QueryNode.keyword, node.get_terms())
+            plan.cost = self.inverted_index.get_df(node.get_terms()[0]) if node.get_terms() else 0
+
+        elif node_type == QueryNode.phrase:
+            # a phrase can match no more documents than its rarest term
+            plan = QueryNode(QueryNode.phrase, node.get_terms())
+            plan.cost = min([self.inverted_index.get_df(term) for term in node.get_terms()], default=0)
+
+        elif node_type == QueryNode.not_op:
+            child = self.create_plan(node.get_children()[0])
+            plan = QueryNode(QueryNode.not_op, children=[child])
+            plan.cost = N - child.cost
+
+        elif node_type == QueryNode.and_op:
+            plan = QueryNode(QueryNode.and_op)
+            for child in self.flatten(node):
+                if child.get_type() == QueryNode.not_op:
+                    plan.filters.append(self.create_plan(child.get_children()[0]))
+                else:
+                    plan.children.append(self.create_plan(child))
+
+            plan.children.sort(key=lambda child: child.cost)
+            plan.filters.sort(key=lambda child: child.cost)
+
+            if plan.children:
+                plan.cost = plan.children[0].cost
+            else:
+                plan.cost = max(0, N - sum(child.cost for child in plan.filters))
+
+        elif node_type == QueryNode.or_op:
+            plan = QueryNode(QueryNode.or_op)
+            for child in self.flatten(node):
+                plan.children.append(self.create_plan(child))
+            plan.cost = min(N, sum(child.cost for child in plan.children))
+
+        else:
+            raise Exception("Query node {} is not recognized".format(node_type))
+
+        return plan
+
+    def flatten(self, node):
+        # returns the children of an operator node, replacing any child that
+        # uses the same operator with that child's own children
+        # params:
+        # - node: a QueryNode object
+        # returns:
+        # - children: a list of QueryNode objects
+
+        children = []
+        for child in node.get_children():
+            if child.get_type() == node.get_type():
+                children.extend(self.flatten(child))
+            else:
+                children.append(child)
+
+        return children
+
+    def execute_plan(self, plan, candidates=None):
+        # executes an execution plan, returning the sorted IDs of documents
+        # that satisfy it. When candidates is supplied, only documents within
+        # the candidates are considered
+        # params:
+        # - plan: a QueryNode object created by create_plan
+        # - candidates: a sorted list of document IDs, or None
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        if candidates is not None and not candidates:
+            return []
+
+        if self.trace is None:
+            return self.execute_node(plan, candidates)
+
+        self.trace.begin(
+            plan.get_type().lower(),
+            " ".join(plan.get_terms()) if plan.is_leaf() else None,
+            estimate=plan.cost,
+            candidates=len(candidates) if candidates is not None else "all"
+        )
+        document_ids = self.execute_node(plan, candidates)
+        self.trace.end(len(document_ids))
+
+        return document_ids
+
+    def execute_node(self, plan, candidates):
+        # executes a single node of an execution plan, returning the sorted
+        # IDs of documents that satisfy it
+        # params:
+        # - plan: a QueryNode object created by create_plan
+        # - candidates: a sorted list of document IDs, or None
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        node_type = plan.get_type()
+
+        if node_type == QueryNode.keyword:
+            return self.execute_keyword(plan, candidates)
+
+        if node_type == QueryNode.phrase:
+            return self.execute_phrase(plan, candidates)
+
+        if node_type == QueryNode.not_op:
+            excluded = self.execute_plan(plan.get_children()[0], candidates)
+            if candidates is None:
+                candidates = self.get_all_document_ids()
+            return difference_lists(candidates, excluded)
+
+        if node_type == QueryNode.and_op:
+            return self.execute_and(plan, candidates)
+
+        if node_type == QueryNode.or_op:
+            return self.execute_or(plan, candidates)
+
+        raise Exception("Query node {} is not recognized".format(node_type))
+
+    def execute_keyword(self, plan, candidates):
+        # returns the sorted IDs of documents containing a keyword
+        # params:
+        # - plan: a QueryNode object
+        # - candidates: a sorted list of document IDs, or None
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        if not plan.cost:
+            return []
+
+        term = plan.get_terms()[0]
+
+        # probe the bitmap of a term stored as a bitmap
+        if self.inverted_index.is_dense(term):
+            if candidates is None:
+                return self.inverted_index.get_document_ids(term)
+            return intersect_bitmap_list(self.inverted_index.get_bitmap(term), candidates)
+
+        postings = self.inverted_index.get_postings(term)
+
+        if candidates is None:
+            return [posting[0] for posting in postings]
+
+        # probe the postings list directly when the candidates are few
+        if len(candidates) * 8 < len(postings):
+            return intersect_list_mlist(candidates, postings)
+
+        return intersect_lists(candidates, [posting[0] for posting in postings])
+
+    def execute_phrase(self, plan, candidates):
+        # returns the sorted IDs of documents containing a phrase
+        # params:
+        # - plan: a QueryNode object
+        # - candidates: a sorted list of document IDs, or None
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        # a phrase containing an unknown term can not match any document
+        if not plan.cost:
+            return []
+
+        document_ids = sorted(self.phrase_matcher(self.inverted_index, [plan.get_terms()], None, self.trace))
+
+        if candidates is None:
+            return document_ids
+
+        return intersect_lists(candidates, document_ids)
+
+    def execute_and(self, plan, candidates):
+        # returns the sorted IDs of documents satisfying every child of an
+        # AND node and none of its filters. Children are intersected from the
+        # cheapest to the most expensive, stopping once the result is empty
+        # params:
+        # - plan: a QueryNode object
+        # - candidates: a sorted list of document IDs, or None
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        document_ids = candidates
+        children = plan.get_children()
+
+        # intersect the bitmaps of keywords stored as bitmaps a machine word
+        # at a time, before the remaining children
+        dense_children = [child for child in children if self.is_dense_keyword(child)]
+        if len(dense_children) > 1:
+            if self.trace is not None:
+                self.trace.begin("bitmap and", " ".join(child.get_terms()[0] for child in dense_children))
+
+            bitmap = self.inverted_index.get_bitmap(dense_children[0].get_terms()[0])
+            for child in dense_children[1:]:
+                bitmap &= self.inverted_index.get_bitmap(child.get_terms()[0])
+
+            if document_ids is None:
+                document_ids = bitmap_to_list(bitmap)
+            else:
+                document_ids = intersect_bitmap_list(bitmap, document_ids)
+
+            if self.trace is not None:
+                self.trace.end(len(document_ids))
+
+            if not document_ids:
+                return []
+
+            children = [child for child in children if not self.is_dense_keyword(child)]
+
+        for child in children:
+            document_ids = self.execute_plan(child, document_ids)
+            if not document_ids:
+                return []
+
+        if document_ids is None:
+            document_ids = self.get_all_document_ids()
+
+        for query_filter in plan.filters:
+            if self.trace is not None:
+                self.trace.begin("filter not", candidates=len(document_ids))
+
+            excluded = self.execute_plan(query_filter, document_ids)
+            document_ids = difference_lists(document_ids, excluded)
+
+            if self.trace is not None:
+                self.trace.end(len(document_ids))
+
+            if not document_ids:
+                return []
+
+        return document_ids
+
+    def execute_or(self, plan, candidates):
+        # returns the sorted IDs of documents satisfying any child of an OR
+        # node. The bitmaps of keywords stored as bitmaps are united a
+        # machine word at a time
+        # params:
+        # - plan: a QueryNode object
+        # - candidates: a sorted list of document IDs, or None
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        bitmap = 0
+        document_ids = []
+
+        for child in plan.get_children():
+            if candidates is None and self.is_dense_keyword(child):
+                if self.trace is not None:
+                    self.trace.begin("bitmap or", child.get_terms()[0])
+                    self.trace.end(self.inverted_index.get_df(child.get_terms()[0]))
+
+                bitmap |= self.inverted_index.get_bitmap(child.get_terms()[0])
+            else:
+                document_ids = union_lists(document_ids, self.execute_plan(child, candidates))
+
+        if bitmap:
+            document_ids = bitmap_to_list(union_bitmap_list(bitmap, document_ids))
+
+        return document_ids
+
+    def is_dense_keyword(self, plan):
+        # returns whether a plan is a keyword stored as a bitmap
+        # params:
+        # - plan: a QueryNode object
+        # returns:
+        # - bool
+
+        return plan.get_type() == QueryNode.keyword and self.inverted_index.is_dense(plan.get_terms()[0])
+
+    def get_all_document_ids(self):
+        # returns the sorted IDs of every document in the collection
+        # params: None
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        if self.all_document_ids is None:
+            self.all_document_ids = sorted(self.document_index.get_document_ids())
+
+        return self.all_document_ids
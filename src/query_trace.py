@@ -0,0 +1,129 @@
+# The QueryTrace class records the plan that a single query was executed
+# with. Each step of the evaluation, such as matching a phrase, executing a
+# node of a boolean plan, or scoring the postings of a term, is recorded with
+# the number of documents it produced, the postings it walked, and the time
+# it took. Steps taken while another step is running are nested beneath it.
+# A trace is returned by EXPLAIN queries, and is written to the slow query
+# log for queries that run for longer than its threshold.
+
+import time
+
+class QueryTrace:
+
+    def __init__(self, query):
+        # initializes a new instance of the QueryTrace class, starting the
+        # clock of the query
+        # params:
+        # - query: a string
+        # returns: None
+
+        self.query = query
+        self.started = time.monotonic()
+        self.elapsed = None
+
+        # the steps that are not nested beneath another step
+        self.steps = []
+
+        # the steps that have begun but not ended, with their start times
+        self.running = []
+
+    def begin(self, operation, detail=None, **properties):
+        # begins a step, nested beneath the innermost running step
+        # params:
+        # - operation: a string naming the step
+        # - detail: a string, such as the terms the step looked up, or None
+        # - properties: any further properties of the step, such as a df
+        # returns: None
+
+        step = {"operation": operation}
+        if detail is not None:
+            step["detail"] = detail
+        step.update(properties)
+
+        if self.running:
+            self.running[-1][0].setdefault("steps", []).append(step)
+        else:
+            self.steps.append(step)
+
+        self.running.append((step, time.monotonic()))
+
+    def end(self, documents=None, **properties):
+        # ends the innermost running step
+        # params:
+        # - documents: an int, the number of documents the step produced, or
+        #   None
+        # - properties: any further properties of the step, such as the
+        #   number of postings walked
+        # returns: None
+
+        step, started = self.running.pop()
+
+        if documents is not None:
+            step["documents"] = documents
+        step.update(properties)
+        step["time"] = round((time.monotonic() - started) * 1000, 3)
+
+    def finish(self):
+        # stops the clock of the query
+        # params: None
+        # returns: None
+
+        self.elapsed = time.monotonic() - self.started
+
+    def get_elapsed(self):
+        # returns the number of seconds the query ran for
+        # params: None
+        # returns:
+        # - elapsed: a float
+
+        if self.elapsed is None:
+            return time.monotonic() - self.started
+
+        return self.elapsed
+
+    def get_plan(self):
+        # returns the executed plan
+        # params: None
+        # returns:
+        # - plan: a dictionary holding the query, its time in milliseconds,
+        #   and its steps, each a dictionary holding its operation, time in
+        #   milliseconds, properties, and any nested steps
+
+        return {
+            "query": self.query,
+            "time": round(self.get_elapsed() * 1000, 3),
+            "steps": self.steps
+        }
+
+def format_plan(plan):
+    # returns an executed plan as readable text, with one line for each
+    # step, indented beneath the step it was taken within
+    # params:
+    # - plan: a dictionary returned by QueryTrace.get_plan
+    # returns:
+    # - text: a string
+
+    lines = ["Plan of {} ({:.3f}ms)".format(plan["query"], plan["time"])]
+    format_steps(plan["steps"], 1, lines)
+
+    return "\n".join(lines)
+
+def format_steps(steps, depth, lines):
+    # appends a line for each of a list of steps and their nested steps
+    # params:
+    # - steps: a list of dictionaries
+    # - depth: an int, the indentation of the steps
+    # - lines: a list of strings
+    # returns: None
+
+    for step in steps:
+        line = "  " * depth + step["operation"]
+        if "detail" in step:
+            line += " " + step["detail"]
+
+        for name, value in step.items():
+            if name not in ("operation", "detail", "time", "steps"):
+                line += " {}={}".format(name, value)
+
+        lines.append(line + " ({:.3f}ms)".format(step["time"]))
+        format_steps(step.get("steps", []), depth + 1, lines)
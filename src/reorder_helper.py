@@ -0,0 +1,156 @@
+# This file contains methods that help the setup.py program assign
+# document IDs that place similar documents next to each other, using
+# recursive graph bisection. Documents are split in half, then documents are
+# swapped between the halves while the swaps reduce the estimated number of
+# bits needed to encode the gaps between the document IDs of each term's
+# postings, and each half is split again in turn. The postings of a term then
+# hold runs of nearby document IDs, whose gaps are small.
+
+import math
+import numpy as np
+
+# the number of rounds of swaps made between the halves of each split
+bisection_iterations = 10
+
+# splitting stops once a range of documents is no larger than this
+leaf_size = 64
+
+def find_document_order(documents, iterations=bisection_iterations, min_size=leaf_size):
+    # finds an order of the documents in which documents sharing terms are
+    # close together. Terms found in only one document do not affect the
+    # gaps between document IDs, so they are ignored
+    # params:
+    # - documents: a list of Document objects that have been tokenized
+    # - iterations: an int, the number of rounds of swaps made between the
+    #   halves of each split
+    # - min_size: an int, the size of the ranges that are no longer split
+    # returns:
+    # - order: a list of indexes into documents, in their new order
+
+    dfs = {}
+    for document in documents:
+        for term in document.get_terms():
+            dfs[term] = dfs.get(term, 0) + 1
+
+    # the terms of each document, as the rows of a sparse matrix
+    term_ids = {}
+    offsets = [0]
+    terms = []
+    for document in documents:
+        for term in document.get_terms():
+            if dfs[term] > 1:
+                terms.append(term_ids.setdefault(term, len(term_ids)))
+        offsets.append(len(terms))
+
+    offsets = np.array(offsets, dtype=np.int64)
+    terms = np.array(terms, dtype=np.int64)
+
+    order = np.arange(len(documents), dtype=np.int64)
+
+    ranges = [(0, len(documents))]
+    while ranges:
+        start, end = ranges.pop()
+        if end - start <= min_size:
+            continue
+
+        order[start:end] = bisect_documents(order[start:end], offsets, terms, iterations)
+
+        middle = start + (end - start) // 2
+        ranges.append((start, middle))
+        ranges.append((middle, end))
+
+    return order.tolist()
+
+def bisect_documents(documents, offsets, terms, iterations):
+    # splits a range of documents in half, swapping documents between the
+    # halves while the swaps reduce the cost of encoding the halves
+    # params:
+    # - documents: an array of document indexes
+    # - offsets: an array holding the offset of each document's terms
+    # - terms: an array holding the term IDs of every document
+    # - iterations: an int
+    # returns:
+    # - documents: an array of the same document indexes, with those of the
+    #   first half first
+
+    size = len(documents)
+    lengths = offsets[documents + 1] - offsets[documents]
+
+    # the term, and the position in the range of the document, of each
+    # pairing of a document and a term
+    starts = offsets[documents] - (np.cumsum(lengths) - lengths)
+    edge_terms = terms[np.repeat(starts, lengths) + np.arange(lengths.sum())]
+    edge_documents = np.repeat(np.arange(size), lengths)
+
+    _, edge_terms = np.unique(edge_terms, return_inverse=True)
+    num_terms = edge_terms.max() + 1 if len(edge_terms) else 0
+
+    middle = size // 2
+    right = np.zeros(size, dtype=bool)
+    right[middle:] = True
+
+    log_left = math.log2(middle)
+    log_right = math.log2(size - middle)
+
+    def cost(left_degrees, right_degrees):
+        # the estimated bits needed to encode the gaps of each term's
+        # postings in both halves
+        return (left_degrees * (log_left - np.log2(left_degrees + 1)) +
+                right_degrees * (log_right - np.log2(right_degrees + 1)))
+
+    for _ in range(iterations):
+        edge_right = right[edge_documents]
+        left_degrees = np.bincount(edge_terms[~edge_right], minlength=num_terms).astype(np.float64)
+        right_degrees = np.bincount(edge_terms[edge_right], minlength=num_terms).astype(np.float64)
+
+        # the reduction in cost of moving a document holding each term to
+        # the other half. Degrees of zero only occur for terms no document
+        # on that side holds, whose gains are never used
+        current = cost(left_degrees, right_degrees)
+        left_gains = current - cost(np.maximum(left_degrees - 1, 0), right_degrees + 1)
+        right_gains = current - cost(left_degrees + 1, np.maximum(right_degrees - 1, 0))
+
+        edge_gains = np.where(edge_right, right_gains[edge_terms], left_gains[edge_terms])
+        gains = np.bincount(edge_documents, weights=edge_gains, minlength=size)
+
+        # swap the pairs of documents that gain the most from moving, while
+        # a swap reduces the cost
+        left = np.nonzero(~right)[0]
+        left = left[np.argsort(-gains[left], kind="stable")]
+        right_documents = np.nonzero(right)[0]
+        right_documents = right_documents[np.argsort(-gains[right_documents], kind="stable")]
+
+        pairs = min(len(left), len(right_documents))
+        unprofitable = np.nonzero(gains[left[:pairs]] + gains[right_documents[:pairs]] <= 0)[0]
+        swaps = unprofitable[0] if len(unprofitable) else pairs
+        if swaps == 0:
+            break
+
+        right[left[:swaps]] = True
+        right[right_documents[:swaps]] = False
+
+    return np.concatenate((documents[~right], documents[right]))
+
+def get_postings_size(inverted_index, document_ids=None):
+    # estimates the bytes needed to store the document IDs of every
+    # postings list as variable-byte encoded gaps
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_ids: a list pairing each document ID of the index with
+    #   the ID to measure it by, or None to measure the index's own IDs
+    # returns:
+    # - size: an int
+
+    size = 0
+    for term in inverted_index.entries:
+        postings = inverted_index.get_document_ids(term)
+        if document_ids is not None:
+            postings = sorted(document_ids[document_id] for document_id in postings)
+
+        previous = 0
+        for document_id in postings:
+            gap = document_id - previous
+            size += max(1, (abs(gap).bit_length() + 6) // 7)
+            previous = document_id
+
+    return size
@@ -0,0 +1,2229 @@
+# This file holds the functions that load an index and evaluate queries
+# against it, along with the SearchEngine class, which gives Python programs
+# a handle to an index that is loaded once and queried many times. The
+# query.py and server.py programs are thin wrappers around this module.
+
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from command_parser import CommandParser
+from inverted_index import InvertedIndex
+from document_index import DocumentIndex
+from lexicon import Lexicon
+from document_store import DocumentStore
+from min_heap import MinHeap
+from query_node import QueryNode
+from query_planner import QueryPlanner
+from query_budget import QueryBudget
+from query_trace import QueryTrace
+from postings_cache import PostingsCache
+from trigram_index import TrigramIndex
+from cursor_cache import CursorCache, encode_cursor, decode_cursor
+from metrics import registry
+from warmup_helper import prefetch_ranges, prefetch_file
+from token_helper import *
+from sorted_list_helper import *
+from bitmap_helper import *
+from generation_helper import *
+from fusion_helper import *
+from weight_helper import *
+
+# the kinds of query whose latencies are recorded apart
+query_types = ["keyword", "phrase", "mixed", "boolean", "vector", "hybrid", "count", "exists", "page"]
+
+# the upper bounds, in seconds, of the buckets of query latencies
+latency_buckets = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# the weight of a term found by a fuzzy query is multiplied by this for each
+# edit between it and the term in the query, and at most this many terms are
+# found for each term in the query
+fuzzy_penalty = 0.5
+fuzzy_expansions = 10
+
+query_seconds = registry.histogram(
+    "search_query_seconds", "Time taken to answer each query, by query type",
+    latency_buckets, "type", query_types
+)
+partial_queries = registry.counter(
+    "search_partial_queries_total", "Queries cut short by their budget, by query type",
+    "type", query_types
+)
+index_load_seconds = registry.gauge(
+    "search_index_load_seconds", "Time taken to load the current index generation"
+)
+index_warmup_seconds = registry.gauge(
+    "search_index_warmup_seconds", "Time taken to warm up the current index generation"
+)
+index_memory_bytes = registry.gauge(
+    "search_index_memory_bytes", "Estimated memory used by each in-memory index",
+    "index", ["inverted", "document"]
+)
+index_entries = registry.gauge(
+    "search_index_entries", "Terms in the inverted index and documents in the document index",
+    "index", ["inverted", "document"]
+)
+postings_cache_statistics = registry.gauge(
+    "search_postings_cache", "Statistics of the postings cache of the process answering the scrape",
+    "statistic", ["hits", "misses", "evictions", "resident_bytes", "cached_terms"]
+)
+
+class SearchEngine:
+
+    # the number of documents taken from each ranking of a hybrid search
+    # by default
+    default_depth = 100
+
+    # the number of threads used to run retrievers concurrently
+    max_workers = 4
+
+    # the budget of bytes for postings decoded from the positions file, and
+    # the number of highest-df terms whose postings are never evicted
+    postings_cache_bytes = 64 * 1024 * 1024
+    pinned_terms = 32
+
+    # queries running for at least this many seconds are written with their
+    # plans to the slow query log, unless the threshold is None
+    slow_query_time = None
+    slow_query_log = "slow_queries.log"
+
+    # the budget of ranked results held for paging through queries
+    cursor_cache_results = 1000000
+
+    # the number of highest-df terms whose positions are read into the page
+    # cache by a warm-up, and the budget of bytes a warm-up reads from the
+    # positions file, embeddings, and document store, in that order
+    warmup_terms = 10000
+    warmup_bytes = 256 * 1024 * 1024
+
+    def __init__(self, directory, generation=None):
+        # initializes a new instance of the SearchEngine class by loading
+        # every index in the current generation of an index directory, or in
+        # the generation named
+        # params:
+        # - directory: a string representing the index directory, or the
+        #   directory of a single generation
+        # - generation: a string, the name of the generation to load, or None
+        #   to load the current generation
+        # returns: None
+
+        started = time.monotonic()
+
+        if generation is None:
+            generation = get_current_generation(directory)
+
+        self.generation = generation
+        self.directory = get_generation_directory(directory, self.generation)
+
+        self.inverted_index, self.document_index = load_indexes(self.directory)
+        self.lexicon = load_lexicon(self.directory)
+
+        self.postings_cache = PostingsCache(
+            SearchEngine.postings_cache_bytes,
+            self.inverted_index.get_highest_df_terms(SearchEngine.pinned_terms)
+        )
+        self.inverted_index.set_cache(self.postings_cache)
+
+        self.cursor_cache = CursorCache(SearchEngine.cursor_cache_results)
+
+        # indexes built before document stores were introduced have none
+        self.document_store = None
+        if os.path.exists(self.directory + "/" + "document_store.dat"):
+            self.document_store = load_document_store(self.directory)
+
+        # only indexes built with embeddings have a vector index
+        self.vector_index = None
+        if os.path.exists(self.directory + "/" + "vectors.npy"):
+            self.vector_index = load_vector_index(self.directory)
+
+        # only indexes built with filterable fields have an attribute index
+        self.attribute_index = None
+        if os.path.exists(self.directory + "/" + "attributes.json"):
+            self.attribute_index = load_attribute_index(self.directory)
+
+        self.executor = None
+
+        # the document-term matrix is only loaded for batches of queries
+        self.term_matrix = None
+
+        # the trigram index is only loaded for fuzzy queries
+        self.trigram_index = None
+
+        index_load_seconds.set(time.monotonic() - started)
+        index_memory_bytes.set(self.inverted_index.get_memory_size(), "inverted")
+        index_memory_bytes.set(self.document_index.get_memory_size(), "document")
+        index_entries.set(self.inverted_index.get_size(), "inverted")
+        index_entries.set(self.document_index.get_size(), "document")
+
+    def warm_up(self, queries=()):
+        # warms up a freshly loaded index, so that its first queries do not
+        # wait on the disk. The positions of the highest-df terms, then the
+        # embeddings and the document store, are read into the page cache
+        # until the warm-up budget runs out, and the postings of the pinned
+        # terms are decoded into the postings cache. Recorded queries are
+        # then replayed, fetching their documents. A replayed query that
+        # fails does not stop the warm-up, and replayed queries are not
+        # recorded in the metrics or the slow query log
+        # params:
+        # - queries: a list of dictionaries, each holding a query, a k, and a
+        #   list of filters, as returned by load_warmup_queries
+        # returns:
+        # - stats: a dictionary holding the number of bytes prefetched, the
+        #   number of postings lists decoded, the number of queries replayed
+        #   and the number that failed, and the seconds taken
+
+        started = time.monotonic()
+        budget = SearchEngine.warmup_bytes
+        prefetched = 0
+
+        # the positions of the most common terms are read by the most
+        # phrase queries
+        if self.inverted_index.positions_filename is not None:
+            ranges = []
+            for term in self.inverted_index.get_highest_df_terms(SearchEngine.warmup_terms):
+                positions_range = self.inverted_index.get_positions_range(term)
+                if positions_range is not None:
+                    ranges.append(positions_range)
+
+            prefetched += prefetch_ranges(self.inverted_index.positions_filename, ranges, budget - prefetched)
+
+        if self.vector_index is not None:
+            prefetched += prefetch_file(self.directory + "/" + "vectors.npy", budget - prefetched)
+
+        if self.document_store is not None:
+            prefetched += prefetch_file(self.directory + "/" + "document_store.dat", budget - prefetched)
+
+        # pinned postings are never evicted, so they are decoded once here
+        decoded = 0
+        if self.inverted_index.has_positions():
+            for term in self.inverted_index.get_highest_df_terms(SearchEngine.pinned_terms):
+                self.inverted_index.get_positional_postings(term)
+                decoded += 1
+
+        failed = 0
+        for entry in queries:
+            try:
+                CommandParser([entry["query"]]).validate_query(0)
+
+                filtered = self.filter_documents(entry["filters"]) if entry["filters"] else None
+                pool_size, nonzero_scores, highest_docs = run_query(
+                    self.inverted_index,
+                    self.document_index,
+                    self.lexicon,
+                    entry["query"],
+                    entry["k"],
+                    filtered=filtered
+                )
+
+                documents = self.document_store is not None
+                terms = get_query_terms(entry["query"], self.lexicon) if documents else []
+                self.create_results(pool_size, nonzero_scores, highest_docs, documents, terms)
+
+            except Exception:
+                failed += 1
+
+        elapsed = time.monotonic() - started
+        index_warmup_seconds.set(elapsed)
+
+        return {
+            "prefetched_bytes": prefetched,
+            "decoded_postings": decoded,
+            "queries": len(queries),
+            "failed_queries": failed,
+            "seconds": elapsed
+        }
+
+    def get_generation(self):
+        # returns the name of the loaded generation
+        # params: None
+        # returns:
+        # - generation: a string, or None for an index directory that was
+        #   not built in generations
+
+        return self.generation
+
+    def get_cache_stats(self):
+        # returns the statistics of the postings cache, including its hit
+        # ratio and resident bytes
+        # params: None
+        # returns:
+        # - stats: a dictionary
+
+        return self.postings_cache.get_stats()
+
+    def export_metrics(self):
+        # returns the metrics of the queries served by this process and any
+        # workers forked from it, in the Prometheus text format. The
+        # statistics of the postings cache are those of this process alone
+        # params: None
+        # returns:
+        # - text: a string
+
+        stats = self.get_cache_stats()
+        for statistic in postings_cache_statistics.label_values:
+            postings_cache_statistics.set(stats[statistic], statistic)
+
+        return registry.export()
+
+    def search(self, query, k, documents=False, time_limit=None, max_postings=None, max_documents=None, filters=None, explain=False, zone_weights=None, fuzzy=None):
+        # validates and evaluates a query, returning the k highest scoring
+        # documents. If any limit is supplied, evaluation stops once a limit
+        # is reached, and the best documents found so far are returned. If
+        # filters are supplied, only the documents whose attributes match
+        # every filter are evaluated. A fuzzy query also matches the terms
+        # within an edit distance of each keyword, scored below the keyword
+        # itself. Queries that run for longer than the slow query threshold
+        # are written to the slow query log
+        # params:
+        # - query: a string
+        # - k: an int
+        # - documents: a bool, True to include the zones and a snippet of
+        #   each document in the results
+        # - time_limit: a float, the number of seconds the query may run
+        #   for, or None
+        # - max_postings: an int, the number of postings that may be
+        #   scanned, or None
+        # - max_documents: an int, the number of documents that may be
+        #   scored, or None
+        # - filters: a list of strings, each in the form field=value,
+        #   field=value,value, or a comparison such as field>=value
+        # - explain: a bool, True to include the executed plan of the query,
+        #   with the documents produced and time taken by each step
+        # - zone_weights: a dictionary pairing zones with weights. The score
+        #   each term earns within a weighted zone, multiplied by the zone's
+        #   weight, is added to the score of the document
+        # - fuzzy: an int, the most edits between a keyword and the terms it
+        #   also matches, or None to only match the keyword. Shorter
+        #   keywords allow fewer edits
+        # returns:
+        # - results: a dictionary holding the number of documents considered,
+        #   the number with a non-zero score, whether the results are
+        #   partial, and a list of results, each a dictionary holding a
+        #   document_id and score, from highest to lowest score. An
+        #   explained query's results also hold its plan
+
+        if k <= 0:
+            raise Exception("You must return a positive number of results")
+
+        CommandParser([query]).validate_query(0)
+
+        if fuzzy is not None and fuzzy < 0:
+            raise Exception("A fuzzy query can not allow a negative number of edits")
+
+        started = time.monotonic()
+
+        # only explained queries, and queries that may be slow queries, are
+        # traced
+        trace = None
+        if explain or SearchEngine.slow_query_time is not None:
+            trace = QueryTrace(query)
+
+        budget = None
+        if time_limit is not None or max_postings is not None or max_documents is not None:
+            budget = QueryBudget(time_limit, max_postings, max_documents)
+
+        filtered = None
+        if filters:
+            if trace is not None:
+                trace.begin("filter", "; ".join(filters))
+
+            filtered = self.filter_documents(filters)
+
+            if trace is not None:
+                trace.end(len(filtered))
+
+        find_variants = None
+        if fuzzy:
+            trigram_index = self.get_trigram_index()
+            find_variants = lambda term: find_fuzzy_terms(trigram_index, self.inverted_index, term, fuzzy)
+
+        pool_size, nonzero_scores, highest_docs = run_query(
+            self.inverted_index,
+            self.document_index,
+            self.lexicon,
+            query,
+            k,
+            budget,
+            filtered,
+            trace,
+            zone_weights,
+            find_variants
+        )
+
+        terms = []
+        if documents:
+            terms = get_query_terms(query, self.lexicon, find_variants)
+
+        if trace is not None and documents:
+            trace.begin("fetch")
+
+        results = self.create_results(pool_size, nonzero_scores, highest_docs, documents, terms)
+        results["partial"] = budget is not None and budget.is_partial()
+
+        record_query(get_query_type(query), time.monotonic() - started, results["partial"])
+
+        if trace is None:
+            return results
+
+        if documents:
+            trace.end(len(highest_docs))
+        trace.finish()
+
+        if explain:
+            results["plan"] = trace.get_plan()
+
+        if SearchEngine.slow_query_time is not None and trace.get_elapsed() >= SearchEngine.slow_query_time:
+            log_slow_query(SearchEngine.slow_query_log, trace, k, filters, results["partial"])
+
+        return results
+
+    def search_page(self, query, k, cursor=None, documents=False, filters=None, zone_weights=None):
+        # returns a page of the highest scoring documents of a query, along
+        # with a cursor from which the next page resumes. The query is
+        # ranked in full for the first page, and the ranking is cached, so
+        # later pages are slices of it. The cache belongs to this process, so
+        # if the ranking is no longer cached, or the cursor was returned by
+        # another process, the query is scored again and the page resumes
+        # after the last result of the previous page, selecting only the
+        # next k documents rather than ranking them all. Results of equal
+        # score are ordered by external document ID, which the cursor holds,
+        # so that it resumes in the right place after the index is rebuilt
+        # params:
+        # - query: a string, or None when a cursor is supplied
+        # - k: an int, the number of results on the page
+        # - cursor: a string returned with the previous page, or None for
+        #   the first page
+        # - documents: a bool, True to include the zones and a snippet of
+        #   each document in the results
+        # - filters: a list of strings, in the form accepted by search. The
+        #   filters of the first page are kept by its cursor
+        # - zone_weights: a dictionary, in the form accepted by search. The
+        #   zone weights of the first page are kept by its cursor
+        # returns:
+        # - results: a dictionary in the form returned by search, holding
+        #   the cursor of the next page, or None on the last page
+
+        if k <= 0:
+            raise Exception("You must return a positive number of results")
+
+        state = None
+        if cursor is not None:
+            state = decode_cursor(cursor)
+            query = state["query"]
+            filters = state["filters"]
+            zone_weights = state.get("zone_weights")
+        elif query is None:
+            raise Exception("A query or a cursor must be supplied")
+
+        CommandParser([query]).validate_query(0)
+
+        started = time.monotonic()
+
+        ranking = None
+        if state is not None and state["generation"] == self.generation and state["key"] is not None:
+            ranking = self.cursor_cache.get(state["key"])
+
+        if ranking is not None:
+            key = state["key"]
+            offset = state["offset"]
+            pool_size = state["pool"]
+            nonzero_scores = len(ranking)
+
+            page = ranking[offset:offset + k]
+            remaining = len(ranking) - offset
+        else:
+            filtered = None
+            if filters:
+                filtered = self.filter_documents(filters)
+
+            pool_size, scored_docs = score_query(self.inverted_index, self.document_index, self.lexicon, query, filtered, zone_weights)
+            nonzero_scores = len(scored_docs)
+
+            if state is None:
+                ranking = rank_docs(scored_docs, self.document_index)
+                key = self.cursor_cache.put(ranking)
+                offset = 0
+
+                page = ranking[:k]
+                remaining = len(ranking)
+            else:
+                # the ranking is not cached again, as only its next page is
+                # selected, so later pages are also selected this way
+                key = None
+                offset = state["offset"]
+
+                page, remaining = find_page_after(self.document_index, scored_docs, k, state["score"], state["document_id"])
+
+        next_cursor = None
+        if remaining > k:
+            document_id, score = page[-1]
+            next_cursor = encode_cursor({
+                "query": query,
+                "filters": filters,
+                "zone_weights": zone_weights,
+                "generation": self.generation,
+                "key": key,
+                "offset": offset + k,
+                "pool": pool_size,
+                "score": score,
+                "document_id": self.document_index.get_external_id(document_id)
+            })
+
+        terms = []
+        if documents:
+            terms = get_query_terms(query, self.lexicon)
+
+        results = self.create_results(pool_size, nonzero_scores, list(reversed(page)), documents, terms)
+        results["cursor"] = next_cursor
+
+        record_query("page", time.monotonic() - started)
+
+        return results
+
+    def count(self, query, filters=None):
+        # counts the documents matching a query, without scoring them. A
+        # document matches a keyword query when it contains any keyword, a
+        # query holding phrases when it contains any phrase, and a boolean
+        # query when it satisfies the query
+        # params:
+        # - query: a string
+        # - filters: a list of strings, in the form accepted by search
+        # returns:
+        # - results: a dictionary holding the number of matching documents
+
+        CommandParser([query]).validate_query(0)
+
+        started = time.monotonic()
+
+        filtered = None
+        if filters:
+            filtered = self.filter_documents(filters)
+
+        matches = get_query_matches(self.inverted_index, self.document_index, self.lexicon, query, filtered)
+
+        record_query("count", time.monotonic() - started)
+
+        return {"count": len(matches)}
+
+    def exists(self, query, filters=None):
+        # finds whether any document matches a query, without scoring, and
+        # stopping at the first match found where the query allows it
+        # params:
+        # - query: a string
+        # - filters: a list of strings, in the form accepted by search
+        # returns:
+        # - results: a dictionary holding whether any document matches, and
+        #   the ID of a matching document, or None
+
+        CommandParser([query]).validate_query(0)
+
+        started = time.monotonic()
+
+        filtered = None
+        if filters:
+            filtered = self.filter_documents(filters)
+
+        matches = get_query_matches(self.inverted_index, self.document_index, self.lexicon, query, filtered, 1)
+
+        record_query("exists", time.monotonic() - started)
+
+        document_id = None
+        if matches:
+            document_id = self.document_index.get_external_id(matches[0])
+
+        return {"exists": bool(matches), "document_id": document_id}
+
+    def search_vector(self, vector, k, nprobe=None, exact=False, documents=False, rerank=None):
+        # finds the k documents whose embeddings are most similar to a query
+        # embedding
+        # params:
+        # - vector: a list of floats
+        # - k: an int
+        # - nprobe: an int, the number of IVF clusters probed, or None to use
+        #   the default
+        # - exact: a bool, True to compare the query with every embedding
+        # - documents: a bool, True to include the zones and a snippet of
+        #   each document in the results
+        # - rerank: an int, the number of candidates scored using quantized
+        #   embeddings that are re-scored using full-precision embeddings,
+        #   or None to use the default
+        # returns:
+        # - results: a dictionary in the form returned by search, where the
+        #   documents considered are the embeddings compared
+
+        if k <= 0:
+            raise Exception("You must return a positive number of results")
+
+        if self.vector_index is None:
+            raise Exception("Index has no embeddings")
+
+        started = time.monotonic()
+
+        num_compared, highest_docs = self.vector_index.search(vector, k, nprobe, exact, rerank)
+
+        results = self.create_results(num_compared, num_compared, highest_docs, documents, [])
+
+        record_query("vector", time.monotonic() - started)
+
+        return results
+
+    def search_hybrid(self, query, vector, k, lexical_depth=None, vector_depth=None, fusion="rrf", weight=0.5, nprobe=None, rerank=None, documents=False):
+        # finds the k documents that best match both a keyword or phrase
+        # query and a query embedding. The lexical and vector rankings are
+        # computed concurrently over the same loaded index, then fused. When
+        # the query holds phrases or boolean operators, only the documents
+        # that satisfy them are candidates for the vector ranking
+        # params:
+        # - query: a string
+        # - vector: a list of floats
+        # - k: an int
+        # - lexical_depth: an int, the number of documents taken from the
+        #   lexical ranking, or None to use the default
+        # - vector_depth: an int, the number of documents taken from the
+        #   vector ranking, or None to use the default
+        # - fusion: "rrf" for reciprocal rank fusion, or "weighted" to sum
+        #   the min-max normalized scores of each ranking
+        # - weight: a float, the weight of the lexical ranking when fusion
+        #   is "weighted", with the vector ranking weighted 1 - weight
+        # - nprobe: an int, or None to use the default
+        # - rerank: an int, or None to use the default
+        # - documents: a bool, True to include the zones and a snippet of
+        #   each document in the results
+        # returns:
+        # - results: a dictionary in the form returned by search, where the
+        #   documents considered are the lexical pool and the documents with
+        #   non-zero scores are the fused candidates
+
+        if k <= 0:
+            raise Exception("You must return a positive number of results")
+
+        if self.vector_index is None:
+            raise Exception("Index has no embeddings")
+
+        if fusion not in ("rrf", "weighted"):
+            raise Exception("Fusion method {} is not recognized".format(fusion))
+
+        CommandParser([query]).validate_query(0)
+
+        lexical_depth = lexical_depth or max(k, SearchEngine.default_depth)
+        vector_depth = vector_depth or max(k, SearchEngine.default_depth)
+
+        started = time.monotonic()
+
+        keywords, phrases, pool, constrained = prepare_query(
+            self.inverted_index,
+            self.document_index,
+            self.lexicon,
+            query
+        )
+
+        # rank the candidates by their embeddings on another thread, while
+        # this thread ranks them by their keywords and phrases
+        candidates = sorted(pool) if constrained else None
+        vector_future = self.get_executor().submit(
+            self.vector_index.search, vector, vector_depth, nprobe, False, rerank, candidates
+        )
+
+        scored_docs = score_docs(self.inverted_index, self.document_index, keywords, phrases, pool)
+        lexical_docs = find_highest_docs(scored_docs, lexical_depth)
+
+        _, vector_docs = vector_future.result()
+
+        if fusion == "rrf":
+            fused_docs = reciprocal_rank_fusion([lexical_docs, vector_docs])
+        else:
+            fused_docs = weighted_score_fusion([lexical_docs, vector_docs], [weight, 1 - weight])
+
+        highest_docs = find_highest_docs(fused_docs, k)
+
+        terms = []
+        if documents:
+            terms = list(keywords)
+            for phrase in phrases:
+                terms.extend(phrase)
+
+        results = self.create_results(len(pool), len(fused_docs), highest_docs, documents, terms)
+
+        record_query("hybrid", time.monotonic() - started)
+
+        return results
+
+    def search_batch(self, queries, k):
+        # evaluates a batch of queries, returning the k highest scoring
+        # documents of each. Every query is scored against every document
+        # by a single sparse matrix product with the document-term matrix,
+        # and queries holding phrases or boolean operators are restricted to
+        # the documents that satisfy them
+        # params:
+        # - queries: a list of strings
+        # - k: an int
+        # returns:
+        # - all_results: a list holding a dictionary for each query, in the
+        #   form returned by search
+
+        if k <= 0:
+            raise Exception("You must return a positive number of results")
+
+        all_terms = []
+        pools = []
+        pool_sizes = []
+
+        for query in queries:
+            CommandParser([query]).validate_query(0)
+
+            keywords, phrases, pool, constrained = prepare_query(
+                self.inverted_index,
+                self.document_index,
+                self.lexicon,
+                query
+            )
+
+            terms = list(keywords)
+            for phrase in phrases:
+                terms.extend(phrase)
+
+            all_terms.append(terms)
+            pools.append(pool if constrained else None)
+            pool_sizes.append(len(pool))
+
+        term_matrix = self.get_term_matrix()
+        query_matrix = term_matrix.create_query_matrix(all_terms, self.inverted_index, self.document_index.get_size())
+
+        all_results = []
+        for pool_size, (nonzero_scores, highest_docs) in zip(pool_sizes, term_matrix.score_queries(query_matrix, k, pools)):
+            all_results.append(self.create_results(pool_size, nonzero_scores, highest_docs, False, []))
+
+        return all_results
+
+    def filter_documents(self, filters):
+        # returns the IDs of the documents whose attributes match every
+        # filter
+        # params:
+        # - filters: a list of strings
+        # returns:
+        # - document_ids: a sorted list of document IDs
+
+        if self.attribute_index is None:
+            raise Exception("Index has no filterable fields")
+
+        # the attribute index is only loaded by indexes that have one
+        from attribute_index import parse_filter
+
+        return self.attribute_index.filter([parse_filter(string) for string in filters])
+
+    def get_term_matrix(self):
+        # returns the document-term matrix, loading it if it was saved with
+        # the index, or building it from the inverted index otherwise
+        # params: None
+        # returns:
+        # - term_matrix: a TermMatrix object
+
+        if self.term_matrix is None:
+            # scipy is only needed to score batches of queries
+            from term_matrix import TermMatrix
+
+            term_matrix = TermMatrix()
+            if os.path.exists(self.directory + "/" + "term_matrix.npz"):
+                term_matrix.load(self.directory + "/" + "term_matrix.npz")
+            else:
+                term_matrix.build(self.inverted_index, self.document_index)
+
+            self.term_matrix = term_matrix
+
+        return self.term_matrix
+
+    def get_trigram_index(self):
+        # returns the trigram index of the term dictionary, loading it if it
+        # was saved with the index, or building it from the inverted index
+        # otherwise
+        # params: None
+        # returns:
+        # - trigram_index: a TrigramIndex object
+
+        if self.trigram_index is None:
+            trigram_index = TrigramIndex()
+            if os.path.exists(self.directory + "/" + "trigram_index.tsv"):
+                trigram_index.load_TSV(self.directory + "/" + "trigram_index.tsv")
+            else:
+                trigram_index.build(self.inverted_index.entries)
+
+            self.trigram_index = trigram_index
+
+        return self.trigram_index
+
+    def get_executor(self):
+        # returns the thread pool used to run retrievers concurrently,
+        # creating it the first time it is needed
+        # params: None
+        # returns:
+        # - executor: a ThreadPoolExecutor object
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=SearchEngine.max_workers)
+
+        return self.executor
+
+    def create_results(self, pool_size, nonzero_scores, highest_docs, documents, terms):
+        # creates the dictionary of results returned by a search
+        # params:
+        # - pool_size: an int
+        # - nonzero_scores: an int
+        # - highest_docs: a list of [document_id, score] pairings, from the
+        #   lowest to the highest score
+        # - documents: a bool, True to include the zones and a snippet of
+        #   each document
+        # - terms: a list of strings marked in each snippet
+        # returns:
+        # - results: a dictionary, holding the external ID of each document
+
+        fetched = {}
+        if documents:
+            if self.document_store is None:
+                raise Exception("Index has no document store")
+
+            filter_fields = []
+            if self.attribute_index is not None:
+                filter_fields = self.attribute_index.get_fields()
+
+            fetched = fetch_documents(self.document_store, self.inverted_index, highest_docs, terms, filter_fields)
+
+        results = []
+        for document_id, score in reversed(highest_docs):
+            result = {"document_id": self.document_index.get_external_id(document_id), "score": score}
+            if document_id in fetched:
+                result.update(fetched[document_id])
+            results.append(result)
+
+        return {
+            "documents_considered": pool_size,
+            "nonzero_scores": nonzero_scores,
+            "results": results
+        }
+
+def load_indexes(directory):
+    # This function loads inverted index and document index from the 
+    # supplied directory, reading the current generation if the directory
+    # was built in generations.
+    # params:
+    # - directory: a string representing the directory to save the index
+    # returns:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    
+    directory = resolve_index_directory(directory)
+    
+    inverted_file = directory + "/" + "inverted_index.tsv"
+    document_file = directory + "/" + "document_index.tsv"
+    
+    if not os.path.exists(inverted_file):
+        raise Exception("Index {} does not exist".format(inverted_file))
+    
+    if not os.path.exists(document_file):
+        raise Exception("Index {} does not exist".format(document_file))    
+
+    # indexes built without positions have no positions file
+    positions_file = directory + "/" + "positions.dat"
+    if not os.path.exists(positions_file):
+        positions_file = None
+    
+    inverted_index = InvertedIndex()
+    inverted_index.load_TSV(inverted_file, positions_file)
+    
+    document_index = DocumentIndex()
+    document_index.load_TSV(document_file)
+            
+    return inverted_index, document_index
+
+def load_lexicon(directory):
+    # This function loads the lexicon from the supplied directory. Indexes
+    # created before lexicons were introduced have no lexicon, in which case
+    # an empty lexicon is returned
+    # params:
+    # - directory: a string representing the directory of the index
+    # returns:
+    # - lexicon: a Lexicon object
+    
+    lexicon_file = resolve_index_directory(directory) + "/" + "lexicon.tsv"
+    
+    lexicon = Lexicon()
+    if os.path.exists(lexicon_file):
+        lexicon.load_TSV(lexicon_file)
+    
+    return lexicon
+
+def load_document_store(directory):
+    # This function loads the offset index of the document store from the
+    # supplied directory
+    # params:
+    # - directory: a string representing the directory of the index
+    # returns:
+    # - document_store: a DocumentStore object
+    
+    directory = resolve_index_directory(directory)
+    
+    data_file = directory + "/" + "document_store.dat"
+    index_file = directory + "/" + "document_store.tsv"
+    
+    if not os.path.exists(data_file) or not os.path.exists(index_file):
+        raise Exception("Document store {} does not exist".format(data_file))
+    
+    document_store = DocumentStore()
+    document_store.load(data_file, index_file)
+    
+    return document_store
+
+def load_vector_index(directory):
+    # This function loads the vector index from the supplied directory
+    # params:
+    # - directory: a string representing the directory of the index
+    # returns:
+    # - vector_index: a VectorIndex object
+    
+    # numpy is only needed by indexes that have embeddings
+    from vector_index import VectorIndex
+    
+    vector_index = VectorIndex()
+    vector_index.load(resolve_index_directory(directory))
+    
+    return vector_index
+
+def load_attribute_index(directory):
+    # This function loads the attribute index from the supplied directory
+    # params:
+    # - directory: a string representing the directory of the index
+    # returns:
+    # - attribute_index: an AttributeIndex object
+    
+    # numpy is only needed by indexes that have filterable fields
+    from attribute_index import AttributeIndex
+    
+    attribute_index = AttributeIndex()
+    attribute_index.load(resolve_index_directory(directory))
+    
+    return attribute_index
+
+# serializes writes to the slow query log from concurrent queries
+slow_query_lock = threading.Lock()
+
+def log_slow_query(filename, trace, k, filters, partial):
+    # This function appends a slow query and its executed plan to the slow
+    # query log, as a single line of JSON. Each entry is written in one
+    # call, so that worker processes sharing the log do not interleave
+    # params:
+    # - filename: a string
+    # - trace: a QueryTrace object
+    # - k: an int
+    # - filters: a list of strings, or None
+    # - partial: a bool, True if the query ran out of time or work
+    # returns: None
+    
+    entry = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "k": k,
+        "filters": filters or [],
+        "partial": partial
+    }
+    entry.update(trace.get_plan())
+    
+    with slow_query_lock:
+        with open(filename, "a", encoding="utf8") as log_file:
+            log_file.write(json.dumps(entry) + "\n")
+
+def record_query(query_type, elapsed, partial=False):
+    # This function records the latency of an answered query in the
+    # metrics registry
+    # params:
+    # - query_type: one of the query types
+    # - elapsed: a float, the number of seconds the query took
+    # - partial: a bool, True if the query was cut short by its budget
+    # returns: None
+    
+    query_seconds.observe(elapsed, query_type)
+    if partial:
+        partial_queries.inc(query_type)
+
+def get_query_type(query):
+    # This function classifies a query string as a keyword query, a phrase
+    # query, a mixed query holding both keywords and phrases, or a boolean
+    # query
+    # params:
+    # - query: a string
+    # returns:
+    # - query_type: a string
+    
+    if is_boolean_query(query):
+        return "boolean"
+    
+    keywords, phrases = parse_query(query)
+    if not phrases:
+        return "keyword"
+    if not keywords:
+        return "phrase"
+    
+    return "mixed"
+
+def run_query(inverted_index, document_index, lexicon, query, k, budget=None, filtered=None, trace=None, zone_weights=None, find_variants=None):
+    # This function parses, normalizes, and evaluates a query string,
+    # dispatching boolean queries to the query planner. When variants are
+    # found for the keywords of the query, the documents holding a variant
+    # match as if they held its keyword
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - lexicon: a Lexicon object
+    # - query: a string
+    # - k: an int
+    # - budget: a QueryBudget object, or None for an unlimited query
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - trace: a QueryTrace object recording each step, or None
+    # - zone_weights: a dictionary of zone-weight pairings, or None
+    # - find_variants: a function accepting a term and returning a
+    #   dictionary pairing the variants of the term with their weights, or
+    #   None
+    # returns:
+    # - pool_size: an int
+    # - nonzero_scores: an int
+    # - highest_docs: a sorted list of [document_id, score] pairings
+    
+    if is_boolean_query(query):
+        # parse the query into a tree and normalize its tokens
+        if trace is not None:
+            trace.begin("parse")
+        
+        query_node = parse_boolean_query(query)
+        normalize_boolean_query(query_node, lexicon)
+        
+        if trace is not None:
+            trace.end(tree=str(query_node))
+        
+        expansions = None
+        if find_variants is not None:
+            if trace is not None:
+                trace.begin("fuzzy")
+            
+            expansions = expand_boolean_query(query_node, find_variants)
+            
+            if trace is not None:
+                trace.end(terms=sorted(expansions), tree=str(query_node))
+        
+        return evaluate_boolean_query(inverted_index, document_index, query_node, k, budget, filtered, trace, zone_weights, expansions)
+    
+    if trace is not None:
+        trace.begin("parse")
+    
+    # parse the query
+    keywords, phrases = parse_query(query)
+    
+    # normalize the query tokens
+    keywords, phrases = normalize_query(keywords, phrases, lexicon)
+    
+    if trace is not None:
+        trace.end(keywords=keywords, phrases=phrases)
+    
+    expansions = None
+    if find_variants is not None:
+        if trace is not None:
+            trace.begin("fuzzy")
+        
+        expansions = expand_keywords(keywords, phrases, find_variants)
+        
+        if trace is not None:
+            trace.end(terms=sorted(expansions))
+    
+    return evaluate_query(inverted_index, document_index, keywords, phrases, k, budget, filtered, trace, zone_weights, expansions)
+
+def get_query_terms(query, lexicon, find_variants=None):
+    # Returns the normalized terms of every keyword and phrase in a query
+    # that is not negated, followed by the variants of its keywords
+    # params:
+    # - query: a string
+    # - lexicon: a Lexicon object
+    # - find_variants: a function, in the form accepted by run_query, or
+    #   None
+    # returns:
+    # - terms: a list of strings
+    
+    if is_boolean_query(query):
+        query_node = parse_boolean_query(query)
+        normalize_boolean_query(query_node, lexicon)
+        keywords, phrases = query_node.get_positive_leaves()
+    else:
+        keywords, phrases = parse_query(query)
+        keywords, phrases = normalize_query(keywords, phrases, lexicon)
+    
+    terms = list(keywords)
+    for phrase in phrases:
+        terms.extend(phrase)
+    
+    if find_variants is not None:
+        terms.extend(expand_keywords(keywords, phrases, find_variants))
+    
+    return terms
+
+def parse_query(query):
+    # Parses a query string and returns a list of keywords and a list of
+    # phrases contained within the string
+    # params:
+    # - query: a string
+    # returns:
+    # - keywords: a list of strings
+    # - phrases: a list of lists of strings
+    
+    tokens = query.split()
+    
+    keywords = []
+    phrases = []
+    
+    is_phrase = False
+    phrase = []
+    for token in tokens:
+        if re.fullmatch(r":[\w'\u2019\u201A]+", token):
+            is_phrase = True
+            phrase.append(token[1:])
+        elif re.fullmatch(r"[\w'\u2019\u201A]+:", token):
+            is_phrase = False
+            phrase.append(token[:-1])
+            phrases.append(phrase)
+            phrase = []
+        elif re.fullmatch(r"[\w'\u2019\u201A]+", token):
+            if is_phrase:
+                phrase.append(token)
+            else:
+                keywords.append(token)
+        elif re.fullmatch(r"\w+:[\w'\u2019\u201A]+", token) and not is_phrase:
+            keywords.append(token)
+        elif re.fullmatch(r":[\w'\u2019\u201A]+:", token):
+            phrases.append([token[1:-1]])
+        else:
+            raise Exception("Token {} is not recognized".format(str(token)))
+        
+    return keywords, phrases
+    
+def split_query(query):
+    # Splits a query string into tokens, treating each parenthesis as a
+    # token of its own
+    # params:
+    # - query: a string
+    # returns:
+    # - tokens: a list of strings
+    
+    return re.findall(r"[()]|[^\s()]+", query)
+
+def is_boolean_query(query):
+    # Returns true if a query uses any boolean operators or parentheses
+    # outside of a phrase
+    # params:
+    # - query: a string
+    # returns:
+    # - bool
+    
+    is_phrase = False
+    for token in split_query(query):
+        if re.fullmatch(r":[\w'\u2019\u201A]+", token):
+            is_phrase = True
+        elif re.fullmatch(r"[\w'\u2019\u201A]+:", token):
+            is_phrase = False
+        elif not is_phrase and token in ("AND", "OR", "NOT", "(", ")"):
+            return True
+    
+    return False
+
+def parse_boolean_query(query):
+    # Parses a boolean query string into a tree of QueryNode objects. NOT
+    # binds most tightly, followed by AND, then OR. Adjacent operands with no
+    # operator between them are joined with AND. Parentheses group operands.
+    # A query that matches documents by negated terms alone, such as
+    # NOT swift or taylor OR NOT swift, is rejected, as those documents
+    # have no terms to be scored by
+    # params:
+    # - query: a string
+    # returns:
+    # - query_node: a QueryNode object
+    
+    tokens = split_query(query)
+    
+    query_node, i = parse_or(tokens, 0)
+    if i < len(tokens):
+        raise Exception("Token {} is not expected".format(tokens[i]))
+    
+    if not query_node.is_positive():
+        raise Exception("Query matches documents by negated terms alone")
+    
+    return query_node
+
+def parse_or(tokens, i):
+    # Parses one or more AND expressions separated by OR operators
+    # params:
+    # - tokens: a list of strings
+    # - i: an int, the index of the first token to parse
+    # returns:
+    # - query_node: a QueryNode object
+    # - i: an int, the index of the first token not parsed
+    
+    children = []
+    query_node, i = parse_and(tokens, i)
+    children.append(query_node)
+    
+    while i < len(tokens) and tokens[i] == "OR":
+        query_node, i = parse_and(tokens, i + 1)
+        children.append(query_node)
+    
+    if len(children) == 1:
+        return children[0], i
+    
+    return QueryNode(QueryNode.or_op, children=children), i
+
+def parse_and(tokens, i):
+    # Parses one or more NOT expressions separated by AND operators, or by
+    # no operator at all
+    # params:
+    # - tokens: a list of strings
+    # - i: an int, the index of the first token to parse
+    # returns:
+    # - query_node: a QueryNode object
+    # - i: an int, the index of the first token not parsed
+    
+    children = []
+    query_node, i = parse_not(tokens, i)
+    children.append(query_node)
+    
+    while i < len(tokens) and tokens[i] not in ("OR", ")"):
+        if tokens[i] == "AND":
+            i += 1
+        query_node, i = parse_not(tokens, i)
+        children.append(query_node)
+    
+    if len(children) == 1:
+        return children[0], i
+    
+    return QueryNode(QueryNode.and_op, children=children), i
+
+def parse_not(tokens, i):
+    # Parses a keyword, phrase, or parenthesized expression, optionally
+    # preceded by NOT operators
+    # params:
+    # - tokens: a list of strings
+    # - i: an int, the index of the first token to parse
+    # returns:
+    # - query_node: a QueryNode object
+    # - i: an int, the index of the first token not parsed
+    
+    if i >= len(tokens):
+        raise Exception("Query ends with an operator")
+    
+    token = tokens[i]
+    
+    if token == "NOT":
+        query_node, i = parse_not(tokens, i + 1)
+        return QueryNode(QueryNode.not_op, children=[query_node]), i
+    
+    if token == "(":
+        query_node, i = parse_or(tokens, i + 1)
+        if i >= len(tokens) or tokens[i] != ")":
+            raise Exception("Parenthesis is not closed")
+        return query_node, i + 1
+    
+    if token in ("AND", "OR", ")"):
+        raise Exception("Token {} is not expected".format(token))
+    
+    # parse a phrase, from its opening colon to its closing colon
+    if re.fullmatch(r":[\w'\u2019\u201A]+:", token):
+        return QueryNode(QueryNode.phrase, [token[1:-1]]), i + 1
+    
+    if re.fullmatch(r":[\w'\u2019\u201A]+", token):
+        phrase = [token[1:]]
+        i += 1
+        while i < len(tokens) and re.fullmatch(r"[\w'\u2019\u201A]+", tokens[i]):
+            phrase.append(tokens[i])
+            i += 1
+        if i >= len(tokens) or not re.fullmatch(r"[\w'\u2019\u201A]+:", tokens[i]):
+            raise Exception("Phrase must be enclosed by colons")
+        phrase.append(tokens[i][:-1])
+        return QueryNode(QueryNode.phrase, phrase), i + 1
+    
+    if re.fullmatch(r"[\w'\u2019\u201A]+", token) or re.fullmatch(r"\w+:[\w'\u2019\u201A]+", token):
+        return QueryNode(QueryNode.keyword, [token]), i + 1
+    
+    raise Exception("Token {} is not recognized".format(str(token)))
+
+def normalize_boolean_query(query_node, lexicon=None):
+    # Normalizes the tokens of every keyword and phrase in a query tree
+    # params:
+    # - query_node: a QueryNode object
+    # - lexicon: a Lexicon object, or None
+    # returns: None
+    
+    if query_node.is_leaf():
+        query_node.set_terms(normalize_query_tokens(query_node.get_terms(), lexicon))
+    else:
+        for child in query_node.get_children():
+            normalize_boolean_query(child, lexicon)
+    
+def normalize_query(keywords, phrases, lexicon=None):
+    # Normalizes each token in the query, including keywords and phrases.
+    # Tokens found in the lexicon are normalized without loading a stemmer.
+    # params:
+    # - keywords: a list of strings
+    # - phrases: a list of lists of strings
+    # - lexicon: a Lexicon object, or None
+    # returns: None
+    
+    keywords_new = normalize_query_tokens(keywords, lexicon)
+    
+    phrases_new = []
+    for phrase in phrases:
+        phrases_new.append(normalize_tokens(phrase, lexicon))
+            
+    return keywords_new, phrases_new
+
+def normalize_query_tokens(tokens, lexicon=None):
+    # Normalizes the tokens of a query, keeping the zone of each token that
+    # is restricted to one, such as title:swift
+    # params:
+    # - tokens: a list of strings
+    # - lexicon: a Lexicon object, or None
+    # returns:
+    # - terms: a list of strings
+    
+    terms = []
+    for token in tokens:
+        zone, _, token = token.rpartition(zone_separator)
+        for term in normalize_tokens([token], lexicon):
+            terms.append(get_zone_term(zone, term) if zone else term)
+    
+    return terms
+
+def parse_zone_weights(string):
+    # Parses a list of zone weights of the form zone:weight,zone:weight
+    # params:
+    # - string: a string
+    # returns:
+    # - zone_weights: a dictionary of zone-weight pairings
+    
+    zone_weights = {}
+    for item in string.split(","):
+        match = re.fullmatch(r"(\w+):(\d+(?:\.\d*)?|\.\d+)", item.strip())
+        if match is None:
+            raise Exception("Zone weight {} is not valid".format(item))
+        
+        zone_weights[match.group(1)] = float(match.group(2))
+    
+    return zone_weights
+
+def find_fuzzy_terms(trigram_index, inverted_index, term, max_distance):
+    # Finds the variants of a term: the terms of the index within an edit
+    # distance of it, other than the term itself. Terms of fewer than three
+    # characters have no variants, and terms of fewer than eight have
+    # variants at most one edit away, as most short terms are a few edits
+    # from many others. The variants of a term restricted to a zone are restricted to
+    # the same zone. The nearest variants, and the most frequent of those at
+    # equal distances, are kept
+    # params:
+    # - trigram_index: a TrigramIndex object
+    # - inverted_index: an InvertedIndex object
+    # - term: a string
+    # - max_distance: an int
+    # returns:
+    # - variants: a dictionary pairing each variant with its weight
+    
+    zone, _, word = term.rpartition(zone_separator)
+    
+    if len(word) < 3:
+        return {}
+    if len(word) < 8:
+        max_distance = min(max_distance, 1)
+    
+    matches = []
+    for variant, distance in trigram_index.find_terms(word, max_distance):
+        if zone:
+            variant = get_zone_term(zone, variant)
+        
+        df = inverted_index.get_df(variant)
+        if distance and df:
+            matches.append([variant, distance, df])
+    
+    matches.sort(key=lambda match: (match[1], -match[2], match[0]))
+    
+    return {variant: fuzzy_penalty ** distance for variant, distance, _ in matches[:fuzzy_expansions]}
+
+def expand_keywords(keywords, phrases, find_variants):
+    # Finds the variants of each keyword in a query that are not already
+    # terms of the query. A variant of several keywords takes its highest
+    # weight
+    # params:
+    # - keywords: a list of strings
+    # - phrases: a list of lists of strings
+    # - find_variants: a function, in the form accepted by run_query
+    # returns:
+    # - expansions: a dictionary pairing each variant with its weight
+    
+    query_terms = set(keywords)
+    for phrase in phrases:
+        query_terms.update(phrase)
+    
+    expansions = {}
+    for keyword in keywords:
+        for variant, weight in find_variants(keyword).items():
+            if variant not in query_terms:
+                expansions[variant] = max(weight, expansions.get(variant, 0))
+    
+    return expansions
+
+def expand_boolean_query(query_node, find_variants):
+    # Replaces each keyword in a query tree that has variants with the OR of
+    # the keyword and its variants, so that a document holding any of them
+    # satisfies the keyword. The variants of negated keywords are excluded
+    # along with their keywords, but are not scored
+    # params:
+    # - query_node: a QueryNode object
+    # - find_variants: a function, in the form accepted by run_query
+    # returns:
+    # - expansions: a dictionary pairing the variant of each keyword that is
+    #   not negated with its weight
+    
+    # find the variants of each keyword once, however often it appears
+    found = {}
+    def find_cached_variants(term):
+        if term not in found:
+            found[term] = find_variants(term)
+        return found[term]
+    
+    keywords, phrases = query_node.get_positive_leaves()
+    expansions = expand_keywords(keywords, phrases, find_cached_variants)
+    
+    expand_query_node(query_node, find_cached_variants)
+    
+    return expansions
+
+def expand_query_node(query_node, find_variants):
+    # Replaces each keyword beneath a query node that has variants with the
+    # OR of the keyword and its variants
+    # params:
+    # - query_node: a QueryNode object
+    # - find_variants: a function, in the form accepted by run_query
+    # returns: None
+    
+    if query_node.get_type() == QueryNode.phrase:
+        return
+    
+    if query_node.get_type() == QueryNode.keyword:
+        variants = find_variants(query_node.get_terms()[0]) if query_node.get_terms() else {}
+        if variants:
+            query_node.children = [QueryNode(QueryNode.keyword, [term]) for term in query_node.get_terms() + sorted(variants)]
+            query_node.node_type = QueryNode.or_op
+            query_node.terms = []
+        return
+    
+    for child in query_node.get_children():
+        expand_query_node(child, find_variants)
+        
+def evaluate_query(inverted_index, document_index, keywords, phrases, k, budget=None, filtered=None, trace=None, zone_weights=None, expansions=None):
+    # This function evaluates pre-parsed keyword and phrase queries,
+    # returning a set of document IDs that match them
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - keywords: a list of strings
+    # - phrases: a list of lists of strings
+    # - k: an int
+    # - budget: a QueryBudget object, or None for an unlimited query
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - trace: a QueryTrace object recording each step, or None
+    # - zone_weights: a dictionary of zone-weight pairings, or None
+    # - expansions: a dictionary pairing the variants of keywords with their
+    #   weights, or None
+    # returns:
+    # - pool_size: an int
+    # - nonzero_scores: an int
+    # - highest_docs: a sorted list of [document_id, score] pairings
+    
+    # create a pool of documents
+    pool = get_query_pool(inverted_index, document_index, keywords, phrases, budget, filtered, trace)
+    
+    # score each document in the pool against the query
+    scored_docs = score_docs(inverted_index, document_index, keywords, phrases, pool, budget, trace, zone_weights, expansions)
+    
+    # find the k highest scores
+    highest_docs = find_highest_docs(scored_docs, k, trace)
+    
+    return len(pool), len(scored_docs), highest_docs
+
+def evaluate_boolean_query(inverted_index, document_index, query_node, k, budget=None, filtered=None, trace=None, zone_weights=None, expansions=None):
+    # This function evaluates a pre-parsed boolean query. The documents that
+    # satisfy the query are found first, and only those documents are scored
+    # against the keywords and phrases that are not negated. The budget only
+    # limits scoring: the pool is always found in full, since cutting it
+    # short could admit documents that a NOT operator excludes
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - query_node: a QueryNode object
+    # - k: an int
+    # - budget: a QueryBudget object, or None for an unlimited query
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - trace: a QueryTrace object recording each step, or None
+    # - zone_weights: a dictionary of zone-weight pairings, or None
+    # - expansions: a dictionary pairing the variants of keywords with their
+    #   weights, or None
+    # returns:
+    # - pool_size: an int
+    # - nonzero_scores: an int
+    # - highest_docs: a sorted list of [document_id, score] pairings
+    
+    # create a pool of documents that satisfy the query
+    pool = get_boolean_query_pool(inverted_index, document_index, query_node, filtered, trace)
+    
+    # score each document in the pool against the query
+    keywords, phrases = query_node.get_positive_leaves()
+    scored_docs = score_docs(inverted_index, document_index, keywords, phrases, pool, budget, trace, zone_weights, expansions)
+    
+    # find the k highest scores
+    highest_docs = find_highest_docs(scored_docs, k, trace)
+    
+    return len(pool), len(scored_docs), highest_docs
+
+def get_query_pool(inverted_index, document_index, keywords, phrases, budget=None, filtered=None, trace=None):
+    # This function returns the pool of documents that are scored against
+    # pre-parsed keyword and phrase queries: the documents containing any of
+    # the phrases, or every document if there are no phrases. A filtered
+    # query's pool only holds documents that pass the filters
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - keywords: a list of strings
+    # - phrases: a list of lists of strings
+    # - budget: a QueryBudget object, or None for an unlimited query
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - trace: a QueryTrace object recording each step, or None
+    # returns:
+    # - pool: a list of document IDs
+    
+    # validate that there is at least one keyword or phrase
+    if not keywords and not phrases:
+        raise Exception("Query must contain at least one valid keyword")
+    
+    if phrases:
+        if trace is not None:
+            trace.begin("pool")
+        
+        pool = get_docs_with_phrase(inverted_index, phrases, budget, trace)
+        if filtered is not None:
+            pool = intersect_lists(filtered, sorted(pool))
+        
+        if trace is not None:
+            trace.end(len(pool))
+        
+        return pool
+    
+    if filtered is not None:
+        return filtered
+    
+    return document_index.get_document_ids()
+
+def get_boolean_query_pool(inverted_index, document_index, query_node, filtered=None, trace=None):
+    # This function returns the sorted IDs of the documents that satisfy a
+    # pre-parsed boolean query, by compiling the query into an execution
+    # plan and executing it. A filtered query's plan is only executed
+    # against the documents that pass the filters
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - query_node: a QueryNode object
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - trace: a QueryTrace object recording each node executed, or None
+    # returns:
+    # - pool: a sorted list of document IDs
+    
+    planner = QueryPlanner(inverted_index, document_index, get_docs_with_phrase, trace)
+    plan = planner.create_plan(query_node)
+    
+    if trace is None:
+        return planner.execute_plan(plan, filtered)
+    
+    trace.begin("pool", plan=str(plan))
+    pool = planner.execute_plan(plan, filtered)
+    trace.end(len(pool))
+    
+    return pool
+
+def score_query(inverted_index, document_index, lexicon, query, filtered=None, zone_weights=None):
+    # This function parses, normalizes, and scores a query string, returning
+    # the score of every document in its pool rather than the k highest
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - lexicon: a Lexicon object
+    # - query: a string
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - zone_weights: a dictionary of zone-weight pairings, or None
+    # returns:
+    # - pool_size: an int
+    # - scored_docs: a dictionary of document_id-score pairings
+    
+    if is_boolean_query(query):
+        query_node = parse_boolean_query(query)
+        normalize_boolean_query(query_node, lexicon)
+        
+        pool = get_boolean_query_pool(inverted_index, document_index, query_node, filtered)
+        keywords, phrases = query_node.get_positive_leaves()
+    else:
+        keywords, phrases = parse_query(query)
+        keywords, phrases = normalize_query(keywords, phrases, lexicon)
+        
+        pool = get_query_pool(inverted_index, document_index, keywords, phrases, None, filtered)
+    
+    return len(pool), score_docs(inverted_index, document_index, keywords, phrases, pool, zone_weights=zone_weights)
+
+def rank_docs(scored_docs, document_index):
+    # This function ranks every scored document, from the highest to the
+    # lowest score, breaking ties by external document ID
+    # params:
+    # - scored_docs: a dictionary of document_id-score pairings
+    # - document_index: a DocumentIndex object
+    # returns:
+    # - ranking: a list of [document_id, score] pairings
+    
+    ranking = [[document_id, score] for document_id, score in scored_docs.items()]
+    ranking.sort(key=lambda pairing: (-pairing[1], document_index.get_external_id(pairing[0])))
+    
+    return ranking
+
+def find_page_after(document_index, scored_docs, k, score, external_id):
+    # This function returns the k documents ranked directly after a document
+    # of some score, in the order of rank_docs, without ranking every
+    # document. The documents ranked after it are passed through a min heap
+    # of size k, and only those scoring at least the lowest score left in
+    # the heap are sorted, so that ties at that score are broken by ID
+    # params:
+    # - document_index: a DocumentIndex object
+    # - scored_docs: a dictionary of document_id-score pairings
+    # - k: an int
+    # - score: a float
+    # - external_id: the external ID of the document
+    # returns:
+    # - page: a list of [document_id, score] pairings, from the highest to
+    #   the lowest score
+    # - remaining: an int, the number of documents ranked after the document
+    
+    def is_ranked_after(document_id, document_score):
+        if document_score != score:
+            return document_score < score
+        return document_index.get_external_id(document_id) > external_id
+    
+    min_heap = MinHeap(k)
+    remaining = 0
+    for document_id, document_score in scored_docs.items():
+        if not is_ranked_after(document_id, document_score):
+            continue
+        
+        remaining += 1
+        root_score, _ = min_heap.get_min()
+        if document_score > root_score or min_heap.get_size() < k:
+            min_heap.insert(document_score, document_id)
+    
+    if remaining == 0:
+        return [], 0
+    
+    lowest_score, _ = min_heap.get_min()
+    
+    page = [
+        [document_id, document_score] for document_id, document_score in scored_docs.items()
+        if document_score >= lowest_score and is_ranked_after(document_id, document_score)
+    ]
+    page.sort(key=lambda pairing: (-pairing[1], document_index.get_external_id(pairing[0])))
+    
+    return page[:k], remaining
+
+def get_query_matches(inverted_index, document_index, lexicon, query, filtered=None, limit=None):
+    # This function parses and normalizes a query string, and finds the
+    # documents matching it without scoring them: the documents satisfying a
+    # boolean query, the documents containing any phrase of a query holding
+    # phrases, or otherwise the documents containing any keyword. When a
+    # limit is supplied, matching stops once that many documents are found
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - lexicon: a Lexicon object
+    # - query: a string
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - limit: an int, or None to find every match
+    # returns:
+    # - matches: a list of document IDs
+    
+    if is_boolean_query(query):
+        query_node = parse_boolean_query(query)
+        normalize_boolean_query(query_node, lexicon)
+        
+        return get_boolean_query_pool(inverted_index, document_index, query_node, filtered)[:limit]
+    
+    keywords, phrases = parse_query(query)
+    keywords, phrases = normalize_query(keywords, phrases, lexicon)
+    
+    if not keywords and not phrases:
+        raise Exception("Query must contain at least one valid keyword")
+    
+    if phrases:
+        # a filtered query can not stop at the first phrase match, which
+        # may not pass the filters
+        matches = get_docs_with_phrase(inverted_index, phrases, limit=limit if filtered is None else None)
+        if filtered is not None:
+            matches = intersect_lists(filtered, sorted(matches))
+        return matches[:limit]
+    
+    return get_docs_with_any_term(inverted_index, keywords, filtered, limit)
+
+def get_docs_with_any_term(inverted_index, terms, filtered=None, limit=None):
+    # returns the IDs of the documents containing any of a set of terms.
+    # The bitmaps of terms stored as bitmaps are united a machine word at a
+    # time. When a limit is supplied, the most common terms are searched
+    # first, stopping once that many documents are found
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - terms: a list of strings
+    # - filtered: a sorted list of the only document IDs that may match, or
+    #   None if the query is not filtered
+    # - limit: an int, or None to find every document
+    # returns:
+    # - document_ids: a sorted list of document IDs
+    
+    terms = [term for term in set(terms) if inverted_index.get_df(term)]
+    
+    if limit is not None:
+        matches = []
+        for term in sorted(terms, key=inverted_index.get_df, reverse=True):
+            if filtered is None:
+                document_ids = inverted_index.get_document_ids(term)
+            elif inverted_index.is_dense(term):
+                document_ids = intersect_bitmap_list(inverted_index.get_bitmap(term), filtered)
+            else:
+                document_ids = intersect_list_mlist(filtered, inverted_index.get_postings(term))
+            
+            matches = union_lists(matches, document_ids[:limit])
+            if len(matches) >= limit:
+                return matches[:limit]
+        
+        return matches
+    
+    bitmap = 0
+    document_ids = set()
+    for term in terms:
+        if inverted_index.is_dense(term):
+            bitmap |= inverted_index.get_bitmap(term)
+        else:
+            document_ids.update(inverted_index.get_document_ids(term))
+    
+    document_ids = sorted(document_ids)
+    if bitmap:
+        document_ids = bitmap_to_list(union_bitmap_list(bitmap, document_ids))
+    
+    if filtered is not None:
+        document_ids = intersect_lists(filtered, document_ids)
+    
+    return document_ids
+
+def prepare_query(inverted_index, document_index, lexicon, query):
+    # This function parses and normalizes a query string, and finds the pool
+    # of documents that may match it. A query constrains its pool when it
+    # holds phrases or boolean operators; otherwise every document is in it
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - lexicon: a Lexicon object
+    # - query: a string
+    # returns:
+    # - keywords: a list of strings
+    # - phrases: a list of lists of strings
+    # - pool: a list of document IDs
+    # - constrained: a bool
+    
+    if is_boolean_query(query):
+        query_node = parse_boolean_query(query)
+        normalize_boolean_query(query_node, lexicon)
+        
+        keywords, phrases = query_node.get_positive_leaves()
+        pool = get_boolean_query_pool(inverted_index, document_index, query_node)
+        
+        return keywords, phrases, pool, True
+    
+    keywords, phrases = parse_query(query)
+    keywords, phrases = normalize_query(keywords, phrases, lexicon)
+    
+    pool = get_query_pool(inverted_index, document_index, keywords, phrases)
+    
+    return keywords, phrases, pool, bool(phrases)
+
+def get_docs_with_phrase(inverted_index, phrases, budget=None, trace=None, limit=None):
+    # returns a list of IDs for documents that contain any number of phrases.
+    # If the budget runs out, or a limit is supplied and that many documents
+    # are found, the documents found so far are returned. Phrases holding
+    # the rarest terms are matched first, since they are the cheapest to
+    # match
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - phrases: a list of lists of strings
+    # - budget: a QueryBudget object, or None for an unlimited query
+    # - trace: a QueryTrace object recording each phrase matched, or None
+    # - limit: an int, or None to find every document
+    # returns:
+    # - document_ids: a list of strings
+    
+    phrases = sorted(phrases, key=lambda phrase: min(inverted_index.get_df(term) for term in phrase))
+    
+    document_ids = set()
+    steps = 0
+    for phrase in phrases:
+        if budget is not None and budget.is_exhausted():
+            break
+        
+        if limit is not None and len(document_ids) >= limit:
+            break
+        
+        # create a list of postings lists that contain each keyword
+        
+        # e.g. query ":who is you:" on dr seuss lines
+        # all_postings = [
+        #    [[2, 1, [14]]]
+        #    [[0, 1, [10]], [2, 3, [5, 10, 15]]]
+        #    [[0, 1, [3]], [2, 5, [1, 3, 16, 19, 23]], [4, 3, [2, 5, 17]]]
+        # ]
+        # all_postings_pointers = [
+        #    0
+        #    0
+        #    0
+        # ]
+        
+        if trace is not None:
+            trace.begin("match", " ".join(phrase), df=[inverted_index.get_df(keyword) for keyword in phrase])
+            matched = len(document_ids)
+        
+        # a phrase containing an unknown term can not match any document
+        if not all(inverted_index.get_df(keyword) for keyword in phrase):
+            if trace is not None:
+                trace.end(0)
+            continue
+        
+        # when some terms are stored as bitmaps, find the documents holding
+        # every term with word-parallel operations, and only match positions
+        # within those documents
+        candidates = None
+        if any(inverted_index.is_dense(keyword) for keyword in phrase):
+            candidates = get_docs_with_terms(inverted_index, phrase)
+            if not candidates:
+                if trace is not None:
+                    trace.end(0, candidates=0)
+                continue
+        
+        all_postings = []
+        all_postings_pointers = []
+        
+        for keyword in phrase:
+            if candidates is None:
+                postings = inverted_index.get_positional_postings(keyword)
+            else:
+                postings = inverted_index.select_positional_postings(keyword, candidates)
+            
+            all_postings.append(postings)
+            all_postings_pointers.append(0)
+            
+        # advance each pointer in the list of postings list until
+        # all pointers match a single document_id
+        
+        # all_postings = [
+        #    [[2, 1, [14]]]
+        #      ^
+        #    [[0, 1, [10]], [2, 3, [5, 10, 15]]]
+        #                    ^
+        #    [[0, 1, [3]], [2, 5, [1, 3, 16, 19, 23]], [4, 3, [2, 5, 17]]]
+        #                   ^
+        # ]
+        # all_postings_pointers = [
+        #    0
+        #    1
+        #    1
+        # ]
+        
+        max_id = -1
+        match = 0
+        i = 0
+        exhausted = False
+        while not exhausted:
+            # check the budget every so often
+            steps += 1
+            if budget is not None and steps % QueryBudget.check_interval == 0:
+                budget.charge(postings=QueryBudget.check_interval)
+                if budget.is_exhausted():
+                    break
+            
+            i = (i + 1) % len(all_postings)
+            while all_postings[i][all_postings_pointers[i]][0] < max_id:
+                all_postings_pointers[i] += 1
+                if all_postings_pointers[i] >= len(all_postings[i]):
+                    exhausted = True
+                    break
+                
+            if exhausted:
+                break
+            
+            if all_postings[i][all_postings_pointers[i]][0] == max_id:
+                match += 1
+            else:
+                max_id = all_postings[i][all_postings_pointers[i]][0]
+                match = 1
+                
+            if match == len(all_postings):
+                # a matching document_id has been found!
+                match = 0
+                max_id += 1
+                
+                # create a list of positions for a specific document_id and keyword
+                
+                # all_positions = [
+                #    [14]
+                #    [5, 10, 15]
+                #    [1, 3, 16, 19, 23]
+                # ]
+                # all_positions_pointers = [
+                #    0
+                #    0
+                #    0
+                # ]
+                # document_id = 2
+                
+                all_positions = []
+                all_positions_pointers = []
+                
+                for j in range(len(all_postings)):
+                    positions = all_postings[j][all_postings_pointers[j]][2]
+                    
+                    all_positions.append(positions)
+                    all_positions_pointers.append(0)            
+                
+                document_id = all_postings[j][all_postings_pointers[j]][0]
+                
+                # advance each pointer in the list of positions lists until
+                # each points to an increasing number
+                
+                # all_positions = [
+                #    [14]
+                #     ^
+                #    [5, 10, 15]
+                #            ^
+                #    [1, 3, 16, 19, 23]
+                #           ^
+                # ]
+                # all_positions_pointers = [
+                #    0
+                #    2
+                #    2
+                # ]
+                base_num = -1
+                j = 0
+                match_2 = 0
+                exhausted_2 = False
+                while not exhausted_2:
+                    j = (j + 1) % len(all_postings)
+                    while all_positions[j][all_positions_pointers[j]] < base_num + j:
+                        all_positions_pointers[j] += 1
+                        if all_positions_pointers[j] >= len(all_positions[j]):
+                            exhausted_2 = True
+                            break
+                        
+                    if exhausted_2:
+                        break
+                    
+                    if all_positions[j][all_positions_pointers[j]] == base_num + j:
+                        match_2 += 1
+                    else:
+                        base_num = all_positions[j][all_positions_pointers[j]] - j
+                        match_2 = 1
+                        
+                    if match_2 == len(all_postings):
+                        # phrase has been found!
+                        match_2 = 0
+                        base_num += 1
+                        
+                        document_ids.add(document_id)
+                        
+                        if limit is not None and len(document_ids) >= limit:
+                            exhausted = True
+                        
+                        # later occurrences in the document add nothing
+                        break
+        
+        if trace is not None:
+            trace.end(
+                len(document_ids) - matched,
+                candidates=len(candidates) if candidates is not None else "all",
+                postings=sum(len(postings) for postings in all_postings)
+            )
+                        
+    return list(document_ids)
+
+    
+def get_docs_with_terms(inverted_index, terms):
+    # returns the sorted IDs of the documents containing every one of a set
+    # of terms. The bitmaps of terms stored as bitmaps are intersected a
+    # machine word at a time, and the documents of the rarest term stored as
+    # a list are then probed in the result
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - terms: a list of strings
+    # returns:
+    # - document_ids: a sorted list of document IDs
+    
+    bitmap = None
+    document_ids = None
+    
+    for term in sorted(set(terms), key=inverted_index.get_df):
+        if inverted_index.is_dense(term):
+            term_bitmap = inverted_index.get_bitmap(term)
+            bitmap = term_bitmap if bitmap is None else bitmap & term_bitmap
+        elif document_ids is None:
+            document_ids = inverted_index.get_document_ids(term)
+        else:
+            document_ids = intersect_list_mlist(document_ids, inverted_index.get_postings(term))
+    
+    if bitmap is None:
+        return document_ids or []
+    
+    if document_ids is None:
+        return bitmap_to_list(bitmap)
+    
+    return intersect_bitmap_list(bitmap, document_ids)
+
+def score_docs(inverted_index, document_index, keywords, phrases, doc_pool, budget=None, trace=None, zone_weights=None, expansions=None):
+    # scores a set of documents agains a query vector following
+    # algorithm 7.1 from the information retreival textbook. Terms are
+    # scored from the highest to the lowest idf, so that if the budget runs
+    # out, the scores hold the contributions of the most selective terms.
+    # When zones are weighted, each term is also scored against the
+    # postings of each weighted zone, and that score, multiplied by the
+    # zone's weight, is added to the document's score. The variants of
+    # keywords are scored as terms of the query with lower weights
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_index: an DocumentIndex object
+    # - keywords: a list of strings
+    # - phrases: a list of lists of strings
+    # - doc_pool: a list of document IDs
+    # - budget: a QueryBudget object, or None for an unlimited query
+    # - trace: a QueryTrace object recording the postings scored for each
+    #   term, or None
+    # - zone_weights: a dictionary of zone-weight pairings, or None
+    # - expansions: a dictionary pairing the variants of keywords with their
+    #   weights, or None
+    # returns:
+    # - scored_docs: a dictionary of document_id-score pairings
+    
+    # find the set of unique terms in the query, and the weight of each.
+    # TF does not matter
+    query_terms = {}
+    for keyword in keywords:
+        query_terms[keyword] = 1
+    for phrase in phrases:
+        for term in phrase:
+            query_terms[term] = 1
+    
+    # add the variants of keywords, which a boolean query's keywords
+    # already hold at full weight
+    if expansions:
+        query_terms.update(expansions)
+    
+    # add the terms of each weighted zone
+    if zone_weights:
+        for term in list(query_terms):
+            if is_zone_term(term):
+                continue
+            
+            for zone, weight in zone_weights.items():
+                if weight:
+                    zone_term = get_zone_term(zone, term)
+                    query_terms[zone_term] = query_terms.get(zone_term, 0) + weight * query_terms[term]
+    
+    # initialize a dictionary to store document scores
+    doc_score = {}
+    for doc in doc_pool:
+        doc_score[doc] = 0
+    
+    # the pool in document ID order, sorted when first needed
+    sorted_pool = None
+        
+    # score each term in the query
+    N = document_index.get_size()
+    
+    # the first chunk of postings is always scored, so that a query whose
+    # budget ran out before scoring began still returns results
+    progressed = False
+    
+    if trace is not None:
+        trace.begin("score", pool=len(doc_score))
+    
+    for term in sorted(query_terms, key=lambda term: (inverted_index.get_df(term), term)):
+        if progressed and budget.is_exhausted():
+            break
+        
+        # fetch df from inverted index
+        df = inverted_index.get_df(term)
+        
+        # ignore term that dont belong to any documents
+        if not df:
+            continue
+        
+        if trace is not None:
+            trace.begin("term", term, df=df)
+            walked = 0
+            matched = 0
+        
+        # calculate query term weight
+        query_term_weight = get_query_term_weight(N, df) * query_terms[term]
+        
+        # calculate partial document term weight
+        doc_df_weight = get_doc_df_weight(N, df)
+        
+        # probe the postings list for each document in the pool when the
+        # pool is small, rather than scanning the whole postings list
+        if len(doc_score) * 8 < df:
+            if sorted_pool is None:
+                sorted_pool = sorted(doc_score)
+            postings = inverted_index.select_postings(term, sorted_pool)
+            if not postings:
+                if trace is not None:
+                    trace.end(0, postings=0)
+                continue
+        else:
+            postings = inverted_index.get_postings(term)
+        
+        # without a budget, the whole postings list is scored at once
+        chunk_size = len(postings)
+        if budget is not None:
+            chunk_size = QueryBudget.check_interval
+        
+        for start in range(0, len(postings), chunk_size):
+            if progressed and budget.is_exhausted():
+                break
+            
+            scored = 0
+            for posting in postings[start:start + chunk_size]:
+                document_id = posting[0]
+                tf = posting[1]
+                
+                if document_id in doc_score:
+                    # calculate document term weight
+                    max_tf = document_index.get_max_tf(document_id)
+                    doc_tf_weight = get_doc_tf_weight(tf, max_tf)
+                    doc_term_weight = doc_tf_weight * doc_df_weight
+                    
+                    # score the doc & query term
+                    doc_score[document_id] += query_term_weight * doc_term_weight
+                    scored += 1
+            
+            if budget is not None:
+                budget.charge(postings=min(chunk_size, len(postings) - start), documents=scored)
+                progressed = True
+            
+            if trace is not None:
+                walked += min(chunk_size, len(postings) - start)
+                matched += scored
+        
+        if trace is not None:
+            trace.end(matched, postings=walked)
+                
+    # cosine-normalize scores
+    scored_docs = {}
+    for document_id in doc_score.keys():
+        if doc_score[document_id]:
+            scored_docs[document_id] = doc_score[document_id] / document_index.get_length(document_id)
+    
+    if trace is not None:
+        trace.end(len(scored_docs), partial=budget is not None and budget.is_partial())
+    
+    return scored_docs
+    
+def find_highest_docs(document_ids, k, trace=None):
+    # params:
+    # - document_ids: a dictionary of document_id-score pairings
+    # - k: an int
+    # - trace: a QueryTrace object, or None
+    # returns:
+    # - highest_docs: a sorted list of [document_id, score] pairings
+    
+    if trace is not None:
+        trace.begin("rank", k=k)
+    
+    min_heap = MinHeap(k)
+    
+    # insert any document into the heap whos score is less than the root node
+    for document_id, score in document_ids.items():
+        root_score, _ = min_heap.get_min()
+        if score > root_score or min_heap.get_size() < k:
+            min_heap.insert(score, document_id)
+            
+    
+    # remove all elements from heap
+    highest_docs = []
+    while min_heap.get_size() > 0:
+        score, document_id = min_heap.remove()
+        highest_docs.append([document_id, score])
+    
+    if trace is not None:
+        trace.end(len(highest_docs))
+    
+    return highest_docs
+    
+def get_term_positions(inverted_index, document_id, terms):
+    # returns the positions at which any of a set of terms occur in a
+    # document, reading only that document's positions of each term
+    # params:
+    # - inverted_index: an InvertedIndex object
+    # - document_id: a document ID
+    # - terms: a list of strings
+    # returns:
+    # - positions: a set of integers
+    
+    positions = set()
+    
+    # indexes built without positions have nothing to mark
+    if not inverted_index.has_positions():
+        return positions
+    
+    for term in set(terms):
+        positions.update(inverted_index.get_positions(term, document_id))
+    
+    return positions
+
+def fetch_documents(document_store, inverted_index, highest_docs, terms, filter_fields=()):
+    # fetches the zones of the highest scoring documents from the document
+    # store, and creates a snippet of each around the query terms from the
+    # zones that were indexed as text
+    # params:
+    # - document_store: a DocumentStore object
+    # - inverted_index: an InvertedIndex object
+    # - highest_docs: a list of [document_id, score] pairings
+    # - terms: a list of strings
+    # - filter_fields: a list of the names of zones that are not text
+    # returns:
+    # - documents: a dictionary pairing each document_id with a dictionary
+    #   holding its zones and snippet
+    
+    all_zones = document_store.get_documents([document_id for document_id, _ in highest_docs])
+    
+    documents = {}
+    for document_id, zones in all_zones.items():
+        positions = get_term_positions(inverted_index, document_id, terms)
+        
+        documents[document_id] = {
+            "zones": zones,
+            "snippet": create_snippet(join_zones({zone: value for zone, value in zones.items() if zone not in filter_fields}), positions)
+        }
+    
+    return documents
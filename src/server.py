@@ -0,0 +1,233 @@
+# This file holds functions that orchestrate the server.py program.
+# The program accepts an index directory and a port as input, and serves
+# queries against the index over HTTP until it is stopped. When setup.py
+# publishes a new generation of the index, the server loads it in the
+# background and swaps it in without interrupting queries. With the
+# --workers option, queries are served by several worker processes sharing
+# one loaded copy of the index. With the --slow-query-time option, queries
+# running for longer than the given number of seconds are written with their
+# plans to a slow query log. Metrics of the queries served, such as their
+# latencies, are exported at /metrics in the Prometheus text format. Each
+# generation is warmed up before it serves queries, optionally by replaying
+# the queries recorded in the file named by the --warmup-queries option, so
+# the port is only opened, and /ready only answered, once the index is warm.
+
+import sys
+import json
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from command_parser import CommandParser
+from index_reloader import IndexReloader
+from search_engine import SearchEngine, parse_zone_weights
+from warmup_helper import load_warmup_queries
+from worker_pool import WorkerPool
+from metrics import registry
+
+# the number of seconds between checks for a new index generation
+reload_interval = 5
+
+# the number of seconds a query may run for, unless the request sets its own
+# limit. Queries that run out of time return the best results found so far
+query_time_limit = 1.0
+
+request_errors = registry.counter(
+    "search_request_errors_total", "Requests answered with an error, by status",
+    "status", ["400", "404"]
+)
+
+def main():
+    # This is the entry point for execution of the server program.
+    # This function loads the index and serves queries against it based on
+    # command line input.
+
+    try:
+
+        # validate the command line arguments
+        parser = CommandParser(sys.argv)
+        workers = parser.pop_option("--workers")
+        slow_query_time = parser.pop_option("--slow-query-time")
+        slow_query_log = parser.pop_option("--slow-query-log", SearchEngine.slow_query_log)
+        warmup_file = parser.pop_option("--warmup-queries")
+        warmup = not parser.pop_flag("--no-warmup")
+        parser.validate_num_args(3)
+        parser.validate_dir_path(1)
+        parser.validate_int(2)
+
+        if slow_query_time is not None:
+            SearchEngine.slow_query_time = float(slow_query_time)
+            SearchEngine.slow_query_log = slow_query_log
+
+        warmup_queries = []
+        if warmup_file is not None:
+            warmup_queries = load_warmup_queries(warmup_file)
+
+        # load and warm up the indexes
+        reloader = IndexReloader(parser.get_arg(1), lambda directory, generation: load_search_engine(directory, generation, warmup, warmup_queries))
+        reloader.load()
+
+        if workers is not None:
+            if not workers.isdigit():
+                raise Exception("{} is not a valid number of workers".format(workers))
+
+            # serve from worker processes forked after the indexes are loaded
+            pool = WorkerPool(reloader, ("", int(parser.get_arg(2))), QueryRequestHandler, int(workers))
+
+            print("Serving index generation {} on port {} with {} workers".format(reloader.get_indexes()[0], parser.get_arg(2), workers))
+            pool.serve_forever(reload_interval)
+            return
+
+        # watch for new generations
+        reloader.start(reload_interval)
+
+        # serve queries until interrupted
+        server = ThreadingHTTPServer(("", int(parser.get_arg(2))), QueryRequestHandler)
+        server.reloader = reloader
+
+        print("Serving index generation {} on port {}".format(reloader.get_indexes()[0], parser.get_arg(2)))
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    except Exception as e:
+        print("\nAn error prevented the server from starting:\n" + str(e))
+        print("\nExample usage: python3 server.py indexes/ 8080")
+        print("Example usage: python3 server.py --workers=8 indexes/ 8080")
+        print("Example usage: python3 server.py --slow-query-time=0.25 --slow-query-log=slow.log indexes/ 8080")
+        print("Example usage: python3 server.py --warmup-queries=slow.log indexes/ 8080\n")
+
+def load_search_engine(directory, generation, warmup=True, queries=()):
+    # loads the indexes of a generation, and warms them up before they serve
+    # queries
+    # params:
+    # - directory: a string representing the index directory
+    # - generation: a string, the name of the generation, or None for an
+    #   index directory that was not built in generations
+    # - warmup: a bool, False to serve the indexes without warming them up
+    # - queries: a list of recorded queries replayed by the warm-up
+    # returns:
+    # - search_engine: a SearchEngine object
+
+    search_engine = SearchEngine(directory, generation)
+
+    if warmup:
+        stats = search_engine.warm_up(queries)
+        print("Warmed up index in {:.2f}s: prefetched {} bytes and replayed {} queries, {} of which failed".format(
+            stats["seconds"], stats["prefetched_bytes"], stats["queries"], stats["failed_queries"]
+        ))
+
+    return search_engine
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    # Answers requests of the form GET /search?q=[query]&k=[k] with a JSON
+    # object listing the highest scoring documents. Adding &documents=1 to
+    # the request includes the zones and a snippet of each document,
+    # &timeout=[seconds] sets the query's time limit, each &filter=[filter]
+    # restricts the query to documents matching the filter, &explain=1
+    # includes the plan the query was executed with,
+    # &zone_weights=[zone:weight,...] weights the matches within zones, and
+    # &fuzzy=[edits] also matches the terms within that many edits of each
+    # keyword.
+    # Adding &mode=count answers with the number of matching documents, and
+    # &mode=exists with whether any document matches, without scoring.
+    # Adding &mode=page returns a cursor with the results, and the next page
+    # is requested by /search?cursor=[cursor]&k=[k]. Requests of the form
+    # GET /metrics are answered with the server's metrics, and GET /ready
+    # with the generation being served, which has been warmed up
+
+    def do_GET(self):
+        # handles a single GET request
+        # params: None
+        # returns: None
+
+        url = urlparse(self.path)
+        if url.path not in ("/search", "/metrics", "/ready"):
+            request_errors.inc("404")
+            self.send_json(404, {"error": "Unknown path {}".format(url.path)})
+            return
+
+        # take one reference to the search engine for the length of the query
+        generation, search_engine = self.server.reloader.get_indexes()
+
+        if url.path == "/metrics":
+            self.send_text(200, search_engine.export_metrics())
+            return
+
+        if url.path == "/ready":
+            self.send_json(200, {"ready": True, "generation": generation})
+            return
+
+        try:
+            params = parse_qs(url.query)
+            query = params.get("q", [""])[0]
+            k = params.get("k", ["10"])[0]
+            documents = params.get("documents", ["0"])[0] == "1"
+            time_limit = float(params.get("timeout", [query_time_limit])[0])
+            filters = params.get("filter")
+            explain = params.get("explain", ["0"])[0] == "1"
+            cursor = params.get("cursor", [None])[0]
+            mode = params.get("mode", ["page" if cursor is not None else "search"])[0]
+            zone_weights = params.get("zone_weights", [None])[0]
+            if zone_weights is not None:
+                zone_weights = parse_zone_weights(zone_weights)
+            fuzzy = params.get("fuzzy", [None])[0]
+            if fuzzy is not None:
+                if not fuzzy.isdigit():
+                    raise Exception("{} is not a valid number of edits".format(fuzzy))
+                fuzzy = int(fuzzy)
+
+            if mode == "page":
+                CommandParser([k]).validate_int(0)
+                results = search_engine.search_page(query if cursor is None else None, int(k), cursor, documents, filters, zone_weights)
+            elif mode == "count":
+                results = search_engine.count(query, filters)
+            elif mode == "exists":
+                results = search_engine.exists(query, filters)
+            elif mode == "search":
+                CommandParser([k]).validate_int(0)
+                results = search_engine.search(query, int(k), documents, time_limit, filters=filters, explain=explain, zone_weights=zone_weights, fuzzy=fuzzy)
+            else:
+                raise Exception("Mode {} is not recognized".format(mode))
+
+        except Exception as e:
+            request_errors.inc("400")
+            self.send_json(400, {"error": str(e)})
+            return
+
+        results["generation"] = generation
+        self.send_json(200, results)
+
+    def send_json(self, status, body):
+        # writes a JSON response
+        # params:
+        # - status: an int
+        # - body: a JSON-serializable object
+        # returns: None
+
+        self.send_body(status, "application/json", json.dumps(body).encode("utf8"))
+
+    def send_text(self, status, text):
+        # writes a response in the Prometheus text format
+        # params:
+        # - status: an int
+        # - text: a string
+        # returns: None
+
+        self.send_body(status, "text/plain; version=0.0.4", text.encode("utf8"))
+
+    def send_body(self, status, content_type, data):
+        # writes a response
+        # params:
+        # - status: an int
+        # - content_type: a string
+        # - data: a bytes object
+        # returns: None
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,17 @@
 # This file holds functions that orchestrate the setup.py program.
 # The program accepts a json-formatted document collection as input
-# and creates an inverted index and document index from it.
+# and creates an inverted index and document index from it. The collection
+# may be split across a directory or glob of files, which may hold JSON
+# Lines and be compressed with gzip or zstd. Records that can not be read
+# are reported with their file and skipped.
 
+import os
 import sys
-import nltk
-import json
-import math
 from command_parser import CommandParser
-from document import Document
-from inverted_index import InvertedIndex
-from document_index import DocumentIndex
-from token_helper import *
+from index_builder import IndexBuilder
+
+# the number of errors printed for each input file
+max_errors_printed = 5
 
 def main():
     # This is the entry point for execution of the create_index program.
@@ -22,155 +23,93 @@ def main():
         
         # validate the command line arguments
         parser = CommandParser(sys.argv)
+        embedding_field = parser.pop_option("--embedding")
+        subvectors = parser.pop_option("--pq")
+        term_matrix = parser.pop_flag("--matrix")
+        positions = not parser.pop_flag("--no-positions")
+        filter_fields = parser.pop_option("--filter-fields")
+        reorder = parser.pop_flag("--reorder")
+        checkpoint = parser.pop_flag("--checkpoint")
+        resume = parser.pop_flag("--resume")
+        zones = parser.pop_option("--zones")
+        trigrams = parser.pop_flag("--trigrams")
+        workers = parser.pop_option("--workers")
         parser.validate_num_args(3)
-        parser.validate_file_path(1)
         parser.validate_dir_path(2)
         
-        # read in the document
-        documents = load_documents(parser.get_arg(1))
+        # read in the documents
+        if subvectors is not None and not subvectors.isdigit():
+            raise Exception("{} is not a valid number of subvectors".format(subvectors))
+        if workers is not None and (not workers.isdigit() or int(workers) == 0):
+            raise Exception("{} is not a valid number of workers".format(workers))
+        
+        index_builder = IndexBuilder(
+            embedding_field,
+            int(subvectors) if subvectors else None,
+            term_matrix,
+            positions,
+            filter_fields.split(",") if filter_fields else None,
+            reorder,
+            os.path.join(parser.get_arg(2), "checkpoint") if checkpoint or resume else None,
+            zones.split(",") if zones else None,
+            trigrams
+        )
+        report = index_builder.add_files(parser.get_arg(1), int(workers) if workers else None)
+        print_report(report)
+        
+        if not any(documents for _, documents, _ in report):
+            raise Exception("No documents could be read from {}".format(parser.get_arg(1)))
         
-        # tokenize and normalize the documents
-        preprocess_documents(documents)
+        # tokenize and normalize the documents, then create the inverted
+        # index and document index
+        index_builder.build(resume)
         
-        # create the inverted index and document index
-        inverted_index, document_index = create_indexes(documents)
+        if reorder:
+            input_size, size = index_builder.get_postings_sizes()
+            print("Reordered documents: postings take an estimated {} bytes, down from {} bytes in input order".format(size, input_size))
         
-        # save the inverted index
-        save_indexes(inverted_index, document_index, parser.get_arg(2))
+        # save the indexes into a new generation, then make it current
+        index_builder.save(parser.get_arg(2))
         
     except Exception as e:
         print("\nAn error prevented the creation of your index:\n" + str(e))
         print("\nPlease ensure your input JSON file is correctly formatted")
-        print("\nExample command: python3 setup.py data/input.json indexes/\n")
-    
-def load_documents(file):
-    # This function loads the contents of a json-formatted, UTF-8 encoded
-    # file into memory, storing the infromation as a list of Document
-    # objects. If any documents in the iinput file have the same IDs, the 
-    # function with throw an error
-    # params
-    # - file: name of the json-formatted file
-    # returns
-    # - documents: a list of Document objects
-    
-    documents = []
-    document_ids = set()
+        print("\nExample command: python3 setup.py data/input.json indexes/")
+        print("Example command: python3 setup.py --embedding=vector data/input.json indexes/")
+        print("Example command: python3 setup.py --embedding=vector --pq=16 data/input.json indexes/")
+        print("Example command: python3 setup.py --matrix data/input.json indexes/")
+        print("Example command: python3 setup.py --no-positions data/input.json indexes/")
+        print("Example command: python3 setup.py --filter-fields=lang,year data/input.json indexes/")
+        print("Example command: python3 setup.py --reorder data/input.json indexes/")
+        print("Example command: python3 setup.py --checkpoint data/input.json indexes/")
+        print("Example command: python3 setup.py --resume data/input.json indexes/")
+        print("Example command: python3 setup.py --zones=title data/input.json indexes/")
+        print("Example command: python3 setup.py --trigrams data/input.json indexes/")
+        print("Example command: python3 setup.py --workers=8 data/shards/ indexes/")
+        print("Example command: python3 setup.py \"data/shards/*.jsonl.gz\" indexes/\n")
 
-    # loads the contents of a UTF-8 file into memory
-    with open(file, "r", encoding='utf8', errors='backslashreplace') as json_file:
-        data = json.load(json_file)
-        for item in data:
-            document_id = None
-            
-            try:
-                document_id = item["document_id"]
-                document_id = int(document_id)
-            except:
-                raise Exception("Document does not contain document_id field")
-            
-            if document_id in document_ids:
-                raise Exception("Found duplicate doc ID {}".format(document_id))
-            
-            document_ids.add(document_id)
-            
-            if len(item) > 1:
-                all_data = ""
-                for zone, data in item.items():
-                    if zone != "document_id":
-                        all_data = all_data + " " + data
-                documents.append(Document(document_id, all_data))
-            else:
-                raise Exception("Document {} is missing zones".format(document_id))
+def print_report(report):
+    # prints the number of documents read from the input files, and the
+    # errors found in each file
+    # params:
+    # - report: a list of [file, documents, errors] triples
+    # returns: None
     
-    return documents
+    documents = sum(added for _, added, _ in report)
+    num_errors = sum(len(errors) for _, _, errors in report)
     
-def preprocess_documents(documents):
-    # This function converts all document data into a set of tokens, 
-    # then to a set of terms belonging to equivalnece classes.
-    # params:
-    # - documents: a list of Document objects
-    # returns:
-    # - documents: a list of Document objects
+    if len(report) > 1 or num_errors:
+        print("Read {} documents from {} files, with {} errors".format(documents, len(report), num_errors))
     
-    for document in documents:
-        data = document.get_data()
-        
-        tokens = tokenize_string(data)
-        terms = normalize_tokens(tokens)
+    for file, added, errors in report:
+        if not errors:
+            continue
         
-        for i in range(len(terms)):
-            document.add_term(terms[i], i)
-
-def create_indexes(documents):
-    # This function takes a set of documents which have already been tokenized,
-    # and creates an inverted index based on the tokens and the doc IDs in
-    # which they correspond
-    # params:
-    # - document: a list of Document objects
-    # returns:
-    # - dictionaries: a dict with zones as keys and Dictionary objects as values
-    # - postings: a dict with zones as keys and PostingLists objects as values
-
-    # created indexes
-    inverted_index = InvertedIndex()
-    document_index = DocumentIndex()
-
-    # populate inverted index
-    max_tfs = {}
-    for document in documents:
-
-        document_id = document.get_document_id()
-        terms = document.get_terms()
-        
-        max_tf = 0
-        
-        for term, positions in terms.items():
-            # add term to inverted index
-            tf = len(positions)
-            inverted_index.register_term(term, document_id, tf, positions)
-            
-            # update maximum document tf
-            if tf > max_tf:
-                max_tf = tf
-                
-        max_tfs[document_id] = max_tf
-        
-    # populate document index
-    N = len(documents)
-    for document in documents:
-        document_id = document.get_document_id()
-        terms = document.get_terms()
-        
-        max_tf = max_tfs[document_id]
-        cos_norm_squared = 0
-        
-        for term, positions in terms.items():
-            # calculate partial document term weight
-            df = inverted_index.get_df(term)
-            tf = len(positions)
-            doc_df_weight = max(0, math.log((N - df)/df, 10)) # prob idf
-            doc_tf_weight = 0.5 + ((0.5 * tf)/(max_tf)) # augmented tf
-            doc_term_weight = doc_tf_weight * doc_df_weight
-            
-            # sum the square of document weights
-            cos_norm_squared += doc_term_weight ** 2
-            
-        # recover the cosine normalization factor
-        cos_norm = math.sqrt(cos_norm_squared)
-        
-        document_index.register_document(document_id, max_tf, cos_norm)
-        
-    return inverted_index, document_index
-
-def save_indexes(inverted_index, document_index, directory):
-    # This function saves an inverted index and document index as a TSV file
-    # params:
-    # - inverted_index: InvertedIndex object
-    # - document_index: DocumentIndex object
-    # - directory: a string representing the directory to save the index
-    
-    inverted_index.save_TSV(directory + "/" + "inverted_index.tsv")
-    document_index.save_TSV(directory + "/" + "document_index.tsv")
+        print("{}: read {} documents, with {} errors".format(file, added, len(errors)))
+        for error in errors[:max_errors_printed]:
+            print("  " + error)
+        if len(errors) > max_errors_printed:
+            print("  and {} more".format(len(errors) - max_errors_printed))
 
 if __name__ == '__main__':
     main()
@@ -173,3 +173,111 @@ def union_mlists(list_a, list_b):
     
     return union
 
+    
+def difference_lists(list_a, list_b):
+    # returns a new sorted list containing the elements of list A that do
+    # not appear in list B (i.e. A - B)
+    # - list_a: a sorted list of strings
+    # - list_b: a sorted list of strings
+    # returns:
+    # - difference: a sorted list of strings
+    
+    i = 0
+    j = 0
+    
+    difference = []
+    
+    while i < len(list_a) and j < len(list_b):
+        if list_a[i] == list_b[j]:
+            i += 1
+            j += 1
+        elif list_a[i] < list_b[j]:
+            difference.append(list_a[i])
+            i += 1
+        else:
+            j += 1
+    
+    while i < len(list_a):
+        difference.append(list_a[i])
+        i += 1
+    
+    return difference
+    
+def search_mlist(key, sorted_mlist, low=0):
+    # returns the index of the first sub-list in a multidimensional list whose
+    # first element is greater than or equal to key, using a galloping search
+    # that begins at index low
+    # parameters:
+    # - key: an int
+    # - sorted_mlist: a list of lists, sorted by the first element of each list
+    # - low: an int
+    # returns:
+    # - index: an int
+    
+    # gallop forward until the key has been bracketed
+    step = 1
+    high = low
+    while high < len(sorted_mlist) and sorted_mlist[high][0] < key:
+        low = high + 1
+        high += step
+        step *= 2
+        
+    high = min(high, len(sorted_mlist))
+    
+    # binary search within the bracket
+    while low < high:
+        guess = (low + high) // 2
+        if sorted_mlist[guess][0] < key:
+            low = guess + 1
+        else:
+            high = guess
+            
+    return low
+    
+def intersect_list_mlist(list_a, mlist_b):
+    # returns a new sorted list containing the elements of list A that are
+    # the first element of some sub-list of B. Runs in time proportional to
+    # len(A) * log(len(B)), so is preferred when A is much shorter than B
+    # parameters:
+    # - list_a: a sorted list of ints
+    # - mlist_b: list of lists, sorted by the first element of each sub-list
+    # returns:
+    # - intersection: a sorted list of ints
+    
+    j = 0
+    
+    intersection = []
+    
+    for item in list_a:
+        j = search_mlist(item, mlist_b, j)
+        if j >= len(mlist_b):
+            break
+        if mlist_b[j][0] == item:
+            intersection.append(item)
+            j += 1
+            
+    return intersection
+
+def select_mlist(list_a, mlist_b):
+    # returns the sub-lists of B whose first element is in list A. Runs in
+    # time proportional to len(A) * log(len(B)), so is preferred when A is
+    # much shorter than B
+    # parameters:
+    # - list_a: a sorted list of ints
+    # - mlist_b: list of lists, sorted by the first element of each sub-list
+    # returns:
+    # - selection: a list of lists, sorted by the first element of each
+    
+    j = 0
+    
+    selection = []
+    
+    for item in list_a:
+        j = search_mlist(item, mlist_b, j)
+        if j >= len(mlist_b):
+            break
+        if mlist_b[j][0] == item:
+            selection.append(mlist_b[j])
+            j += 1
+            
+    return selection
@@ -0,0 +1,196 @@
+# The TermMatrix class represents the inverted index as a sparse
+# document-term matrix in compressed sparse row (CSR) form. Each entry holds
+# the weight of a term in a document, exactly as score_docs calculates it,
+# already divided by the document's cosine normalization factor. A batch of
+# keyword queries is then scored against every document by a single sparse
+# matrix product, rather than by walking the postings lists once per query.
+
+import numpy as np
+import scipy.sparse
+from weight_helper import *
+
+class TermMatrix:
+
+    # the number of queries scored by each sparse matrix product, which
+    # bounds the size of the intermediate score matrix
+    batch_size = 256
+
+    def __init__(self):
+        # initializes a new instance of the TermMatrix class
+        # params: None
+        # returns: None
+
+        # maps each term to its column, and each row to its document ID
+        self.terms = {}
+        self.document_ids = None
+
+        # the document-term matrix, and its transpose as a term-document
+        # matrix in CSR form, which is the form multiplied by queries
+        self.matrix = None
+        self.transpose = None
+
+    def build(self, inverted_index, document_index):
+        # builds the document-term matrix from an inverted index and
+        # document index
+        # params:
+        # - inverted_index: an InvertedIndex object
+        # - document_index: a DocumentIndex object
+        # returns: None
+
+        document_ids = sorted(document_index.get_document_ids())
+        rows = {document_id: row for row, document_id in enumerate(document_ids)}
+
+        N = document_index.get_size()
+
+        all_rows = []
+        all_columns = []
+        all_weights = []
+
+        for column, term in enumerate(sorted(inverted_index.entries)):
+            self.terms[term] = column
+
+            doc_df_weight = get_doc_df_weight(N, inverted_index.get_df(term))
+            if not doc_df_weight:
+                continue
+
+            for posting in inverted_index.get_postings(term):
+                document_id = posting[0]
+                tf = posting[1]
+
+                doc_tf_weight = get_doc_tf_weight(tf, document_index.get_max_tf(document_id))
+
+                all_rows.append(rows[document_id])
+                all_columns.append(column)
+                all_weights.append(doc_tf_weight * doc_df_weight / document_index.get_length(document_id))
+
+        self.document_ids = np.array(document_ids, dtype=np.int64)
+        self.matrix = scipy.sparse.csr_matrix(
+            (np.array(all_weights, dtype=np.float64), (all_rows, all_columns)),
+            shape=(len(document_ids), len(self.terms))
+        )
+        self.transpose = self.matrix.T.tocsr()
+
+    def get_shape(self):
+        # returns the number of documents and terms in the matrix
+        # params: None
+        # returns:
+        # - shape: a tuple of two ints
+
+        return self.matrix.shape
+
+    def create_query_matrix(self, queries, inverted_index, N):
+        # creates a query-term matrix holding the weight of each unique term
+        # of each query. Terms that are not in the index are ignored
+        # params:
+        # - queries: a list of lists of normalized terms
+        # - inverted_index: an InvertedIndex object
+        # - N: an int, the number of documents in the collection
+        # returns:
+        # - query_matrix: a CSR matrix with a row for each query
+
+        all_rows = []
+        all_columns = []
+        all_weights = []
+
+        for row, terms in enumerate(queries):
+            for term in set(terms):
+                if term not in self.terms:
+                    continue
+
+                all_rows.append(row)
+                all_columns.append(self.terms[term])
+                all_weights.append(get_query_term_weight(N, inverted_index.get_df(term)))
+
+        return scipy.sparse.csr_matrix(
+            (np.array(all_weights, dtype=np.float64), (all_rows, all_columns)),
+            shape=(len(queries), len(self.terms))
+        )
+
+    def score_queries(self, query_matrix, k, pools=None):
+        # scores every document against a batch of queries, returning the k
+        # highest scoring documents of each
+        # params:
+        # - query_matrix: a CSR matrix created by create_query_matrix
+        # - k: an int
+        # - pools: a list holding, for each query, a list of the document IDs
+        #   it is restricted to, or None if it is not restricted
+        # returns:
+        # - all_results: a list holding, for each query, the number of
+        #   documents with a non-zero score and a list of [document_id,
+        #   score] pairings from the lowest to the highest score
+
+        all_results = []
+
+        for start in range(0, query_matrix.shape[0], TermMatrix.batch_size):
+            scores = (query_matrix[start:start + TermMatrix.batch_size] @ self.transpose).tocsr()
+            scores.eliminate_zeros()
+
+            for i in range(scores.shape[0]):
+                row_rows = scores.indices[scores.indptr[i]:scores.indptr[i + 1]]
+                row_scores = scores.data[scores.indptr[i]:scores.indptr[i + 1]]
+
+                pool = pools[start + i] if pools is not None else None
+                if pool is not None:
+                    keep = np.isin(self.document_ids[row_rows], np.asarray(list(pool), dtype=np.int64))
+                    row_rows = row_rows[keep]
+                    row_scores = row_scores[keep]
+
+                all_results.append((len(row_scores), self.find_highest_rows(row_rows, row_scores, k)))
+
+        return all_results
+
+    def find_highest_rows(self, rows, scores, k):
+        # returns the documents with the k highest scores
+        # params:
+        # - rows: an array of matrix rows
+        # - scores: an array of floats
+        # - k: an int
+        # returns:
+        # - highest_docs: a list of [document_id, score] pairings, from the
+        #   lowest to the highest score
+
+        k = min(k, len(scores))
+        if not k:
+            return []
+
+        highest = np.argpartition(-scores, k - 1)[:k]
+        highest = highest[np.argsort(scores[highest], kind="stable")]
+
+        return [
+            [int(self.document_ids[rows[row]]), float(scores[row])]
+            for row in highest
+        ]
+
+    def save(self, filename):
+        # saves the TermMatrix instance as a NumPy file
+        # params:
+        # - filename: a string
+        # returns: None
+
+        terms = sorted(self.terms, key=self.terms.get)
+
+        np.savez(
+            filename,
+            indptr=self.matrix.indptr,
+            indices=self.matrix.indices,
+            data=self.matrix.data,
+            document_ids=self.document_ids,
+            terms=np.array(terms, dtype=str)
+        )
+
+    def load(self, filename):
+        # loads a TermMatrix instance from a NumPy file
+        # params:
+        # - filename: a string
+        # returns: None
+
+        with np.load(filename) as data:
+            terms = data["terms"]
+            self.terms = {str(term): column for column, term in enumerate(terms)}
+            self.document_ids = data["document_ids"]
+            self.matrix = scipy.sparse.csr_matrix(
+                (data["data"], data["indices"], data["indptr"]),
+                shape=(len(self.document_ids), len(terms))
+            )
+
+        self.transpose = self.matrix.T.tocsr()
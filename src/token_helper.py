@@ -1,9 +1,17 @@
 # This file contains methods that help the create-index.py and query.py
 # programs to tokenize strings and normalize tokens.
 
+# nltk is slow to import, so it is only imported once a string must be
+# tokenized or a token is missing from the supplied lexicon. This keeps the
+# startup time of the query.py program low.
+
 import re
-import nltk
-from nltk.tokenize import RegexpTokenizer
+
+porter = None
+
+# separates the zone from the term in the terms of zone postings, such as
+# title:swift. Tokens never hold a colon, so these never collide with terms
+zone_separator = ":"
 
 def tokenize_string(string):
     # Extracts a set of tokens from an input string.
@@ -16,17 +24,24 @@ def tokenize_string(string):
     string = re.sub(r"(\d),(\d)", r"\1\2", string)
     
     # get tokens from any series of connected letters, numbers, and apostrophes
+    from nltk.tokenize import RegexpTokenizer
     tokenizer = RegexpTokenizer(r"[\w'\u2019\u201A]+")
     tokens = tokenizer.tokenize(string)
     
     return tokens
 
-def normalize_tokens(tokens):
+def normalize_tokens(tokens, lexicon=None, register=False):
     # Normalizes a list of tokens using using case folding, contraction
     # expansion, and stemming. Removes any tokens from the final output
-    # could not otherwise be normalized.
+    # could not otherwise be normalized. When a lexicon is supplied, tokens
+    # found in the lexicon are not normalized again, and when registering,
+    # the terms of any other token are added to the lexicon. Only indexing
+    # registers tokens: queries are normalized against a lexicon shared by
+    # every query, which must not grow with the tokens of each query.
     # params:
     # - tokens: an list of strings
+    # - lexicon: a Lexicon object, or None
+    # - register: a bool, True to add unknown tokens to the lexicon
     # returns:
     # - terms: an list of strings
     
@@ -35,19 +50,39 @@ def normalize_tokens(tokens):
         # case fold
         token = token.casefold()
         
-        # expand contractions
-        tokens = expand_contractions(token)
+        # reuse the terms of known tokens
+        if lexicon is not None and lexicon.has_token(token):
+            terms.extend(lexicon.get_terms(token))
+            continue
+        
+        # expand contractions and stem words
+        token_terms = []
+        for expanded_token in expand_contractions(token):
+            token_terms.append(stem_token(expanded_token))
+        
+        if lexicon is not None and register:
+            lexicon.register_token(token, token_terms)
         
-        for token in tokens:
-            # stem words
-            porter = nltk.PorterStemmer()
-            term = porter.stem(token)
-            
-            # add to output
-            terms.append(term)
+        # add to output
+        terms.extend(token_terms)
         
     return terms
 
+def stem_token(token):
+    # Stems a token using the Porter stemmer, which is created the first
+    # time that it is needed
+    # params:
+    # - token: a string
+    # returns:
+    # - term: a string
+    
+    global porter
+    if porter is None:
+        import nltk
+        porter = nltk.PorterStemmer()
+    
+    return porter.stem(token)
+
 def expand_contractions(token):
     # Expands contractions in a token, returning a set of two tokens when
     # expansion is succesful
@@ -86,3 +121,88 @@ def expand_contractions(token):
     
     # return list of tokens
     return [t for t in token.split(" ") if t]
+
+def get_zone_term(zone, term):
+    # Returns the term under which the occurrences of a term within a zone
+    # are indexed
+    # params:
+    # - zone: a string
+    # - term: a string
+    # returns:
+    # - zone_term: a string
+    
+    return zone + zone_separator + term
+
+def is_zone_term(term):
+    # Returns true if a term is the term of a zone's postings
+    # params:
+    # - term: a string
+    # returns:
+    # - bool
+    
+    return zone_separator in term
+
+def join_zones(zones):
+    # Concatenates the values of a document's zones into the single string
+    # that is tokenized when the document is indexed
+    # params:
+    # - zones: a dictionary of zone names and string values
+    # returns:
+    # - data: a string
+    
+    data = ""
+    for zone, value in zones.items():
+        if zone != "document_id":
+            data = data + " " + value
+    
+    return data
+
+def create_snippet(string, positions, width=10):
+    # Creates a snippet of an indexed string around the first of a set of
+    # term positions, marking each term that belongs to the set. Positions
+    # are counted in terms, as they are in the inverted index, so a token
+    # that expands into two terms advances the position by two
+    # params:
+    # - string: a string, as it was tokenized when indexed
+    # - positions: a set of integers
+    # - width: an int, the number of tokens shown either side of the first
+    #   matching token
+    # returns:
+    # - snippet: a string
+    
+    # find each token, and the position of its first term, without nltk.
+    # commas within numbers are part of the token, as in tokenize_string
+    spans = []
+    position = 0
+    for match in re.finditer(r"(?:[\w'\u2019\u201A]|(?<=\d),(?=\d))+", string):
+        num_terms = len(expand_contractions(match.group().casefold()))
+        spans.append([match.start(), match.end(), range(position, position + num_terms)])
+        position += num_terms
+    
+    if not spans:
+        return ""
+    
+    # centre the snippet on the first matching token
+    marked = [i for i in range(len(spans)) if any(p in positions for p in spans[i][2])]
+    first = marked[0] if marked else 0
+    low = max(0, first - width)
+    high = min(len(spans), first + width + 1)
+    
+    snippet = ""
+    end = spans[low][0]
+    for i in range(low, high):
+        start, stop, _ = spans[i]
+        snippet += string[end:start]
+        if i in marked:
+            snippet += "<b>" + string[start:stop] + "</b>"
+        else:
+            snippet += string[start:stop]
+        end = stop
+    
+    snippet = " ".join(snippet.split())
+    if low > 0:
+        snippet = "... " + snippet
+    if high < len(spans):
+        snippet = snippet + " ..."
+    
+    return snippet
@@ -0,0 +1,210 @@
+# The TrigramIndex class indexes every term in the dictionary of an inverted
+# index by the character trigrams it holds, so that the terms within a small
+# edit distance of a misspelled term can be found without comparing it with
+# every term. Terms are padded with two "$" characters at either end, so
+# their first and last characters are part of three trigrams each. A term
+# within edit distance d of another shares all but at most 4d of its
+# trigrams, as an insertion, deletion, substitution or transposition changes
+# at most four, so only the terms sharing enough trigrams are compared.
+# Shorter terms share too few trigrams for the bound to guarantee a match
+# shares any at larger distances, so they are only searched within the
+# distance at which it still does.
+
+import sys
+from array import array
+from bisect import bisect_left
+from token_helper import is_zone_term
+
+class TrigramIndex:
+
+    padding = "$$"
+
+    def __init__(self):
+        # initializes a new instance of the TrigramIndex class
+        # params: None
+        # returns: None
+
+        # every term, in sorted order, and the IDs of the terms holding
+        # each trigram
+        self.terms = []
+        self.trigrams = {}
+
+    def build(self, terms):
+        # indexes a set of terms by their trigrams. The terms of zones are
+        # not indexed, as they repeat the terms of the text
+        # params:
+        # - terms: an iterable of strings
+        # returns: None
+
+        self.terms = sorted(term for term in terms if not is_zone_term(term))
+        self.trigrams = {}
+
+        for term_id, term in enumerate(self.terms):
+            for trigram in get_trigrams(term):
+                if trigram not in self.trigrams:
+                    self.trigrams[trigram] = array('I')
+                self.trigrams[trigram].append(term_id)
+
+    def get_size(self):
+        # returns the number of terms in the index
+        # returns:
+        # - size: an int
+
+        return len(self.terms)
+
+    def get_memory_size(self):
+        # estimates the bytes of memory used by the index
+        # returns:
+        # - size: an int
+
+        size = sys.getsizeof(self.terms) + sys.getsizeof(self.trigrams)
+        size += sum(sys.getsizeof(term) for term in self.terms)
+        for trigram, term_ids in self.trigrams.items():
+            size += sys.getsizeof(trigram) + sys.getsizeof(term_ids)
+
+        return size
+
+    def find_terms(self, term, max_distance):
+        # finds the terms within an edit distance of a term, counting the
+        # transposition of two adjacent characters as a single edit. The
+        # distance is lowered to the largest at which every match shares a
+        # trigram with the term: (t - 1) // 4 edits for a term of t distinct
+        # trigrams, such as a single edit for terms of three to six
+        # characters. The terms found are then every term within it
+        # params:
+        # - term: a string
+        # - max_distance: an int
+        # returns:
+        # - matches: a list of [term, distance] pairings, from the nearest
+        #   to the furthest, and in sorted order at equal distances
+
+        # the trigrams of the term from the fewest terms to the most
+        trigrams = sorted(get_trigrams(term), key=lambda trigram: (len(self.trigrams.get(trigram, ())), trigram))
+
+        # a match sharing no trigram can only be found by comparing every
+        # term, so the distance is capped where the bound allows none
+        max_distance = min(max_distance, (len(trigrams) - 1) // 4)
+        min_shared = len(trigrams) - 4 * max_distance
+
+        # a term sharing min_shared trigrams shares at least one of all but
+        # the min_shared - 1 most common trigrams, so only the terms holding
+        # the rarer trigrams are candidates. The terms holding the common
+        # trigrams are counted by searching their sorted IDs
+        rare = len(trigrams) - min_shared + 1
+
+        shared = {}
+        for trigram in trigrams[:rare]:
+            for term_id in self.trigrams.get(trigram, ()):
+                shared[term_id] = shared.get(term_id, 0) + 1
+
+        common = [self.trigrams.get(trigram, ()) for trigram in trigrams[rare:]]
+
+        matches = []
+        for term_id, count in shared.items():
+            candidate = self.terms[term_id]
+            if abs(len(candidate) - len(term)) > max_distance:
+                continue
+
+            for term_ids in common:
+                if count >= min_shared:
+                    break
+                position = bisect_left(term_ids, term_id)
+                if position < len(term_ids) and term_ids[position] == term_id:
+                    count += 1
+
+            if count < min_shared:
+                continue
+
+            distance = get_edit_distance(term, candidate, max_distance)
+            if distance <= max_distance:
+                matches.append([candidate, distance])
+
+        matches.sort(key=lambda match: (match[1], match[0]))
+
+        return matches
+
+    def save_TSV(self, filename):
+        # saves the TrigramIndex instance as a tab-seperated values file,
+        # holding the number of terms, each term, then each trigram with
+        # the IDs of its terms
+        # params:
+        # - filename: a string
+        # returns: None
+
+        with open(filename, 'w', encoding='utf8') as tsv_file:
+            tsv_file.write(str(len(self.terms)) + "\n")
+            for term in self.terms:
+                tsv_file.write(term + "\n")
+
+            for trigram in sorted(self.trigrams):
+                tsv_file.write(trigram + "\t" + " ".join(map(str, self.trigrams[trigram])) + "\n")
+
+    def load_TSV(self, filename):
+        # loads a TrigramIndex instance from a tab-seperated values file
+        # params:
+        # - filename: a string
+        # returns: None
+
+        with open(filename, "r", encoding='utf8', errors='backslashreplace') as tsv_file:
+            num_terms = int(tsv_file.readline())
+            self.terms = [tsv_file.readline().rstrip("\n") for _ in range(num_terms)]
+
+            self.trigrams = {}
+            for entry in tsv_file:
+                trigram, term_ids = entry.rstrip("\n").split("\t")
+                self.trigrams[trigram] = array('I', map(int, term_ids.split(" ")))
+
+def get_trigrams(term):
+    # returns the distinct trigrams of a term padded at either end
+    # params:
+    # - term: a string
+    # returns:
+    # - trigrams: a set of strings
+
+    padded = TrigramIndex.padding + term + TrigramIndex.padding
+
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def get_edit_distance(a, b, max_distance):
+    # returns the optimal string alignment distance between two strings:
+    # the number of insertions, deletions, substitutions, and transpositions
+    # of adjacent characters that turn one into the other. Only alignments
+    # within the maximum distance are followed, and once there are none,
+    # max_distance + 1 is returned
+    # params:
+    # - a: a string
+    # - b: a string
+    # - max_distance: an int
+    # returns:
+    # - distance: an int
+
+    limit = max_distance + 1
+    if abs(len(a) - len(b)) > max_distance:
+        return limit
+
+    # the distances between the prefixes of a, of the current length and
+    # the two before it, and each prefix of b. Prefixes further apart in
+    # length than the maximum distance are never closer than the limit
+    last_row = None
+    previous_row = [j if j <= max_distance else limit for j in range(len(b) + 1)]
+
+    for i in range(1, len(a) + 1):
+        row = [i if i <= max_distance else limit] + [limit] * len(b)
+
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            distance = min(
+                previous_row[j - 1] + (a[i - 1] != b[j - 1]),
+                previous_row[j] + 1,
+                row[j - 1] + 1
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                distance = min(distance, last_row[j - 2] + 1)
+
+            row[j] = min(distance, limit)
+
+        if min(row) == limit:
+            return limit
+
+        last_row, previous_row = previous_row, row
+
+    return previous_row[-1]
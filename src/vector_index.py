@@ -0,0 +1,384 @@
+# The VectorIndex class stores a dense embedding for each document as a
+# contiguous float32 matrix, and finds the documents whose embeddings are
+# nearest to a query embedding by cosine similarity. Search is either exact,
+# comparing the query with every row of the matrix, or approximate, using an
+# inverted file (IVF) index that only compares the query with the rows in
+# the clusters whose centroids are nearest to it.
+#
+# The embeddings may also be product quantized (PQ): each embedding is split
+# into subvectors, and each subvector is replaced by the one-byte ID of its
+# nearest centroid in a codebook for that subspace. Quantized embeddings are
+# scored against a query using a lookup table of the similarity between the
+# query's subvectors and every centroid, and the highest scoring candidates
+# are optionally re-ranked using the full-precision embeddings, which are
+# memory-mapped from disk rather than held in memory.
+
+import os
+import numpy as np
+
+class VectorIndex:
+
+    # the number of rows compared with the centroids at a time while building
+    batch_size = 65536
+
+    # the number of k-means iterations used to find the centroids
+    iterations = 10
+
+    # the number of clusters probed during approximate search by default
+    default_nprobe = 8
+
+    # the number of centroids in the codebook of each PQ subspace
+    pq_centroids = 256
+
+    # the number of candidates re-ranked by default, as a multiple of k
+    default_rerank_factor = 4
+
+    def __init__(self):
+        # initializes a new instance of the VectorIndex class
+        # params: None
+        # returns: None
+
+        self.document_ids = None
+        self.vectors = None
+
+        # the IVF index: a centroid for each cluster, the matrix rows in
+        # each cluster, and the offset of each cluster within those rows
+        self.centroids = None
+        self.list_rows = None
+        self.list_offsets = None
+
+        # the PQ index: a codebook for each subspace, and the centroid IDs
+        # of each row's subvectors
+        self.codebooks = None
+        self.codes = None
+
+    def build(self, embeddings, nlist=None, subvectors=None):
+        # builds the matrix of normalized embeddings, the IVF index, and
+        # optionally the PQ index
+        # params:
+        # - embeddings: a dictionary of document_id-embedding pairings, where
+        #   each embedding is a list of floats of the same length
+        # - nlist: an int, the number of clusters, or None to use the square
+        #   root of the number of documents
+        # - subvectors: an int, the number of subvectors each embedding is
+        #   split into for product quantization, or None to not quantize
+        # returns: None
+
+        document_ids = sorted(embeddings)
+
+        dimensions = set(len(embeddings[document_id]) for document_id in document_ids)
+        if len(dimensions) > 1:
+            raise Exception("Embeddings have differing dimensions {}".format(sorted(dimensions)))
+
+        self.document_ids = np.array(document_ids, dtype=np.int64)
+        self.vectors = normalize_rows(np.array([embeddings[document_id] for document_id in document_ids], dtype=np.float32))
+
+        if nlist is None:
+            nlist = int(np.sqrt(len(document_ids)))
+
+        self.build_ivf(max(1, min(nlist, len(document_ids))))
+
+        if subvectors is not None:
+            self.build_pq(subvectors)
+
+    def build_ivf(self, nlist):
+        # clusters the rows of the matrix with spherical k-means, then
+        # groups the rows of each cluster together
+        # params:
+        # - nlist: an int, the number of clusters
+        # returns: None
+
+        random = np.random.default_rng(0)
+
+        # train the centroids on a sample of the rows
+        num_samples = min(len(self.vectors), nlist * 64)
+        sample = self.vectors[random.choice(len(self.vectors), num_samples, replace=False)]
+        centroids = sample[random.choice(num_samples, nlist, replace=False)].copy()
+
+        for _ in range(VectorIndex.iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(nlist):
+                members = sample[assignments == cluster]
+                if len(members):
+                    centroids[cluster] = members.sum(axis=0)
+            centroids = normalize_rows(centroids)
+
+        # assign every row to its nearest centroid
+        assignments = np.empty(len(self.vectors), dtype=np.int64)
+        for start in range(0, len(self.vectors), VectorIndex.batch_size):
+            batch = self.vectors[start:start + VectorIndex.batch_size]
+            assignments[start:start + len(batch)] = np.argmax(batch @ centroids.T, axis=1)
+
+        self.centroids = centroids
+        self.list_rows = np.argsort(assignments, kind="stable")
+        self.list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=nlist))))
+
+    def build_pq(self, subvectors):
+        # trains a codebook for each subspace with k-means, then encodes
+        # every row of the matrix as the IDs of its subvectors' nearest
+        # centroids
+        # params:
+        # - subvectors: an int, which must divide the number of dimensions
+        # returns: None
+
+        dimension = self.get_dimension()
+        if subvectors <= 0 or dimension % subvectors:
+            raise Exception("{} subvectors do not divide {} dimensions".format(subvectors, dimension))
+
+        random = np.random.default_rng(0)
+
+        num_centroids = min(VectorIndex.pq_centroids, len(self.vectors))
+        num_samples = min(len(self.vectors), num_centroids * 64)
+        sample = self.vectors[random.choice(len(self.vectors), num_samples, replace=False)]
+
+        width = dimension // subvectors
+        self.codebooks = np.empty((subvectors, num_centroids, width), dtype=np.float32)
+        self.codes = np.empty((len(self.vectors), subvectors), dtype=np.uint8)
+
+        for subspace in range(subvectors):
+            columns = slice(subspace * width, (subspace + 1) * width)
+            subsample = sample[:, columns]
+
+            codebook = subsample[random.choice(num_samples, num_centroids, replace=False)].copy()
+            for _ in range(VectorIndex.iterations):
+                assignments = find_nearest(subsample, codebook)
+                for centroid in range(num_centroids):
+                    members = subsample[assignments == centroid]
+                    if len(members):
+                        codebook[centroid] = members.mean(axis=0)
+
+            self.codebooks[subspace] = codebook
+
+            for start in range(0, len(self.vectors), VectorIndex.batch_size):
+                batch = self.vectors[start:start + VectorIndex.batch_size, columns]
+                self.codes[start:start + len(batch), subspace] = find_nearest(batch, codebook)
+
+    def get_size(self):
+        # returns the number of documents with an embedding
+        # returns:
+        # - size: an int
+
+        return len(self.document_ids)
+
+    def get_dimension(self):
+        # returns the number of dimensions of each embedding
+        # returns:
+        # - dimension: an int
+
+        return self.vectors.shape[1]
+
+    def search(self, vector, k, nprobe=None, exact=False, rerank=None, candidates=None):
+        # finds the k documents whose embeddings are most similar to a query
+        # embedding
+        # params:
+        # - vector: a list of floats
+        # - k: an int
+        # - nprobe: an int, the number of clusters probed, or None to use
+        #   the default
+        # - exact: a bool, True to compare the query with every document
+        # - rerank: an int, the number of candidates scored using quantized
+        #   embeddings that are re-scored using full-precision embeddings,
+        #   or None to use the default. Ignored when embeddings are not
+        #   quantized
+        # - candidates: a sorted list of document IDs to which the search is
+        #   restricted, or None to search every document. The IVF index is
+        #   not used when candidates are supplied
+        # returns:
+        # - num_compared: an int, the number of embeddings compared
+        # - highest_docs: a list of [document_id, score] pairings, from the
+        #   lowest to the highest score
+
+        query = self.prepare_query(vector)
+
+        rows = None
+        if candidates is not None:
+            rows = self.get_rows(candidates)
+        elif not exact and self.centroids is not None:
+            rows = self.get_candidate_rows(query, nprobe)
+
+        if exact or self.codes is None:
+            scores = self.vectors @ query if rows is None else self.vectors[rows] @ query
+            return len(scores), self.find_highest_rows(scores, k, rows)
+
+        # score the candidates using their quantized embeddings
+        if rows is None:
+            rows = np.arange(len(self.codes))
+        scores = self.score_quantized(query, rows)
+
+        if rerank is None:
+            rerank = k * VectorIndex.default_rerank_factor
+
+        if rerank <= k:
+            return len(scores), self.find_highest_rows(scores, k, rows)
+
+        # re-score the best candidates using their full-precision embeddings
+        num_compared = len(scores)
+        if rerank < len(scores):
+            best = np.argpartition(-scores, rerank - 1)[:rerank]
+            rows = np.sort(rows[best])
+        scores = self.vectors[rows] @ query
+
+        return num_compared, self.find_highest_rows(scores, k, rows)
+
+    def score_quantized(self, query, rows):
+        # scores rows of the matrix against a query using their quantized
+        # embeddings. A table of the similarity between each of the query's
+        # subvectors and every centroid of that subspace is computed once,
+        # so each row is scored by summing one table entry per subspace
+        # params:
+        # - query: a normalized float32 array
+        # - rows: an array of ints
+        # returns:
+        # - scores: an array of floats
+
+        subvectors, _, width = self.codebooks.shape
+
+        table = np.einsum("scw,sw->sc", self.codebooks, query.reshape(subvectors, width))
+
+        codes = self.codes[rows]
+        scores = np.zeros(len(rows), dtype=np.float32)
+        for subspace in range(subvectors):
+            scores += table[subspace, codes[:, subspace]]
+
+        return scores
+
+    def prepare_query(self, vector):
+        # validates and normalizes a query embedding
+        # params:
+        # - vector: a list of floats
+        # returns:
+        # - query: a normalized float32 array
+
+        query = np.asarray(vector, dtype=np.float32)
+
+        if query.ndim != 1 or len(query) != self.get_dimension():
+            raise Exception("Query embedding must have {} dimensions".format(self.get_dimension()))
+
+        return normalize_rows(query[np.newaxis, :])[0]
+
+    def get_rows(self, document_ids):
+        # returns the matrix rows holding the embeddings of a set of
+        # documents, omitting documents without an embedding
+        # params:
+        # - document_ids: a sorted list of document IDs
+        # returns:
+        # - rows: an array of ints
+
+        document_ids = np.asarray(document_ids, dtype=np.int64)
+
+        _, rows, _ = np.intersect1d(self.document_ids, document_ids, assume_unique=True, return_indices=True)
+
+        return rows
+
+    def get_candidate_rows(self, query, nprobe):
+        # returns the matrix rows belonging to the clusters whose centroids
+        # are most similar to a query embedding
+        # params:
+        # - query: a normalized float32 array
+        # - nprobe: an int, or None to use the default
+        # returns:
+        # - rows: an array of ints
+
+        if nprobe is None:
+            nprobe = VectorIndex.default_nprobe
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+
+        centroid_scores = self.centroids @ query
+        clusters = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        return np.concatenate([
+            self.list_rows[self.list_offsets[cluster]:self.list_offsets[cluster + 1]]
+            for cluster in clusters
+        ])
+
+    def find_highest_rows(self, scores, k, rows=None):
+        # returns the documents with the k highest scores
+        # params:
+        # - scores: an array of floats
+        # - k: an int
+        # - rows: an array of the matrix rows that were scored, or None if
+        #   every row was scored
+        # returns:
+        # - highest_docs: a list of [document_id, score] pairings, from the
+        #   lowest to the highest score
+
+        k = min(k, len(scores))
+        if not k:
+            return []
+
+        highest = np.argpartition(-scores, k - 1)[:k]
+        highest = highest[np.argsort(scores[highest], kind="stable")]
+
+        document_rows = highest if rows is None else rows[highest]
+
+        return [
+            [int(self.document_ids[row]), float(score)]
+            for row, score in zip(document_rows, scores[highest])
+        ]
+
+    def save(self, directory):
+        # saves the VectorIndex instance as a set of NumPy files
+        # params:
+        # - directory: a string
+        # returns: None
+
+        np.save(directory + "/" + "vectors.npy", self.vectors)
+        np.save(directory + "/" + "vector_ids.npy", self.document_ids)
+        np.savez(
+            directory + "/" + "vector_ivf.npz",
+            centroids=self.centroids,
+            list_rows=self.list_rows,
+            list_offsets=self.list_offsets
+        )
+
+        if self.codes is not None:
+            np.savez(
+                directory + "/" + "vector_pq.npz",
+                codebooks=self.codebooks,
+                codes=self.codes
+            )
+
+    def load(self, directory):
+        # loads a VectorIndex instance from a set of NumPy files. The matrix
+        # of embeddings is memory-mapped rather than read into memory
+        # params:
+        # - directory: a string
+        # returns: None
+
+        self.vectors = np.load(directory + "/" + "vectors.npy", mmap_mode="r")
+        self.document_ids = np.load(directory + "/" + "vector_ids.npy")
+
+        with np.load(directory + "/" + "vector_ivf.npz") as ivf:
+            self.centroids = ivf["centroids"]
+            self.list_rows = ivf["list_rows"]
+            self.list_offsets = ivf["list_offsets"]
+
+        if os.path.exists(directory + "/" + "vector_pq.npz"):
+            with np.load(directory + "/" + "vector_pq.npz") as pq:
+                self.codebooks = pq["codebooks"]
+                self.codes = pq["codes"]
+
+def normalize_rows(matrix):
+    # scales each row of a matrix to unit length, leaving zero rows unchanged
+    # params:
+    # - matrix: a 2-dimensional float32 array
+    # returns:
+    # - matrix: a 2-dimensional float32 array
+
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+
+    return (matrix / norms).astype(np.float32)
+
+def find_nearest(matrix, centroids):
+    # returns the index of the centroid nearest to each row of a matrix by
+    # euclidean distance
+    # params:
+    # - matrix: a 2-dimensional float32 array
+    # - centroids: a 2-dimensional float32 array
+    # returns:
+    # - nearest: an array of ints
+
+    distances = (centroids ** 2).sum(axis=1) - 2 * (matrix @ centroids.T)
+
+    return np.argmin(distances, axis=1)
@@ -0,0 +1,111 @@
+# This file contains methods that help warm up a freshly loaded index before
+# it serves queries. The terms, postings, and document lengths are parsed
+# into memory when an index is loaded, but positions, documents, and
+# embeddings are read from their files by the queries that need them, and
+# the first such queries after a deploy or reboot wait on the disk. Ranges of
+# these files are read into the operating system's page cache ahead of time,
+# and recorded queries can be replayed to warm everything else they touch.
+
+import os
+import json
+
+# the number of bytes read at a time while prefetching
+read_size = 1024 * 1024
+
+def prefetch_ranges(filename, ranges, max_bytes=None):
+    # reads ranges of a file into the page cache. The kernel is first advised
+    # that every range will be needed, so that it reads them ahead
+    # concurrently, and each range is then read through so that it is
+    # resident once this returns. Adjacent and overlapping ranges are merged
+    # params:
+    # - filename: a string
+    # - ranges: a list of [offset, length] pairings, in bytes
+    # - max_bytes: an int, the most bytes to read, or None to read every
+    #   range. Ranges are taken in the order given, skipping those that no
+    #   longer fit in the budget
+    # returns:
+    # - size: an int, the number of bytes read
+
+    file_size = os.path.getsize(filename)
+
+    selected = []
+    size = 0
+    for offset, length in ranges:
+        length = min(length, file_size - offset)
+        if length <= 0:
+            continue
+        if max_bytes is not None and size + length > max_bytes:
+            continue
+
+        selected.append([offset, length])
+        size += length
+
+    merged = []
+    for offset, length in sorted(selected):
+        if merged and offset <= merged[-1][0] + merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], offset + length - merged[-1][0])
+        else:
+            merged.append([offset, length])
+
+    with open(filename, "rb") as data_file:
+        # posix_fadvise is not available on every platform
+        if hasattr(os, "posix_fadvise"):
+            for offset, length in merged:
+                os.posix_fadvise(data_file.fileno(), offset, length, os.POSIX_FADV_WILLNEED)
+
+        for offset, length in merged:
+            data_file.seek(offset)
+            while length > 0:
+                data = data_file.read(min(read_size, length))
+                if not data:
+                    break
+                length -= len(data)
+
+    return sum(length for _, length in merged)
+
+def prefetch_file(filename, max_bytes=None):
+    # reads a whole file, or as much of its beginning as the budget allows,
+    # into the page cache
+    # params:
+    # - filename: a string
+    # - max_bytes: an int, the most bytes to read, or None
+    # returns:
+    # - size: an int, the number of bytes read
+
+    size = os.path.getsize(filename)
+    if max_bytes is not None:
+        size = min(size, max_bytes)
+
+    return prefetch_ranges(filename, [[0, size]])
+
+def load_warmup_queries(filename):
+    # loads a sample of recorded queries to replay while warming up. The file
+    # holds one query on each line, either as plain text or as a JSON object
+    # holding its query, and optionally its k and filters, such as the
+    # entries of the slow query log. Blank lines are ignored
+    # params:
+    # - filename: a string
+    # returns:
+    # - queries: a list of dictionaries, each holding a query, a k, and a
+    #   list of filters
+
+    queries = []
+    with open(filename, "r", encoding="utf8") as text_file:
+        for line in text_file:
+            line = line.strip()
+            if not line:
+                continue
+
+            entry = {"query": line}
+            if line.startswith("{"):
+                entry = json.loads(line)
+                if not isinstance(entry, dict) or not isinstance(entry.get("query"), str):
+                    raise Exception("Recorded query {} holds no query".format(line))
+
+            queries.append({
+                "query": entry["query"],
+                "k": entry.get("k", 10),
+                "filters": entry.get("filters") or []
+            })
+
+    return queries
@@ -0,0 +1,43 @@
+# This file contains methods that calculate the term weights used to score
+# documents against queries, following the lnc.ltc-style scheme of the
+# information retreival textbook: augmented tf and probabilistic idf for
+# documents, and boolean tf and idf for queries.
+
+import math
+
+def get_query_term_weight(N, df):
+    # returns the weight of a query term (boolean tf * idf)
+    # params:
+    # - N: an int, the number of documents in the collection
+    # - df: an int, the document frequency of the term
+    # returns:
+    # - weight: a float
+    
+    query_tf_weight = 1 # boolean tf
+    query_df_weight = math.log(N/df, 10) # idf
+    
+    return query_tf_weight * query_df_weight
+
+def get_doc_df_weight(N, df):
+    # returns the probabilistic idf of a document term. Terms that appear in
+    # at least half of the documents are given no weight
+    # params:
+    # - N: an int, the number of documents in the collection
+    # - df: an int, the document frequency of the term
+    # returns:
+    # - weight: a float
+    
+    if df >= N:
+        return 0
+    
+    return max(0, math.log((N - df)/df, 10)) # prob idf
+
+def get_doc_tf_weight(tf, max_tf):
+    # returns the augmented tf of a document term
+    # params:
+    # - tf: an int, the frequency of the term in the document
+    # - max_tf: an int, the frequency of the most frequent term in the document
+    # returns:
+    # - weight: a float
+    
+    return 0.5 + ((0.5 * tf)/(max_tf)) # augmented tf
@@ -0,0 +1,262 @@
+# The WorkerPool class serves queries from several worker processes that
+# share a single loaded copy of the indexes. The indexes are loaded once in
+# the parent process and frozen from the garbage collector, so that the
+# collector never touches their objects and the pages holding them stay
+# shared between the parent and the workers after fork. Each worker answers
+# one request at a time from a shared listening socket and sends a heartbeat
+# to the parent between requests. Workers that exit or stop sending
+# heartbeats are replaced. When a new index generation is published, the
+# parent loads it and replaces the workers one by one.
+
+import os
+import gc
+import time
+import select
+import signal
+from http.server import HTTPServer
+from metrics import registry
+
+class WorkerPool:
+
+    # the number of seconds between heartbeats sent by an idle worker
+    heartbeat_interval = 1
+
+    # the number of seconds without a heartbeat after which a worker is
+    # considered hung and is killed
+    worker_timeout = 30
+
+    def __init__(self, reloader, server_address, handler_class, num_workers):
+        # initializes a new instance of the WorkerPool class
+        # params:
+        # - reloader: an IndexReloader object, holding the loaded indexes
+        # - server_address: a (host, port) tuple
+        # - handler_class: a BaseHTTPRequestHandler class
+        # - num_workers: an int, the number of worker processes
+        # returns: None
+
+        if not hasattr(os, "fork"):
+            raise Exception("Worker processes are not supported on this platform")
+
+        if num_workers <= 0:
+            raise Exception("You must start a positive number of workers")
+
+        self.reloader = reloader
+        self.num_workers = num_workers
+
+        # the listening socket is created once, and inherited by every worker
+        self.server = HTTPServer(server_address, handler_class)
+        self.server.timeout = WorkerPool.heartbeat_interval
+        self.server.reloader = reloader
+
+        # maps the pid of each worker to the read end of its heartbeat pipe
+        # and the time of its last heartbeat, or None once it is exiting
+        self.workers = {}
+
+        # workers that have been asked to exit, and must not be replaced
+        self.retired = set()
+
+        # each worker records its metrics into a row of its own, mapped to by
+        # its pid, while the parent records into row 0. Workers retired by a
+        # reload may still be answering a request once their replacements
+        # start, so rows are allocated for twice as many workers
+        registry.set_processes(2 * num_workers + 1)
+        self.rows = {}
+
+        self.stopped = False
+
+    def serve_forever(self, reload_interval):
+        # starts the workers and supervises them until interrupted,
+        # checking for a new generation every reload_interval seconds
+        # params:
+        # - reload_interval: a float
+        # returns: None
+
+        if self.reloader.get_indexes()[1] is None:
+            self.reloader.load()
+
+        # move every loaded object out of the collector's reach before fork
+        gc.freeze()
+
+        for i in range(self.num_workers):
+            self.start_worker()
+
+        last_reload = time.time()
+        try:
+            while True:
+                self.check_workers()
+
+                if time.time() - last_reload >= reload_interval:
+                    last_reload = time.time()
+                    self.reload()
+
+        finally:
+            self.stop()
+
+    def start_worker(self):
+        # forks a new worker process
+        # params: None
+        # returns:
+        # - pid: an int
+
+        read_fd, write_fd = os.pipe()
+        row = self.get_metrics_row()
+
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                os.close(read_fd)
+                for worker_fd, _ in self.workers.values():
+                    os.close(worker_fd)
+
+                registry.set_process(row)
+                self.run_worker(write_fd)
+
+            except BaseException:
+                status = 1
+
+            finally:
+                os._exit(status)
+
+        os.close(write_fd)
+        self.workers[pid] = (read_fd, time.time())
+        self.rows[pid] = row
+
+        return pid
+
+    def get_metrics_row(self):
+        # returns a row of the metrics that no worker records into. If
+        # workers retired by successive reloads are still exiting and hold
+        # every row, a retired worker's row is shared, which may lose some of
+        # the values recorded at the same time by both workers
+        # params: None
+        # returns:
+        # - row: an int
+
+        used = set(self.rows.values())
+        for row in range(1, registry.processes):
+            if row not in used:
+                return row
+
+        return min(self.rows[pid] for pid in self.retired if pid in self.rows)
+
+    def run_worker(self, heartbeat_fd):
+        # serves requests one at a time until asked to exit. Runs in the
+        # worker process
+        # params:
+        # - heartbeat_fd: an int, the write end of the heartbeat pipe
+        # returns: None
+
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, self.request_stop)
+
+        self.stopped = False
+        while not self.stopped:
+            os.write(heartbeat_fd, b".")
+            self.server.handle_request()
+
+        self.server.server_close()
+
+    def request_stop(self, signum, frame):
+        # asks a worker to exit once its current request is answered
+        # params:
+        # - signum: an int
+        # - frame: a frame object
+        # returns: None
+
+        self.stopped = True
+
+    def check_workers(self):
+        # reads heartbeats for up to one heartbeat interval, then replaces
+        # workers that have exited and kills workers that have hung
+        # params: None
+        # returns: None
+
+        # workers that are exiting have no heartbeat time, and are only
+        # waited for
+        fds = {read_fd: pid for pid, (read_fd, heartbeat) in self.workers.items() if heartbeat is not None}
+        ready, _, _ = select.select(list(fds), [], [], WorkerPool.heartbeat_interval)
+
+        now = time.time()
+        for read_fd in ready:
+            pid = fds[read_fd]
+            if os.read(read_fd, 4096):
+                self.workers[pid] = (read_fd, now)
+            else:
+                self.workers[pid] = (read_fd, None)
+
+        # reap workers that have exited
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+
+            if pid not in self.workers:
+                continue
+
+            os.close(self.workers.pop(pid)[0])
+            self.rows.pop(pid, None)
+
+            if pid in self.retired:
+                self.retired.discard(pid)
+            else:
+                print("Worker {} exited with status {}, restarting".format(pid, status))
+                self.start_worker()
+
+        # kill workers that have stopped sending heartbeats. They are
+        # replaced once they have been reaped
+        for pid, (read_fd, heartbeat) in list(self.workers.items()):
+            if heartbeat is not None and now - heartbeat > WorkerPool.worker_timeout:
+                print("Worker {} is not responding, killing it".format(pid))
+                os.kill(pid, signal.SIGKILL)
+                self.workers[pid] = (read_fd, None)
+
+    def reload(self):
+        # loads the current generation if it is new, then replaces every
+        # worker with one forked from the new generation. Old workers finish
+        # their current request before exiting
+        # params: None
+        # returns: None
+
+        try:
+            start = time.time()
+            if not self.reloader.load():
+                return
+            print("Loaded index generation {} in {:.2f}s".format(self.reloader.get_indexes()[0], time.time() - start))
+
+        except Exception as e:
+            print("Could not load new index generation: " + str(e))
+            return
+
+        # the previous generation is no longer referenced by the parent
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+        for pid in list(self.workers):
+            if pid not in self.retired:
+                self.retired.add(pid)
+                os.kill(pid, signal.SIGTERM)
+                self.start_worker()
+
+    def stop(self):
+        # asks every worker to exit and waits for them
+        # params: None
+        # returns: None
+
+        for pid in self.workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        for pid, (read_fd, _) in self.workers.items():
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            os.close(read_fd)
+
+        self.workers = {}
+        self.rows = {}
+        self.server.server_close()
@@ -0,0 +1,7 @@
+# The modules of the search engine are imported by name from the src
+# directory, as the programs within it import one another
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
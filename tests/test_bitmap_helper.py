@@ -0,0 +1,54 @@
+# Tests of the bitmap operations against merging sorted lists
+
+import random
+import pytest
+from array import array
+from bitmap_helper import *
+from sorted_list_helper import intersect_lists, union_lists
+from inverted_index import DensePostings
+
+def create_list(generator):
+    # returns a random sorted list of distinct document IDs, either sparse
+    # or dense, with gaps of whole empty bytes
+    size = generator.choice([0, 1, generator.randint(2, 50), generator.randint(200, 1500)])
+    limit = generator.choice([8, 64, 2000, 20000])
+
+    return sorted(generator.sample(range(limit), min(size, limit)))
+
+@pytest.mark.parametrize("seed", range(200))
+def test_round_trip(seed):
+    sorted_list = create_list(random.Random(seed))
+
+    assert bitmap_to_list(list_to_bitmap(sorted_list)) == sorted_list
+
+@pytest.mark.parametrize("seed", range(200))
+def test_bitmap_operations(seed):
+    generator = random.Random(seed)
+    list_a = create_list(generator)
+    list_b = create_list(generator)
+    bitmap_a = list_to_bitmap(list_a)
+    bitmap_b = list_to_bitmap(list_b)
+
+    assert bitmap_to_list(bitmap_a & bitmap_b) == intersect_lists(list_a, list_b)
+    assert bitmap_to_list(bitmap_a | bitmap_b) == union_lists(list_a, list_b)
+    assert intersect_bitmap_list(bitmap_a, list_b) == intersect_lists(list_a, list_b)
+    assert bitmap_to_list(union_bitmap_list(bitmap_a, list_b)) == union_lists(list_a, list_b)
+
+def test_intersect_outside_bitmap():
+    bitmap = list_to_bitmap([0, 3, 9])
+
+    assert intersect_bitmap_list(bitmap, [-1, 0, 9, 10, 1000]) == [0, 9]
+    assert intersect_bitmap_list(0, [0, 1, 2]) == []
+
+def test_dense_postings():
+    document_ids = [2, 3, 5, 8, 13, 21]
+    tfs = [1, 4, 1, 2, 7, 3]
+    postings = DensePostings(array('q', document_ids), array('I', tfs))
+    expected = list(zip(document_ids, tfs))
+
+    assert len(postings) == len(expected)
+    assert list(postings) == expected
+    assert postings[2] == expected[2]
+    assert postings[-1] == expected[-1]
+    assert list(postings[1:4]) == expected[1:4]
+    assert list(postings[4:100]) == expected[4:]
@@ -0,0 +1,41 @@
+# Tests of resuming checkpointed builds
+
+import os
+import pytest
+from index_builder import IndexBuilder
+from search_engine import SearchEngine
+
+documents = [{"title": "waa {}".format(i), "body": "text of document {}".format(i)} for i in range(7)]
+
+def create_builder(directory, **options):
+    index_builder = IndexBuilder(checkpoint_directory=os.path.join(directory, "checkpoint"), **options)
+    for document_id, zones in enumerate(documents):
+        index_builder.add_document(document_id, zones)
+
+    return index_builder
+
+@pytest.fixture
+def directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(IndexBuilder, "checkpoint_interval", 2)
+
+    # an interrupted build leaves its checkpoint behind, unpublished
+    create_builder(str(tmp_path), zones=["title"]).build()
+
+    return str(tmp_path)
+
+def test_resume(directory):
+    index_builder = create_builder(directory, zones=["title"])
+    index_builder.build(resume=True)
+    index_builder.save(directory)
+
+    assert SearchEngine(directory).count("title:waa") == {"count": len(documents)}
+
+@pytest.mark.parametrize("options, changed", [
+    ({}, "zones"),
+    ({"zones": ["title"], "filter_fields": ["body"]}, "filter_fields"),
+    ({"zones": ["title"], "positions": False}, "positions"),
+    ({"zones": ["title"], "reorder": True}, "reorder")
+])
+def test_resume_with_other_options(directory, options, changed):
+    with pytest.raises(Exception, match="made with other options: {}".format(changed)):
+        create_builder(directory, **options).build(resume=True)
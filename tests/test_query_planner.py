@@ -0,0 +1,100 @@
+# Tests of boolean query plans against a naive evaluation of each query over
+# the terms of every document
+
+import random
+import pytest
+from index_builder import IndexBuilder
+from search_engine import SearchEngine, parse_boolean_query, normalize_boolean_query, get_boolean_query_pool
+from query_node import QueryNode
+
+# a few common words, whose postings are stored as bitmaps once loaded, and
+# many rare words, whose postings are stored as lists
+common_words = ["w{}".format(i) for i in range(4)]
+rare_words = ["w{}".format(i) for i in range(4, 30)]
+
+@pytest.fixture(scope="module")
+def collection(tmp_path_factory):
+    generator = random.Random(0)
+
+    texts = []
+    for document_id in range(400):
+        tokens = [generator.choice(common_words) for _ in range(generator.randint(0, 2))]
+        tokens += [generator.choice(rare_words) for _ in range(generator.randint(1, 6))]
+        generator.shuffle(tokens)
+        texts.append(tokens)
+
+    directory = str(tmp_path_factory.mktemp("index"))
+    index_builder = IndexBuilder()
+    for document_id, tokens in enumerate(texts):
+        index_builder.add_document(document_id, {"body": " ".join(tokens)})
+    index_builder.build()
+    index_builder.save(directory)
+
+    return SearchEngine(directory), texts
+
+def create_query(generator, depth):
+    # returns a random boolean query string
+    if depth == 0 or generator.random() < 0.3:
+        words = common_words if generator.random() < 0.3 else rare_words
+        if generator.random() < 0.2:
+            return ":{} {}:".format(generator.choice(words), generator.choice(words))
+        return generator.choice(words)
+
+    operands = []
+    for _ in range(generator.randint(2, 3)):
+        operand = create_query(generator, depth - 1)
+        if generator.random() < 0.3:
+            operand = "NOT " + operand
+        operands.append(operand)
+
+    return "(" + " {} ".format(generator.choice(["AND", "OR", "AND"])).join(operands) + ")"
+
+def evaluate(node, tokens):
+    # returns whether a document holding a list of tokens satisfies a query
+    node_type = node.get_type()
+    terms = node.get_terms()
+
+    if node_type == QueryNode.keyword:
+        return terms[0] in tokens
+    if node_type == QueryNode.phrase:
+        return any(tokens[i:i + len(terms)] == terms for i in range(len(tokens)))
+    if node_type == QueryNode.not_op:
+        return not evaluate(node.get_children()[0], tokens)
+    if node_type == QueryNode.and_op:
+        return all(evaluate(child, tokens) for child in node.get_children())
+
+    return any(evaluate(child, tokens) for child in node.get_children())
+
+@pytest.mark.parametrize("seed", range(300))
+def test_plan(collection, seed):
+    search_engine, texts = collection
+    generator = random.Random(seed)
+    query = create_query(generator, 3)
+
+    try:
+        query_node = parse_boolean_query(query)
+    except Exception:
+        # queries matching documents by negated terms alone are rejected
+        return
+
+    normalize_boolean_query(query_node, search_engine.lexicon)
+    expected = [document_id for document_id, tokens in enumerate(texts) if evaluate(query_node, tokens)]
+
+    pool = get_boolean_query_pool(search_engine.inverted_index, search_engine.document_index, query_node)
+    assert pool == expected
+    assert search_engine.count(query) == {"count": len(expected)}
+
+    filtered = sorted(generator.sample(range(len(texts)), 100))
+    pool = get_boolean_query_pool(search_engine.inverted_index, search_engine.document_index, query_node, filtered)
+    assert pool == [document_id for document_id in expected if document_id in set(filtered)]
+
+@pytest.mark.parametrize("query", ["NOT w1", "w5 OR NOT w1", "NOT (w5 AND w6)", "NOT NOT w5"])
+def test_negated_terms_alone(collection, query):
+    search_engine, _ = collection
+
+    with pytest.raises(Exception, match="negated terms alone"):
+        search_engine.search(query, 5)
+    with pytest.raises(Exception, match="negated terms alone"):
+        search_engine.count(query)
+    with pytest.raises(Exception, match="negated terms alone"):
+        search_engine.exists(query)
@@ -0,0 +1,49 @@
+# Tests of the sorted list operations against the same operations on sets
+
+import random
+import pytest
+from sorted_list_helper import *
+
+def create_lists(seed):
+    # returns two random sorted lists of distinct ints, of very different
+    # lengths half of the time, so that galloping takes long strides
+    generator = random.Random(seed)
+    size_a = generator.randint(0, 50)
+    size_b = generator.choice([generator.randint(0, 50), generator.randint(200, 2000)])
+
+    list_a = sorted(generator.sample(range(3000), size_a))
+    list_b = sorted(generator.sample(range(3000), size_b))
+
+    return list_a, list_b
+
+def create_mlist(sorted_list):
+    return [[item, item % 7 + 1] for item in sorted_list]
+
+@pytest.mark.parametrize("seed", range(200))
+def test_merges(seed):
+    list_a, list_b = create_lists(seed)
+
+    assert intersect_lists(list_a, list_b) == sorted(set(list_a) & set(list_b))
+    assert union_lists(list_a, list_b) == sorted(set(list_a) | set(list_b))
+    assert difference_lists(list_a, list_b) == sorted(set(list_a) - set(list_b))
+    assert difference_lists(list_b, list_a) == sorted(set(list_b) - set(list_a))
+
+@pytest.mark.parametrize("seed", range(200))
+def test_galloping(seed):
+    list_a, list_b = create_lists(seed)
+    mlist_b = create_mlist(list_b)
+
+    assert intersect_list_mlist(list_a, mlist_b) == sorted(set(list_a) & set(list_b))
+    assert select_mlist(list_a, mlist_b) == [posting for posting in mlist_b if posting[0] in set(list_a)]
+
+@pytest.mark.parametrize("seed", range(50))
+def test_search_mlist(seed):
+    generator = random.Random(seed)
+    list_b = sorted(generator.sample(range(500), generator.randint(0, 100)))
+    mlist_b = create_mlist(list_b)
+
+    for key in range(-1, 502, 3):
+        low = generator.randint(0, len(list_b))
+        expected = low + sum(1 for item in list_b[low:] if item < key)
+
+        assert search_mlist(key, mlist_b, low) == expected
@@ -0,0 +1,84 @@
+# Tests of the edit distance and the trigram index against comparing a term
+# with every other term
+
+import random
+import pytest
+from trigram_index import TrigramIndex, get_trigrams, get_edit_distance
+
+def get_osa_distance(a, b):
+    # returns the optimal string alignment distance between two strings,
+    # filling in the whole table
+    rows = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) + 1):
+        rows[i][0] = i
+    for j in range(len(b) + 1):
+        rows[0][j] = j
+
+    for i in range(1, len(a) + 1):
+        for j in range(1, len(b) + 1):
+            rows[i][j] = min(
+                rows[i - 1][j - 1] + (a[i - 1] != b[j - 1]),
+                rows[i - 1][j] + 1,
+                rows[i][j - 1] + 1
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                rows[i][j] = min(rows[i][j], rows[i - 2][j - 2] + 1)
+
+    return rows[-1][-1]
+
+def create_string(generator, max_length):
+    # a small alphabet makes near matches common
+    return "".join(generator.choice("abcd") for _ in range(generator.randint(0, max_length)))
+
+@pytest.mark.parametrize("seed", range(100))
+def test_edit_distance(seed):
+    generator = random.Random(seed)
+
+    for _ in range(50):
+        a = create_string(generator, 8)
+        b = create_string(generator, 8)
+        distance = get_osa_distance(a, b)
+
+        for max_distance in range(4):
+            assert get_edit_distance(a, b, max_distance) == min(distance, max_distance + 1)
+
+def test_transposition():
+    assert get_edit_distance("swfit", "swift", 1) == 1
+    assert get_edit_distance("ca", "abc", 3) == 3
+
+@pytest.fixture(scope="module")
+def trigram_index():
+    generator = random.Random(0)
+    terms = {create_string(generator, 9) for _ in range(1500)} - {""}
+    terms |= {"title:" + term for term in list(terms)[:50]}
+
+    trigram_index = TrigramIndex()
+    trigram_index.build(terms)
+
+    return trigram_index
+
+def test_zone_terms(trigram_index):
+    assert not any(":" in term for term in trigram_index.terms)
+
+@pytest.mark.parametrize("seed", range(50))
+def test_find_terms(trigram_index, seed):
+    generator = random.Random(seed)
+    term = create_string(generator, 10)
+
+    for max_distance in range(4):
+        # the distance is capped where a match may share no trigram
+        capped = min(max_distance, (len(get_trigrams(term)) - 1) // 4)
+        expected = [[candidate, get_osa_distance(term, candidate)] for candidate in trigram_index.terms]
+        expected = sorted([match for match in expected if match[1] <= capped], key=lambda match: (match[1], match[0]))
+
+        assert trigram_index.find_terms(term, max_distance) == expected
+
+def test_save_and_load(trigram_index, tmp_path):
+    filename = str(tmp_path / "trigram_index.tsv")
+    trigram_index.save_TSV(filename)
+
+    loaded = TrigramIndex()
+    loaded.load_TSV(filename)
+
+    assert loaded.terms == trigram_index.terms
+    assert loaded.find_terms("abcab", 1) == trigram_index.find_terms("abcab", 1)
@@ -0,0 +1,39 @@
+# Tests of zone queries against documents whose text terms carry no weight
+
+import pytest
+from index_builder import IndexBuilder
+from search_engine import SearchEngine
+
+# every term of the text is found in at least half of the documents, so no
+# document has a length, while the terms of the titles still carry weight
+documents = [
+    {"title": "news", "body": "daily news report"},
+    {"title": "sports", "body": "daily news report"},
+    {"title": "weather", "body": "daily news report"},
+    {"title": "daily", "body": "news report weather"}
+]
+
+@pytest.fixture
+def search_engine(tmp_path):
+    index_builder = IndexBuilder(term_matrix=True, zones=["title"])
+    for document_id, zones in enumerate(documents):
+        index_builder.add_document(document_id, zones)
+    index_builder.build()
+    index_builder.save(str(tmp_path))
+
+    return SearchEngine(str(tmp_path))
+
+def get_document_ids(results):
+    return [result["document_id"] for result in results["results"]]
+
+def test_zone_query(search_engine):
+    assert get_document_ids(search_engine.search("title:news", 5)) == [0]
+
+def test_zone_weights(search_engine):
+    assert get_document_ids(search_engine.search("news", 5, zone_weights={"title": 2})) == [0]
+
+def test_search_batch(search_engine):
+    all_results = search_engine.search_batch(["title:news", "title:daily", "news"], 5)
+
+    assert [get_document_ids(results) for results in all_results] == [[0], [3], []]
+    assert all_results[0]["results"][0]["score"] == search_engine.search("title:news", 5)["results"][0]["score"]